@@ -0,0 +1,68 @@
+""" Benchmark the graph of calculate_ndvi_anomaly and calculate_vci against the former monthly loops.
+
+The former functions rebuilt calendarRange filters and mean/min/max reductions for every output
+month; the new ones join every monthly composite against a 12-image climatology computed once.
+Building the graphs needs an initialized Earth Engine session, but nothing is computed.
+
+    python benchmarks/bench_climatology.py [years]
+"""
+import json
+import sys
+
+import ee
+
+from pymapee.pymapee import calculate_ndvi_anomaly, calculate_vci
+from pymapee.utils import date_range_col, expression_stats, monthly_datetime_list
+
+
+def legacy_vci(col):
+    first_date, latest_date = date_range_col(col)
+    monthly_list = monthly_datetime_list(first_date, latest_date)
+
+    def vci(date):
+        start_time = ee.Date(date)
+        set_month = ee.Number.parse(start_time.format("MM"))
+        col_month = col.filter(ee.Filter.calendarRange(set_month, set_month, "month"))
+        subcol = col.filterDate(start_time, start_time.advance(1, "month"))
+        min_value, max_value = col_month.min(), col_month.max()
+        vci_img = subcol.max().subtract(min_value).divide(max_value.subtract(min_value)).multiply(100)
+        return ee.Algorithms.If(subcol.size().gt(0), vci_img.set(
+            {"system:time_start": start_time.millis()}).rename("VCI"))
+    return ee.ImageCollection.fromImages(monthly_list.map(vci))
+
+
+def legacy_ndvi_anomaly(col):
+    first_date, latest_date = date_range_col(col)
+    monthly_list = monthly_datetime_list(first_date, latest_date)
+
+    def ndvi_anomaly(date):
+        start_time = ee.Date(date)
+        set_month = ee.Number.parse(start_time.format("MM"))
+        col_month = col.filter(ee.Filter.calendarRange(set_month, set_month, "month"))
+        subcol = col.filterDate(start_time, start_time.advance(1, "month"))
+        anomaly = subcol.max().subtract(col_month.mean()).set({"system:time_start": start_time.millis()})
+        return ee.Algorithms.If(subcol.size().gt(0), anomaly.rename("VAI"))
+    return ee.ImageCollection.fromImages(monthly_list.map(ndvi_anomaly))
+
+
+def main(years=20):
+    ee.Initialize()
+    col = ee.ImageCollection("MODIS/061/MOD13A2").select("NDVI").filterDate(
+        "{}-01-01".format(2021 - years), "2021-01-01")
+    results = []
+    for name, func in [("calculate_ndvi_anomaly (legacy)", legacy_ndvi_anomaly),
+                       ("calculate_ndvi_anomaly", calculate_ndvi_anomaly),
+                       ("calculate_vci (legacy)", legacy_vci),
+                       ("calculate_vci", calculate_vci)]:
+        stats = expression_stats(func(col))
+        stats["name"] = name
+        results.append(stats)
+    # Climatology reductions evaluated on the server for the whole run.
+    results[0]["climatology_reductions"] = years * 12
+    results[2]["climatology_reductions"] = years * 12 * 2
+    results[1]["climatology_reductions"] = results[3]["climatology_reductions"] = 12
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
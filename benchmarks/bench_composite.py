@@ -0,0 +1,69 @@
+""" Benchmark the grouped compositing engine against the former per-period filterDate loop.
+
+Records the serialized request size and the expression node count of monthly and daily
+composites built over an hourly ERA5-Land stack. Building the graphs needs an initialized
+Earth Engine session, but no computation is requested from the server.
+
+    python benchmarks/bench_composite.py [years]
+"""
+import json
+import sys
+import time
+
+import ee
+
+from pymapee.pymapee import monthly_composite, daily_composite
+from pymapee.utils import date_range_col, monthly_datetime_list, expression_stats
+
+
+def legacy_monthly_composite(col):
+    first_date, latest_date = date_range_col(col)
+    monthly_list = monthly_datetime_list(first_date, latest_date)
+
+    def monthly_data(date):
+        start_date = ee.Date(date)
+        monthly_col = col.filterDate(start_date, start_date.advance(1, "month"))
+        img = monthly_col.max().set({"system:time_start": start_date.millis()})
+        return ee.Algorithms.If(monthly_col.size().gt(0), img)
+    return ee.ImageCollection.fromImages(monthly_list.map(monthly_data))
+
+
+def legacy_daily_composite(ds):
+    start_date = ee.Date(ee.Date(ds.first().get("system:time_start")).format('YYYY-MM-dd'))
+    end_date = ee.Date(ee.Date(ds.sort('system:time_start', False).first().get(
+        "system:time_start")).format('YYYY-MM-dd'))
+    date_list = ee.List.sequence(0, end_date.difference(start_date, 'day')).map(
+        lambda i: start_date.advance(i, "day"))
+
+    def sub_col(date_input):
+        first_date = ee.Date(date_input)
+        subcol = ds.filterDate(first_date, first_date.advance(1, "day"))
+        img = subcol.max().set({"system:time_start": first_date.millis()})
+        return ee.Algorithms.If(subcol.size().gt(0), img)
+    return ee.ImageCollection.fromImages(date_list.map(sub_col))
+
+
+def measure(name, func, col):
+    start = time.perf_counter()
+    out = func(col)
+    stats = expression_stats(out)
+    stats["build_seconds"] = round(time.perf_counter() - start, 4)
+    stats["name"] = name
+    return stats
+
+
+def main(years=20):
+    ee.Initialize()
+    col = ee.ImageCollection("ECMWF/ERA5_LAND/HOURLY").select("temperature_2m").filterDate(
+        "{}-01-01".format(2021 - years), "2021-01-01")
+    results = [
+        measure("monthly_composite (legacy)", legacy_monthly_composite, col),
+        measure("monthly_composite", monthly_composite, col),
+        measure("daily_composite (legacy)", legacy_daily_composite, col),
+        measure("daily_composite", daily_composite, col),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,58 @@
+""" Benchmark the columnar data_format against the former list-of-dicts decoder.
+
+Runs offline on a synthetic reduceRegions response.
+
+    python benchmarks/bench_data_format.py [rows]
+"""
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from pymapee.utils import data_format
+
+
+def legacy_data_format(input_data):
+    slist = []
+    for i in input_data["features"]:
+        slist.append(i["properties"])
+    return pd.DataFrame(slist)
+
+
+def synthetic_response(rows, bands=12):
+    rng = random.Random(0)
+    names = ["B{}".format(i) for i in range(bands)]
+    features = []
+    for i in range(rows):
+        props = {"id": i, "name": "field_{}".format(i % 1000)}
+        props.update({name: rng.random() if rng.random() > 0.05 else None for name in names})
+        features.append({"type": "Feature", "geometry": None, "properties": props})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def measure(name, func, data, repeat=3):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    df = func(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"name": name, "best_seconds": round(min(seconds), 4), "peak_mb": round(peak / 2 ** 20, 2),
+            "frame_mb": round(df.memory_usage(deep=True).sum() / 2 ** 20, 2)}
+
+
+def main(rows=100000):
+    data = synthetic_response(rows)
+    results = [measure("legacy", legacy_data_format, data),
+               measure("data_format", data_format, data)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,57 @@
+""" Benchmark the request payload of chunk_maker grids: former Python double loop vs server side.
+
+Building the graphs needs an initialized Earth Engine session, but nothing is computed.
+
+    python benchmarks/bench_grid.py
+"""
+import json
+import time
+
+import ee
+
+from pymapee.utils import arange, expression_stats, grid_cells, grid_layout, server_grid
+
+# Bounding box of mainland Vietnam.
+BOUNDS = (102.1, 109.5, 8.4, 23.4)
+
+
+def legacy_grid(ncols, nrows):
+    min_x, max_x, min_y, max_y = BOUNDS
+    min_lon, max_lon = round(min_x), round(max_x + 1)
+    min_lat, max_lat = round(min_y - 1), round(max_y + 1)
+    lon_dist = (max_lon - min_lon) / ncols
+    lat_dist = (max_lat - min_lat) / nrows
+    polys = []
+    cell = 0
+    for lon in arange(min_lon, max_lon, lon_dist):
+        for lat in arange(min_lat, max_lat, lat_dist):
+            cell += 1
+            polys.append(ee.Feature(ee.Geometry.Rectangle(
+                lon, lat, lon + lon_dist, lat + lat_dist), {"label": cell}))
+    return ee.FeatureCollection(polys), cell
+
+
+def client_grid(ncols, nrows):
+    cells = grid_cells(*grid_layout(*BOUNDS, ncols=ncols, nrows=nrows))
+    return ee.FeatureCollection([ee.Feature(ee.Geometry.Rectangle([x1, y1, x2, y2]), {"label": label})
+                                 for label, x1, y1, x2, y2 in cells]), len(cells)
+
+
+def main():
+    ee.Initialize()
+    aoi = ee.FeatureCollection(ee.Geometry.Rectangle(*[BOUNDS[i] for i in (0, 2, 1, 3)]))
+    results = []
+    for ncols, nrows in [(3, 7), (10, 10), (30, 30), (100, 100)]:
+        for name, build in [("legacy", legacy_grid), ("client", client_grid),
+                            ("server", lambda c, r: (server_grid(aoi, c, r), c * r))]:
+            start = time.perf_counter()
+            grid, cells = build(ncols, nrows)
+            stats = expression_stats(grid)
+            stats.update({"name": name, "grid": "{}x{}".format(ncols, nrows), "cells": cells,
+                          "build_seconds": round(time.perf_counter() - start, 4)})
+            results.append(stats)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+""" Benchmark the startup cost of import pymapee with lazy submodules.
+
+Every statement runs in a fresh interpreter, and the best wall time of several runs is kept with
+the number of loaded modules and the optional dependencies pulled in. "eager (former)" imports
+every submodule like the former star imports of pymapee/__init__.py did.
+
+    python benchmarks/bench_import.py [runs]
+"""
+import json
+import subprocess
+import sys
+
+STATEMENTS = {
+    "import pymapee": "import pymapee",
+    "pymapee.monthly_composite": "import pymapee; pymapee.monthly_composite",
+    "eager (former)": "import pymapee; pymapee.monthly_composite; pymapee.ee_tile_layer; pymapee.Map",
+}
+
+OPTIONAL = ("ee", "ipyleaflet", "shapefile", "numpy", "pandas", "xarray")
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+loaded = [name for name in {optional!r} if name in sys.modules]
+print(seconds, len(sys.modules), ",".join(loaded))
+"""
+
+
+def measure(name, statement, runs=5):
+    best = None
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(statement=statement, optional=OPTIONAL)],
+                                check=True, capture_output=True, text=True).stdout.split()
+        seconds = float(output[0])
+        if best is None or seconds < best[0]:
+            best = (seconds, int(output[1]), output[2].split(",") if len(output) > 2 else [])
+    return {"name": name, "best_seconds": round(best[0], 4), "modules": best[1], "optional": best[2]}
+
+
+def main(runs=5):
+    results = [measure(name, statement, runs) for name, statement in STATEMENTS.items()]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,159 @@
+""" Benchmark the expression graphs of every pymapee algorithm over synthetic collections.
+
+Each case builds a pymapee algorithm with the offline symbolic ee module (see graph_ee) over
+collections of increasing length and records the client-side build time, the serialized request
+size, the expression node count and the server round trips. The results are printed as JSON and
+compared against a stored baseline: a size, node or round trip count above the baseline (plus the
+tolerance) is a regression and makes the script exit with status 1. Build times are only reported.
+
+    python benchmarks/bench_suite.py [--sizes 12 48 192] [--output results.json]
+                                     [--baseline benchmarks/baseline.json] [--update-baseline]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from pymapee import pipeline, pymapee, utils
+
+import graph_ee
+
+SIZES = (12, 48, 192)
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# The compared metrics; build_seconds depends on the machine.
+METRICS = ("bytes", "nodes", "round_trips")
+
+DAY = 86400000
+
+
+def synthetic_collection(ee, n, step_days=8):
+    """ An ImageCollection of n single band images, one every step_days days from 2001-01-01."""
+    return ee.ImageCollection.fromImages([
+        ee.Image.constant(i).rename("NDVI").set("system:time_start", 978307200000 + i * step_days * DAY)
+        for i in range(n)])
+
+
+def synthetic_region(ee):
+    return ee.FeatureCollection(ee.Geometry.Rectangle([102.1, 8.4, 109.5, 23.4]))
+
+
+def export_image(task):
+    return task.config["image"]
+
+
+CASES = {
+    "monthly_composite": lambda ee, col, n: pymapee.monthly_composite(col, "max"),
+    "daily_composite": lambda ee, col, n: pymapee.daily_composite(col),
+    "group_composite (dekad, median)": lambda ee, col, n: utils.group_composite(col, "dekad", "median"),
+    "monthly_climatology": lambda ee, col, n: utils.monthly_climatology(col),
+    "calculate_ndvi_anomaly": lambda ee, col, n: pymapee.calculate_ndvi_anomaly(col, 0.0001),
+    "calculate_vci": lambda ee, col, n: pymapee.calculate_vci(col),
+    "calculate_zscore": lambda ee, col, n: pymapee.calculate_zscore(col, 0.0001),
+    "vci + ndvi_anomaly + zscore (separate)": lambda ee, col, n: [
+        pymapee.calculate_vci(col), pymapee.calculate_ndvi_anomaly(col, 0.0001),
+        pymapee.calculate_zscore(col, 0.0001)],
+    "calculate_indices (vci, ndvi_anomaly, zscore)": lambda ee, col, n: pymapee.calculate_indices(
+        col, ["vci", "ndvi_anomaly", "zscore"], "NDVI", scale=0.0001),
+    "calculate_indices (all)": lambda ee, col, n: pymapee.calculate_indices(
+        col, list(pymapee.INDEX_SUITE), "NDVI", "NDVI", "NDVI", scale=0.0001),
+    "calculate_vci (dekad)": lambda ee, col, n: pymapee.calculate_vci(col, period="dekad"),
+    "period_sequence (dekad)": lambda ee, col, n: utils.period_sequence(
+        ee.Date(978307200000), ee.Date(978307200000 + n * 10 * DAY), "dekad"),
+    "cloud_mask x4": lambda ee, col, n: utils.cloud_mask(utils.cloud_mask(utils.cloud_mask(
+        utils.cloud_mask(col, 1, 1, "QA_PIXEL", 0), 2, 2, "QA_PIXEL", 0), 3, 3, "QA_PIXEL", 0),
+        4, 4, "QA_PIXEL", 0),
+    "qa_mask (landsat)": lambda ee, col, n: utils.qa_mask(col, "landsat"),
+    "gee_linear_interpolate_nan (join)": lambda ee, col, n: pymapee.gee_linear_interpolate_nan(col, 30),
+    "gee_linear_interpolate_nan (array)": lambda ee, col, n: pymapee.gee_linear_interpolate_nan(
+        col, 30, mode="array"),
+    "resample_collection": lambda ee, col, n: pymapee.resample_collection(col),
+    "chunk_maker (server)": lambda ee, col, n: pymapee.chunk_maker(
+        synthetic_region(ee), math.isqrt(n), math.isqrt(n)),
+    "chunk_maker (client)": lambda ee, col, n: pymapee.chunk_maker(
+        synthetic_region(ee), math.isqrt(n), math.isqrt(n), method="client"),
+    "export_to_googledrive": lambda ee, col, n: export_image(pymapee.export_to_googledrive(
+        pymapee.monthly_composite(col), synthetic_region(ee))),
+    "export_to_googledrive (yearly slices)": lambda ee, col, n: [export_image(task) for task in
+                                                                 pymapee.export_to_googledrive(
+        col, synthetic_region(ee), slice_period="year").values()],
+    "export_to_asset": lambda ee, col, n: export_image(pymapee.export_to_asset(
+        pymapee.monthly_composite(col), synthetic_region(ee), "users/bench/ndvi")),
+    "pipeline (recorded)": lambda ee, col, n: pipeline.Pipeline(col).qa_mask("landsat").scale(0.0001)
+    .filter_date("2001-01-01", "2030-01-01").composite().build(optimized=False),
+    "pipeline (optimized)": lambda ee, col, n: pipeline.Pipeline(col).qa_mask("landsat").scale(0.0001)
+    .filter_date("2001-01-01", "2030-01-01").composite().build(),
+}
+
+
+def measure(name, n):
+    """ Build one case over a collection of n images and return its metrics."""
+    backend = graph_ee.Backend(n_bands=n)
+    with graph_ee.installed(backend) as ee:
+        col = synthetic_collection(ee, n)
+        start = time.perf_counter()
+        out = CASES[name](ee, col, n)
+        stats = utils.expression_stats(out)
+        seconds = time.perf_counter() - start
+    stats.update({"name": name, "size": n, "round_trips": backend.round_trips,
+                  "build_seconds": round(seconds, 4)})
+    return stats
+
+
+def run(sizes=SIZES, names=None):
+    """ Measure every case (or the given names) for every size."""
+    return [measure(name, n) for name in (names or CASES) for n in sizes]
+
+
+def compare(results, baseline, tolerance=0.0):
+    """ Return the regressions of results against a baseline, as readable strings.
+
+        Args:
+            results (list): The output of run.
+            baseline (list): A stored output of run.
+            tolerance (float|optional): The relative increase allowed. Default to 0.
+    """
+    reference = {(entry["name"], entry["size"]): entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        expected = reference.get((entry["name"], entry["size"]))
+        if expected is None:
+            continue
+        for metric in METRICS:
+            if entry[metric] > expected[metric] * (1 + tolerance):
+                regressions.append("{} (n={}): {} {} -> {}".format(
+                    entry["name"], entry["size"], metric, expected[metric], entry[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--output", help="Write the results to a JSON file.")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.0)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+    results = run(args.sizes)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    if args.update_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump([{key: entry[key] for key in ("name", "size") + METRICS} for entry in results],
+                      file, indent=2)
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for line in regressions:
+        print("REGRESSION " + line, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
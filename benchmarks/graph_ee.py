@@ -0,0 +1,295 @@
+""" An offline, symbolic stand-in of the ee module recording expression graphs.
+
+Every constructor, static function and method call returns a node recording the function name
+and its arguments, and serializer.encode produces the same {"result", "values"} layout as the
+Cloud API serializer of earthengine-api, with identical subexpressions shared. Byte sizes and node
+counts differ slightly from the real serializer, but change in the same way when the graph shape
+of a pymapee function changes, which is what the benchmark suite tracks.
+
+Server round trips are answered by a Backend with synthetic values and counted.
+"""
+import contextlib
+import datetime
+import inspect
+import json
+import types
+
+import pymapee.cache
+import pymapee.executor
+import pymapee.pipeline
+import pymapee.pymapee
+import pymapee.tasks
+import pymapee.utils
+
+# The class of the value returned by a method, when it differs from the class of the receiver.
+RETURNS = {
+    "first": "Image", "toBands": "Image", "mosaic": "Image", "reduce": "Image", "toArray": "Image",
+    "size": "Number", "millis": "Number", "difference": "Number", "length": "Number",
+    "toList": "List", "bandNames": "List", "propertyNames": "List", "getOutputs": "List",
+    "coordinates": "List", "keys": "List", "geometry": "Geometry", "bounds": "Geometry",
+    "date": "Date", "projection": "Projection", "atScale": "Projection", "format": "String",
+    "coveringGrid": "FeatureCollection", "reduceRegions": "FeatureCollection", "get": "ComputedObject",
+    "iterate": "ComputedObject", "aggregate_array": "List",
+}
+
+# The class of the elements passed to a mapped function.
+ELEMENTS = {"ImageCollection": "Image", "FeatureCollection": "Feature"}
+
+
+class _Static(type):
+    # ee.Reducer.max(), ee.Filter.equals(...), ee.ImageCollection.fromImages(...), ...
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: cls._node("{}.{}".format(cls.__name__, name), args, kwargs)
+
+
+class ComputedObject(metaclass=_Static):
+    """ A symbolic Earth Engine value."""
+
+    def __init__(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and isinstance(args[0], ComputedObject):
+            # A cast: same expression, another class.
+            self._func, self._args, self._kwargs, self._var = (
+                args[0]._func, args[0]._args, args[0]._kwargs, args[0]._var)
+        else:
+            self._func, self._args, self._kwargs, self._var = type(self).__name__, args, kwargs, None
+
+    @classmethod
+    def _node(cls, func, args, kwargs=None, returns=None):
+        node = CLASSES.get(returns, cls).__new__(CLASSES.get(returns, cls))
+        node._func, node._args, node._kwargs, node._var = func, tuple(args), kwargs or {}, None
+        return node
+
+    @classmethod
+    def _variable(cls, name):
+        node = cls._node(None, ())
+        node._var = name
+        return node
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            returns = RETURNS.get(name)
+            if returns == "Image" and type(self).__name__ not in ("ImageCollection", "Image"):
+                returns = None
+            return self._node("{}.{}".format(type(self).__name__, name), (self,) + args, kwargs, returns)
+        return method
+
+    def getInfo(self):
+        raise RuntimeError("The symbolic ee module can't reach the server, install a Backend.")
+
+
+class Element(ComputedObject):
+    pass
+
+
+class Image(Element):
+    pass
+
+
+class Feature(Element):
+    pass
+
+
+class Collection(Element):
+    pass
+
+
+class ImageCollection(Collection):
+    pass
+
+
+class FeatureCollection(Collection):
+    pass
+
+
+class Number(ComputedObject):
+    pass
+
+
+class String(ComputedObject):
+    pass
+
+
+class List(ComputedObject):
+    pass
+
+
+class Dictionary(ComputedObject):
+    pass
+
+
+class Date(ComputedObject):
+    pass
+
+
+class Filter(ComputedObject):
+    pass
+
+
+class Join(ComputedObject):
+    pass
+
+
+class Reducer(ComputedObject):
+    pass
+
+
+class Geometry(ComputedObject):
+    pass
+
+
+class Projection(ComputedObject):
+    pass
+
+
+class Array(ComputedObject):
+    pass
+
+
+class Algorithms(ComputedObject):
+    pass
+
+
+CLASSES = {cls.__name__: cls for cls in (
+    ComputedObject, Element, Image, Feature, Collection, ImageCollection, FeatureCollection, Number,
+    String, List, Dictionary, Date, Filter, Join, Reducer, Geometry, Projection, Array, Algorithms)}
+
+
+def encode(ee_object, for_cloud_api=True):
+    """ Serialize a symbolic expression, sharing identical subexpressions.
+
+        Returns:
+            dict: {"result": reference, "values": {reference: value}}.
+    """
+    values, references = {}, {}
+    depth = [0]
+
+    def store(value):
+        text = json.dumps(value, sort_keys=True)
+        if text not in references:
+            references[text] = str(len(references))
+            values[references[text]] = value
+        return {"valueReference": references[text]}
+
+    def ref(value, element="ComputedObject"):
+        if isinstance(value, ComputedObject):
+            if value._var is not None:
+                return {"argumentReference": value._var}
+            # Functions mapped over a collection receive its elements.
+            receiver = type(value._args[0]).__name__ if value._args else None
+            arguments = {str(i): ref(arg, ELEMENTS.get(receiver, "ComputedObject"))
+                         for i, arg in enumerate(value._args)}
+            arguments.update({name: ref(arg) for name, arg in value._kwargs.items()})
+            return store({"functionInvocationValue": {"functionName": value._func, "arguments": arguments}})
+        if callable(value):
+            # Named after the nesting depth, like the mapping variables of earthengine-api.
+            depth[0] += 1
+            names = ["_MAPPING_VAR_{}_{}".format(depth[0], i)
+                     for i in range(len(inspect.signature(value).parameters))]
+            args = [CLASSES[element if i == 0 else "ComputedObject"]._variable(name)
+                    for i, name in enumerate(names)]
+            body = ref(value(*args))
+            depth[0] -= 1
+            return store({"functionDefinitionValue": {"argumentNames": names, "body": body}})
+        if isinstance(value, (list, tuple)):
+            return store({"arrayValue": {"values": [ref(item) for item in value]}})
+        if isinstance(value, dict):
+            return store({"dictionaryValue": {"values": {str(k): ref(v) for k, v in value.items()}}})
+        return {"constantValue": value}
+
+    result = ref(ee_object)
+    return {"result": result["valueReference"] if "valueReference" in result else result,
+            "values": values}
+
+
+def to_json(ee_object):
+    return json.dumps(encode(ee_object), sort_keys=True)
+
+
+class Task:
+    """ A symbolic export task, counting its start as a round trip."""
+
+    def __init__(self, backend, config):
+        self.backend = backend
+        self.config = config
+
+    def start(self):
+        self.backend.count()
+
+
+class Backend:
+    """ Answer getInfo round trips with synthetic values and count them.
+
+        Args:
+            n_bands (int|optional): The number of bands reported by bandNames. Default to 1.
+    """
+
+    def __init__(self, n_bands=1):
+        self.n_bands = n_bands
+        self.round_trips = 0
+
+    def count(self):
+        self.round_trips += 1
+
+    def __call__(self, ee_object):
+        self.count()
+        func = ee_object._func or ""
+        name = func.rsplit(".", 1)[-1]
+        if name == "bandNames":
+            return ["{}_NDVI".format(i) for i in range(self.n_bands)]
+        if name == "bounds":
+            return {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+        if name == "coordinates":
+            return [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]
+        if name == "projection":
+            return {"crs": "EPSG:4326"}
+        if name == "getOutputs":
+            return ["mean"]
+        if name == "size":
+            return 1
+        if name == "sort":
+            # The yearly period starts of a synthetic collection with one image every 8 days.
+            return [int(datetime.datetime(2001 + i, 1, 1, tzinfo=datetime.timezone.utc).timestamp()) * 1000
+                    for i in range(self.n_bands * 8 // 365 + 1)]
+        if func == "List":
+            return [self.n_bands, 1]
+        return {"type": "FeatureCollection", "features": []}
+
+
+def module(backend):
+    """ Return a symbolic ee module whose exports and getInfo calls go to a Backend."""
+    ee = types.SimpleNamespace(**CLASSES)
+    ee.EEException = RuntimeError
+    ee.Initialize = lambda *args, **kwargs: None
+    ee.serializer = types.SimpleNamespace(encode=encode, toJSON=to_json)
+    ee.data = types.SimpleNamespace(deleteAsset=lambda asset_id: backend.count())
+    export = types.SimpleNamespace(toDrive=lambda **config: Task(backend, config),
+                                   toAsset=lambda **config: Task(backend, config))
+    ee.batch = types.SimpleNamespace(Export=types.SimpleNamespace(image=export), Task=Task)
+    return ee
+
+
+@contextlib.contextmanager
+def installed(backend):
+    """ Replace ee in the pymapee modules by the symbolic module and send getInfo to a Backend."""
+    ee = module(backend)
+    modules = [pymapee.cache, pymapee.pipeline, pymapee.pymapee, pymapee.tasks, pymapee.utils]
+    previous = [m.ee for m in modules]
+    server_info = pymapee.cache.server_info
+    executor = pymapee.executor.set_executor(pymapee.executor.RequestExecutor(rate=None, backoff=0))
+    info_cache = pymapee.cache.set_cache(pymapee.cache.GetInfoCache())
+    for m in modules:
+        m.ee = ee
+    pymapee.cache.server_info = backend
+    try:
+        yield ee
+    finally:
+        for m, ee_module in zip(modules, previous):
+            m.ee = ee_module
+        pymapee.cache.server_info = server_info
+        pymapee.executor.set_executor(executor)
+        pymapee.cache.set_cache(info_cache)
@@ -1,9 +1,74 @@
-"""Top-level package for pymapee."""
+"""Top-level package for pymapee.
+
+The submodules are loaded on first use (PEP 562), so that `import pymapee` imports nothing else:
+`pymapee.monthly_composite` loads pymapee.pymapee and ee, only `pymapee.Map` loads the ipyleaflet
+widgets of pymapee.ipygee, and `pymapee.tiles` or `pymapee.aio` load those submodules. Headless
+workers don't need the optional dependencies (see the extras of setup.py).
+"""
+import importlib
+import importlib.util
 
 __author__ = """Tuyen Ha"""
 __email__ = 'tuyenmassey@gmail.com'
 __version__ = '__version__ = 0.0.4'
 
-from .pymapee import *
-from .utils import *
-from .ipygee import *
+SUBMODULES = ("aio", "batch", "cache", "download", "executor", "incremental", "ipygee", "local",
+              "pipeline", "pymapee", "tasks", "tiles", "tracing", "utils", "vector")
+
+# The names of the submodules that need optional dependencies (ipyleaflet).
+_NAMES = {"Map": "ipygee", "ZOOM": "ipygee", "CENTER": "ipygee", "HEIGHT": "ipygee",
+          "WIDTH": "ipygee", "SCROLL_ZOOM": "ipygee", "Pipeline": "pipeline"}
+
+# The other public names are looked up in these submodules, in order.
+_DEFAULT_MODULES = ("pymapee", "utils")
+
+# The names exported by `from pymapee import *`, which looks each of them up in __getattr__.
+__all__ = [
+    # pymapee.pymapee
+    "INDEX_SUITE", "INDEX_TERMS", "CLIMATOLOGY_STATS", "PERIOD_KEY", "initialize_ee",
+    "modis_cloud_mask", "landsat_cloud_mask", "sentinel2_cloud_mask", "monthly_composite",
+    "daily_composite", "persistent_climatology", "calculate_ndvi_anomaly", "calculate_vci",
+    "calculate_zscore", "index_composites", "index_climatology", "calculate_indices",
+    "resample_collection", "iter_values_from_image", "value_from_image", "extract_timeseries",
+    "gee_linear_interpolate_nan", "chunk_maker", "export_to_googledrive", "export_to_asset",
+    "export_tiles",
+    # pymapee.utils
+    "bitwise_extract", "cloud_mask", "cloud_mask_image", "QA_PRESETS", "qa_rules", "qa_mask",
+    "qa_mask_image", "time_convert", "date_range_col", "monthly_datetime_list",
+    "adjust_date_col", "PERIODS", "period_start", "period_slot", "PERIOD_DAYS",
+    "period_sequence", "period_key", "tag_period", "REDUCERS", "get_reducer", "group_composite",
+    "expression_stats", "climatology_reducer", "climatology_key", "period_climatology",
+    "monthly_climatology", "climatology_band", "join_climatology", "stack_climatology",
+    "unstack_climatology", "climatology_fingerprint", "gee_service_account",
+    "non_service_account", "time_search_limit", "max_diff_filter", "first_filter",
+    "second_filter", "first_join_result", "second_join_result", "linear_interpolation",
+    "col_timestamp_band", "array_interpolation", "grid_layout", "grid_cells", "server_bounds",
+    "server_layout", "server_grid", "shapefile_to_geojson", "read_geojson", "ee_tile_layer",
+    "is_package_install", "package_install", "scaling_data", "kelvin_celsius",
+    "geometry_centroid", "WKB_TYPES", "geometry_to_wkb", "data_format", "long_format", "arange",
+    "Pipeline",
+]
+# Without ipyleaflet, star-import skips the widgets instead of failing like `pymapee.Map`.
+if importlib.util.find_spec("ipyleaflet") is not None:
+    __all__ += ["Map", "ZOOM", "CENTER", "HEIGHT", "WIDTH", "SCROLL_ZOOM"]
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    if not name.startswith("_"):
+        for module_name in (_NAMES[name],) if name in _NAMES else _DEFAULT_MODULES:
+            module = importlib.import_module("." + module_name, __name__)
+            if hasattr(module, name):
+                value = getattr(module, name)
+                globals()[name] = value
+                return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    names = set(globals()) | set(SUBMODULES) | set(_NAMES)
+    for module_name in _DEFAULT_MODULES:
+        module = importlib.import_module("." + module_name, __name__)
+        names.update(name for name in dir(module) if not name.startswith("_"))
+    return sorted(names)
@@ -0,0 +1,115 @@
+""" Awaitable versions of the blocking pymapee calls for asyncio applications (Jupyter, FastAPI).
+
+The blocking functions run on a bounded thread pool shared by the whole process, and every call
+first takes a token from a global rate limiter, so many independent extractions can be awaited
+concurrently without flooding the server.
+
+    import asyncio
+    from pymapee import aio
+
+    aio.configure(max_workers=8, rate=5)
+    frames = await asyncio.gather(*[aio.value_from_image(img, fc, timeout=120) for fc in regions])
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import cache, pymapee, utils
+from .executor import TokenBucket
+
+DEFAULT_WORKERS = 8
+
+
+class RateLimiter(TokenBucket):
+    """ A token bucket (see executor.TokenBucket) that can be awaited, shared by every event loop.
+
+        Args:
+            rate (int|float): The number of calls allowed per second.
+            burst (int|optional): The number of calls allowed at once after an idle period. Default to 1.
+            clock (callable|optional): Return the current time in seconds. Default to time.monotonic.
+    """
+
+    async def acquire(self):
+        """ Wait for a token."""
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_executor = None
+_max_workers = DEFAULT_WORKERS
+_limiter = None
+_lock = threading.Lock()
+
+
+def configure(max_workers=None, rate=None, burst=1):
+    """ Set the size of the shared thread pool and the global rate limit.
+
+        Args:
+            max_workers (int|optional): The maximum number of blocking calls running at once. Default to None (unchanged).
+            rate (int|float|optional): The maximum number of calls started per second. Default to None (no limit).
+            burst (int|optional): The number of calls that may start at once. Default to 1.
+    """
+    global _executor, _max_workers, _limiter
+    with _lock:
+        if max_workers is not None:
+            if not isinstance(max_workers, int) or max_workers < 1:
+                raise ValueError("max_workers must be a positive integer.")
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+            _max_workers = max_workers
+        _limiter = None if rate is None else RateLimiter(rate, burst)
+
+
+def get_executor():
+    """ Return the shared thread pool, creating it on first use."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="pymapee-aio")
+        return _executor
+
+
+async def run(func, *args, timeout=None, **kwargs):
+    """ Run a blocking function on the shared thread pool after taking a rate limiter token.
+
+        Cancelling the awaiting task (or hitting the timeout) drops a call that hasn't started yet.
+        A call already running on the server can't be interrupted: its thread finishes in the
+        background and the result is discarded.
+
+        Args:
+            func (callable): The blocking function.
+            timeout (int|float|optional): The maximum number of seconds to wait, including the
+                                          rate limiter and the queue. Default to None.
+
+        Returns:
+            object: The value returned by func.
+    """
+    async def call():
+        if _limiter is not None:
+            await _limiter.acquire()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+    return await asyncio.wait_for(call(), timeout)
+
+
+def _wrap(name, module):
+    def wrapper(*args, timeout=None, **kwargs):
+        # Look the function up at call time so that it can be patched.
+        return run(getattr(module, name), *args, timeout=timeout, **kwargs)
+    wrapper.__name__ = wrapper.__qualname__ = name
+    wrapper.__doc__ = """ Awaitable {0}.{1}, with an optional timeout in seconds (see aio.run).""".format(
+        module.__name__, name)
+    return wrapper
+
+
+get_info = _wrap("get_info", cache)
+value_from_image = _wrap("value_from_image", pymapee)
+extract_timeseries = _wrap("extract_timeseries", pymapee)
+resample_collection = _wrap("resample_collection", pymapee)
+chunk_maker = _wrap("chunk_maker", pymapee)
+export_to_googledrive = _wrap("export_to_googledrive", pymapee)
+export_to_asset = _wrap("export_to_asset", pymapee)
+ee_tile_layer = _wrap("ee_tile_layer", utils)
@@ -0,0 +1,130 @@
+""" Paged, concurrent execution of server requests with retries."""
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import tracing
+
+
+TRANSIENT_ERRORS = ("timed out", "timeout", "deadline exceeded", "too many requests",
+                    "too many concurrent", "rate limit", "quota", "internal error", "backend error",
+                    "service unavailable", "connection reset", "connection aborted",
+                    "temporarily unavailable")
+
+TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+
+# The transient HTTP codes as whole numbers only, not in "5000 elements" or a band named B5004.
+TRANSIENT_CODES = re.compile(r"\b(429|50[0234])\b")
+
+
+def status_code(error):
+    """ Return the HTTP status code carried by an exception (requests, googleapiclient), or None."""
+    for holder, name in ((error, "status_code"), (getattr(error, "response", None), "status_code"),
+                         (getattr(error, "resp", None), "status")):
+        code = getattr(holder, name, None)
+        if code is not None:
+            try:
+                return int(code)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def is_transient(error):
+    """ Return True if an error is worth retrying (timeouts, connection and quota errors).
+
+        Deterministic failures such as an unknown band or invalid arguments return False.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = status_code(error)
+    if code is not None:
+        return code in TRANSIENT_STATUS
+    message = str(error).lower()
+    return (any(pattern in message for pattern in TRANSIENT_ERRORS)
+            or TRANSIENT_CODES.search(message) is not None)
+
+
+def retry_call(func, *args, retries=3, backoff=1.0, retry_on=is_transient, **kwargs):
+    """ Call a function and retry it with exponential backoff when it raises a transient error.
+
+        Args:
+            func (callable): The function to call.
+            retries (int|optional): The number of retries after the first failure. Default to 3.
+            backoff (int|float|optional): The delay in seconds before the first retry, doubled
+                                          on each following retry. Default to 1.
+            retry_on (callable|optional): Return True if an exception should be retried.
+                                          Default to is_transient.
+
+        Returns:
+            object: The value returned by func.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not retry_on(e):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+
+def page_offsets(n_items, page_size):
+    """ Return the (offset, size) of every page covering n_items."""
+    if not isinstance(page_size, int) or page_size < 1:
+        raise ValueError("page_size must be a positive integer.")
+    return [(offset, min(page_size, n_items - offset)) for offset in range(0, n_items, page_size)]
+
+
+def print_progress(done, total, index, seconds):
+    """ Default progress reporter of run_pages."""
+    print("Page {} done in {:.2f}s ({}/{})".format(index + 1, seconds, done, total))
+
+
+def run_pages(fetch_page, n_items, page_size, max_workers=4, retries=3, backoff=1.0, progress=None):
+    """ Fetch pages of a large request on a bounded thread pool and yield them in order.
+
+        At most 2 * max_workers pages are in flight, so results are streamed with bounded memory.
+
+        Args:
+            fetch_page (callable): A function taking (offset, size) and returning the page result.
+            n_items (int): The total number of items.
+            page_size (int): The maximum number of items per page.
+            max_workers (int|optional): The number of concurrent requests. Default to 4.
+            retries (int|optional): The number of retries of a page with a transient error. Default to 3.
+            backoff (int|float|optional): The first retry delay in seconds. Default to 1.
+            progress (callable|optional): Called with (done, total, page_index, seconds) after
+                                          each page. Default to None.
+
+        Yields:
+            tuple: (page_index, result, seconds) in page order.
+    """
+    pages = page_offsets(n_items, page_size)
+    fetch_page = tracing.propagate(fetch_page)
+
+    def timed(offset, size):
+        start = time.perf_counter()
+        result = retry_call(fetch_page, offset, size, retries=retries, backoff=backoff)
+        return result, time.perf_counter() - start
+
+    pending = deque()
+    done = 0
+
+    def collect():
+        nonlocal done
+        index, future = pending.popleft()
+        result, seconds = future.result()
+        done += 1
+        if progress is not None:
+            progress(done, len(pages), index, seconds)
+        return index, result, seconds
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for index, (offset, size) in enumerate(pages):
+            pending.append((index, executor.submit(timed, offset, size)))
+            if len(pending) >= 2 * max_workers:
+                yield collect()
+        while pending:
+            yield collect()
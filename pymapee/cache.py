@@ -0,0 +1,216 @@
+""" Memoization of getInfo round trips keyed on the serialized Earth Engine expression.
+
+get_info is meant for small metadata requests (band names, projections, bounds, sizes) that are
+asked again and again while building requests. Data payloads and values that can change on the
+server go through fetch_info, which is never cached.
+"""
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import ee
+
+from .executor import get_executor
+
+
+def server_info(ee_object):
+    """ The raw getInfo round trip."""
+    return ee_object.getInfo()
+
+
+def default_transport(ee_object, retries=None, kind="getInfo"):
+    """ Fetch the value of an Earth Engine object from the server through the request executor."""
+    return get_executor().call(kind, server_info, ee_object, retries=retries)
+
+
+def expression_key(ee_object):
+    """ Return a stable hash of an Earth Engine expression.
+
+        Args:
+            ee_object (ee.ComputedObject|object): An Earth Engine object or any JSON-serializable value.
+
+        Returns:
+            str: The SHA-256 hex digest of the serialized expression.
+    """
+    if isinstance(ee_object, ee.ComputedObject):
+        text = ee.serializer.toJSON(ee_object)
+    else:
+        text = json.dumps(ee_object, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fetch_info(ee_object, retries=None):
+    """ Uncached ee_object.getInfo(), used for data payloads and mutable server values.
+
+        Args:
+            ee_object (ee.ComputedObject): The Earth Engine object.
+            retries (int|optional): Override the retries of the request executor. Default to None.
+
+        Returns:
+            object: The getInfo result.
+    """
+    return default_transport(ee_object, retries, kind="data")
+
+
+class GetInfoCache:
+    """ A LRU cache of getInfo results with optional TTL and SQLite persistence.
+
+        Args:
+            maxsize (int|optional): The maximum number of in-memory entries. Default to 256.
+            ttl (int|float|optional): The lifetime of an entry in seconds. Default to None (never expires).
+            path (str|optional): The SQLite file used as a second-level store. Default to None (memory only).
+            transport (callable|optional): The function fetching a value from the server. Default to getInfo.
+    """
+
+    def __init__(self, maxsize=256, ttl=None, path=None, transport=None):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize must be a positive integer.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.transport = transport or (lambda ee_object: default_transport(ee_object))
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            folder = os.path.dirname(os.path.abspath(path))
+            os.makedirs(folder, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS getinfo (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+            self._db.commit()
+
+    def _expires(self):
+        if self.ttl is None:
+            return None
+        return time.time() + self.ttl
+
+    def _lookup(self, key):
+        now = time.time()
+        if key in self._entries:
+            value, expires = self._entries[key]
+            if expires is None or expires > now:
+                self._entries.move_to_end(key)
+                return True, value
+            del self._entries[key]
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires FROM getinfo WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                if row[1] is None or row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    return True, value
+                self._db.execute("DELETE FROM getinfo WHERE key = ?", (key,))
+                self._db.commit()
+        return False, None
+
+    def _remember(self, key, value, expires):
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, ee_object):
+        """ Return the value of an Earth Engine object, fetching it only on a cache miss.
+
+            Args:
+                ee_object (ee.ComputedObject): The Earth Engine object.
+
+            Returns:
+                object: A copy of the getInfo result.
+        """
+        key = expression_key(ee_object)
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return copy.deepcopy(value)
+            self.misses += 1
+        # The round trip runs outside the lock so that other threads are not blocked.
+        value = self.transport(ee_object)
+        with self._lock:
+            expires = self._expires()
+            self._remember(key, value, expires)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO getinfo VALUES (?, ?, ?)",
+                                 (key, json.dumps(value), expires))
+                self._db.commit()
+        return copy.deepcopy(value)
+
+    def clear(self):
+        """ Remove every entry and reset the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM getinfo")
+                self._db.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """ Return the cache counters.
+
+            Returns:
+                dict: hits, misses, hit_ratio and the number of in-memory entries.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0, "size": len(self._entries)}
+
+    def close(self):
+        """ Close the SQLite store, if any."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+DEFAULT_TTL = 600
+
+_default_cache = GetInfoCache(ttl=DEFAULT_TTL)
+
+
+def get_cache():
+    """ Return the cache used by get_info (None when caching is disabled)."""
+    return _default_cache
+
+
+def set_cache(cache):
+    """ Replace the cache used by get_info.
+
+        Args:
+            cache (GetInfoCache|None): The new cache. None disables caching.
+
+        Returns:
+            GetInfoCache|None: The previous cache.
+    """
+    global _default_cache
+    if not isinstance(cache, (GetInfoCache, type(None))):
+        raise TypeError("Unsupported data type. Expected GetInfoCache or None")
+    previous = _default_cache
+    _default_cache = cache
+    return previous
+
+
+def get_info(ee_object):
+    """ Memoized replacement of ee_object.getInfo() for metadata requests.
+
+        The default cache keeps up to 256 results for DEFAULT_TTL seconds. Use fetch_info for
+        data payloads.
+
+        Args:
+            ee_object (ee.ComputedObject): The Earth Engine object.
+
+        Returns:
+            object: The getInfo result.
+    """
+    if _default_cache is None:
+        return default_transport(ee_object)
+    return _default_cache.get(ee_object)
@@ -0,0 +1,256 @@
+""" Direct download of image pixels to a local memory-mapped array or Cloud-Optimized GeoTIFF.
+
+Exports go through batch tasks that can queue for minutes. For medium-size areas, download_image
+splits the area into a pixel grid of tiles that each fit in one getDownloadURL (or computePixels)
+request, fetches them concurrently and writes them into a single output:
+
+    download_image(img, aoi, "ndvi.npy", res=0.01, bands=["NDVI"])
+    ndvi = numpy.load("ndvi.npy", mmap_mode="r")    # (bands, rows, cols)
+
+The tiles share one grid aligned on multiples of res, so they stitch without gaps or overlaps.
+Every finished tile is recorded in a JSON manifest next to the output: running the same download
+again skips the completed tiles.
+"""
+import io
+import math
+import os
+
+import ee
+
+from .batch import run_pages
+from .cache import get_info
+from .executor import get_executor
+from .tasks import load_manifest, save_manifest
+
+# getDownloadURL rejects responses above 32 MB: keep the tiles at half of it.
+DEFAULT_TILE_BYTES = 16 * 2 ** 20
+
+FORMATS = ("NPY", "GEO_TIFF")
+METHODS = ("download_url", "compute_pixels")
+
+
+def pixel_grid(bounds, res):
+    """ Return the pixel grid covering a bounding box, aligned on multiples of res.
+
+        Args:
+            bounds (list): [min_x, min_y, max_x, max_y] in the grid crs.
+            res (float): The pixel size in crs units.
+
+        Returns:
+            tuple: (x0, y0, width, height), (x0, y0) being the top left corner.
+    """
+    if res <= 0:
+        raise ValueError("res must be positive.")
+    min_x, min_y, max_x, max_y = bounds
+    x0 = math.floor(min_x / res) * res
+    y0 = math.ceil(max_y / res) * res
+    width = max(1, math.ceil(round((max_x - x0) / res, 9)))
+    height = max(1, math.ceil(round((y0 - min_y) / res, 9)))
+    return x0, y0, width, height
+
+
+def tile_side(n_bands, itemsize, max_bytes=DEFAULT_TILE_BYTES):
+    """ Return the side in pixels of the largest square tile of n_bands below max_bytes."""
+    side = math.isqrt(max_bytes // (n_bands * itemsize))
+    if side < 1:
+        raise ValueError("max_bytes is too small for a single pixel.")
+    return side
+
+
+def pixel_tiles(width, height, side):
+    """ Split a grid of width x height pixels into tiles of at most side x side pixels.
+
+        Returns:
+            list: (tile id, row, col, rows, cols) tuples, row by row.
+    """
+    return [("{}_{}".format(row // side, col // side), row, col,
+             min(side, height - row), min(side, width - col))
+            for row in range(0, height, side) for col in range(0, width, side)]
+
+
+def tile_transform(x0, y0, res, row, col):
+    """ Return the affine transform [scaleX, shearX, translateX, shearY, scaleY, translateY] of a tile."""
+    return [res, 0, x0 + col * res, 0, -res, y0 - row * res]
+
+
+def decode_npy(content, bands):
+    """ Decode a NPY tile (structured by band, or a plain array) to a (bands, rows, cols) array."""
+    import numpy as np
+    data = np.load(io.BytesIO(content), allow_pickle=False)
+    if data.dtype.names:
+        return np.stack([data[band] for band in bands])
+    if data.ndim == 2:
+        return data[np.newaxis]
+    # (rows, cols, bands)
+    return np.moveaxis(data, -1, 0)
+
+
+def decode_geotiff(content, bands):
+    """ Decode a GeoTIFF tile to a (bands, rows, cols) array. Requires rasterio."""
+    from rasterio.io import MemoryFile
+    with MemoryFile(content) as memory, memory.open() as dataset:
+        return dataset.read()
+
+
+def _bounds(aoi, crs):
+    if isinstance(aoi, (list, tuple)):
+        return list(aoi)
+    geometry = aoi.geometry() if isinstance(aoi, ee.FeatureCollection) else aoi
+    coords = get_info(geometry.bounds(1, crs).coordinates())[0]
+    xs = [point[0] for point in coords]
+    ys = [point[1] for point in coords]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def _fetcher(img, bands, crs, res, x0, y0, file_format, method, session, timeout):
+    decode = decode_npy if file_format == "NPY" else decode_geotiff
+
+    def fetch(tile):
+        tile_id, row, col, rows, cols = tile
+        transform = tile_transform(x0, y0, res, row, col)
+        if method == "compute_pixels":
+            request = {"expression": img, "fileFormat": file_format, "bandIds": bands,
+                       "grid": {"dimensions": {"width": cols, "height": rows},
+                                "affineTransform": dict(zip(
+                                    ("scaleX", "shearX", "translateX", "shearY", "scaleY", "translateY"),
+                                    transform)),
+                                "crsCode": crs}}
+            # Not retried by the executor: run_pages retries the whole tile.
+            content = get_executor().call("data", ee.data.computePixels, request, retries=0)
+        else:
+            url = get_executor().call("data", img.getDownloadURL, {
+                "bands": bands, "crs": crs, "crs_transform": transform,
+                "dimensions": "{}x{}".format(cols, rows), "format": file_format}, retries=0)
+            response = session.get(url, timeout=timeout)
+            # HTTPError messages carry the status code, so 429 and 5xx are retried.
+            response.raise_for_status()
+            content = response.content
+        return decode(content, bands)
+    return fetch
+
+
+def _session(max_workers):
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def write_cog(array, file_path, crs, transform, bands, nodata=None):
+    """ Write a (bands, rows, cols) array, e.g. a memmap, to a Cloud-Optimized GeoTIFF.
+
+        The array is copied block by block to a tiled GeoTIFF, then converted by the GDAL COG
+        driver. Requires rasterio.
+    """
+    import rasterio
+    import rasterio.shutil
+    from rasterio.transform import Affine
+    from rasterio.windows import Window
+    count, height, width = array.shape
+    tmp_path = file_path + ".tmp.tif"
+    profile = {"driver": "GTiff", "width": width, "height": height, "count": count,
+               "dtype": array.dtype.name, "crs": crs, "transform": Affine(*transform[:6]),
+               "nodata": nodata, "tiled": True, "blockxsize": 512, "blockysize": 512}
+    with rasterio.open(tmp_path, "w", **profile) as dataset:
+        for row in range(0, height, 512):
+            rows = min(512, height - row)
+            dataset.write(array[:, row:row + rows], window=Window(0, row, width, rows))
+        dataset.descriptions = tuple(bands)
+    rasterio.shutil.copy(tmp_path, file_path, driver="COG", compress="DEFLATE")
+    os.remove(tmp_path)
+
+
+def download_image(img, aoi, file_path, res, crs="EPSG:4326", bands=None, dtype="float32",
+                   file_format="NPY", method="download_url", max_bytes=DEFAULT_TILE_BYTES,
+                   max_workers=4, retries=3, backoff=1.0, timeout=300, session=None, progress=None):
+    """ Download the pixels of an image over an area to a local file, tile by tile.
+
+        The area is split into tiles of at most max_bytes, fetched concurrently over a
+        connection-pooled HTTP session (or with ee.data.computePixels) and written into a
+        memory-mapped .npy array of shape (bands, rows, cols). A .tif path is written as a
+        Cloud-Optimized GeoTIFF (with rasterio) once all the tiles are in a scratch array. Completed
+        tiles are recorded in file_path + ".tiles.json" and skipped when an interrupted download is
+        run again.
+
+        Args:
+            img (ee.Image): The image to download.
+            aoi (ee.FeatureCollection|ee.Geometry|list): The area, or its [min_x, min_y, max_x, max_y]
+                                                         bounds in crs units.
+            file_path (str): The output path, ending with .npy or .tif.
+            res (float): The pixel size in crs units (degrees for EPSG:4326).
+            crs (str|optional): The output crs. Default to EPSG:4326.
+            bands (list|optional): The bands to download. Default to None (all, one getInfo).
+            dtype (str|optional): The output data type. Default to float32.
+            file_format (str|optional): The tile format, NPY or GEO_TIFF (requires rasterio). Default to NPY.
+            method (str|optional): "download_url" (getDownloadURL then HTTP GET) or "compute_pixels".
+                                   Default to download_url.
+            max_bytes (int|optional): The maximum size of a tile. Default to 16 MiB.
+            max_workers (int|optional): The number of concurrent tile requests. Default to 4.
+            retries (int|optional): The number of retries of a tile with a transient error, its server
+                                    call and HTTP download together. Default to 3.
+            backoff (int|float|optional): The first retry delay in seconds. Default to 1.
+            timeout (int|float|optional): The HTTP timeout in seconds. Default to 300.
+            session (requests.Session|optional): The HTTP session. Default to a new pooled session.
+            progress (callable|optional): Called with (done, total, tile_index, seconds) after
+                                          each tile (see batch.run_pages). Default to None.
+
+        Returns:
+            str: The output path.
+    """
+    import numpy as np
+    if not isinstance(img, ee.Image):
+        raise TypeError("Unsupported data type. Expected ee.Image")
+    if not file_path.endswith((".npy", ".tif", ".tiff")):
+        raise ValueError("Unsupported output. Please use a .npy or .tif path")
+    if file_format not in FORMATS:
+        raise ValueError("Unsupported file_format. Please choose NPY or GEO_TIFF")
+    if method not in METHODS:
+        raise ValueError("Unsupported method. Please choose download_url or compute_pixels")
+    if bands is None:
+        bands = get_info(img.bandNames())
+    bands = list(bands)
+    dtype = np.dtype(dtype)
+    x0, y0, width, height = pixel_grid(_bounds(aoi, crs), res)
+    side = tile_side(len(bands), dtype.itemsize, max_bytes)
+    tiles = pixel_tiles(width, height, side)
+
+    cog = not file_path.endswith(".npy")
+    array_path = file_path + ".npy" if cog else file_path
+    manifest_path = file_path + ".tiles.json"
+    layout = {"crs": crs, "res": res, "x0": x0, "y0": y0, "width": width, "height": height,
+              "side": side, "bands": bands, "dtype": dtype.name}
+    manifest = load_manifest(manifest_path)
+    if manifest and manifest.get("layout") != layout:
+        raise ValueError("{} belongs to another download, remove it or use another path."
+                         .format(manifest_path))
+    if manifest and not os.path.exists(array_path):
+        manifest = {}
+    done = set(manifest.get("done", []))
+    out = np.lib.format.open_memmap(array_path, mode="r+" if manifest else "w+", dtype=dtype,
+                                    shape=(len(bands), height, width))
+    manifest = {"layout": layout, "done": sorted(done)}
+    save_manifest(manifest, manifest_path)
+
+    todo = [tile for tile in tiles if tile[0] not in done]
+    if todo:
+        fetch = _fetcher(img, bands, crs, res, x0, y0, file_format, method,
+                         session or _session(max_workers), timeout)
+        pages = run_pages(lambda offset, size: fetch(todo[offset]), len(todo), 1,
+                          max_workers=max_workers, retries=retries, backoff=backoff, progress=progress)
+        for index, data, _ in pages:
+            tile_id, row, col, rows, cols = todo[index]
+            out[:, row:row + rows, col:col + cols] = data
+            # The pixels are on disk before the tile is marked as done.
+            out.flush()
+            done.add(tile_id)
+            manifest["done"] = sorted(done)
+            save_manifest(manifest, manifest_path)
+    if cog:
+        write_cog(out, file_path, crs, tile_transform(x0, y0, res, 0, 0), bands)
+        del out
+        # The scratch array is only kept to resume an interrupted download.
+        os.remove(array_path)
+        os.remove(manifest_path)
+    return file_path
@@ -0,0 +1,293 @@
+""" The central executor of server requests: adaptive rate limiting, retries and circuit breaking.
+
+Every server call of pymapee (getInfo, data pages, getMapId, task starts and polls) goes through
+get_executor().call(kind, func, ...), which
+
+- takes a token from a token bucket whose rate is halved on quota errors (at most once per
+  THROTTLE_WINDOW seconds) and slowly restored
+  after successes (additive increase, multiplicative decrease),
+- limits the number of concurrent calls of each kind,
+- retries transient and quota errors with jittered exponential backoff,
+- opens a circuit breaker after repeated transient failures, failing fast until the server recovers,
+- records metrics per call kind (calls, retries, throttle events, wait time, ...),
+- sends a record of every call to the active tracing sinks (see tracing.trace).
+"""
+import random
+import re
+import threading
+import time
+
+from . import tracing
+from .batch import is_transient, status_code
+
+QUOTA_ERRORS = ("too many concurrent", "too many requests", "quota", "rate limit",
+                "resource_exhausted", "resource exhausted")
+
+QUOTA_CODE = re.compile(r"\b429\b")
+
+DEFAULT_CONCURRENCY = {"getInfo": 8, "data": 8, "getMapId": 8, "export": 4}
+
+THROTTLE_WINDOW = 1.0
+
+
+def is_quota_error(error):
+    """ Return True if an error reports that a server quota or rate limit was exceeded."""
+    if status_code(error) == 429:
+        return True
+    message = str(error).lower()
+    return any(pattern in message for pattern in QUOTA_ERRORS) or QUOTA_CODE.search(message) is not None
+
+
+class CircuitOpenError(RuntimeError):
+    """ Raised without calling the server while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """ A thread-safe token bucket.
+
+        Args:
+            rate (int|float): The number of tokens added per second.
+            burst (int|optional): The maximum number of stored tokens. Default to 1.
+            clock (callable|optional): Return the current time in seconds. Default to time.monotonic.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate and burst must be positive.")
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self):
+        """ Take a token and return the number of seconds to wait before using it."""
+        with self._lock:
+            self._refill(self.clock())
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, sleep=time.sleep):
+        """ Wait for a token and return the waited seconds."""
+        delay = self.reserve()
+        if delay:
+            sleep(delay)
+        return delay
+
+    def set_rate(self, rate):
+        """ Change the refill rate, keeping the tokens accumulated so far."""
+        with self._lock:
+            self._refill(self.clock())
+            self.rate = rate
+
+
+class CircuitBreaker:
+    """ Fail fast after failure_threshold consecutive failures, for reset_timeout seconds.
+
+        After the timeout a single trial call is let through (half-open): a success closes
+        the circuit and a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def before(self):
+        """ Raise CircuitOpenError if a call isn't allowed now."""
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial):
+                raise CircuitOpenError("Too many failed server requests, retry later.")
+            if state == "half-open":
+                self._trial = True
+
+    def record(self, success):
+        """ Record the outcome of an allowed call."""
+        with self._lock:
+            self._trial = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class RequestExecutor:
+    """ Run server calls with adaptive rate limiting, per-kind concurrency limits, retries and a circuit breaker.
+
+        Args:
+            rate (int|float|optional): The maximum number of calls per second. Default to 10.
+                                       None disables rate limiting (and its adaptation).
+            burst (int|optional): The number of calls allowed at once after an idle period. Default to 10.
+            min_rate (int|float|optional): The lowest rate reached by throttling. Default to 0.5.
+            concurrency (dict|optional): The maximum number of concurrent calls per kind, None for
+                                         no limit. Default to DEFAULT_CONCURRENCY.
+            retries (int|optional): The number of retries of a transient or quota error. Default to 3.
+            backoff (int|float|optional): The base retry delay in seconds. The delay before retry n is
+                                          drawn uniformly in [0, backoff * 2 ** n]. Default to 1.
+            max_backoff (int|float|optional): The maximum retry delay. Default to 60.
+            failure_threshold (int|optional): The consecutive transient failures opening the circuit. Default to 5.
+            reset_timeout (int|float|optional): The seconds before a trial call once open. Default to 30.
+            sleep (callable|optional): The sleep function. Default to time.sleep.
+    """
+
+    def __init__(self, rate=10, burst=10, min_rate=0.5, concurrency=None, retries=3, backoff=1.0,
+                 max_backoff=60, failure_threshold=5, reset_timeout=30, sleep=time.sleep):
+        self.bucket = None if rate is None else TokenBucket(rate, burst)
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.concurrency = dict(DEFAULT_CONCURRENCY if concurrency is None else concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.sleep = sleep
+        self._semaphores = {}
+        self._metrics = {}
+        self._throttled_at = -THROTTLE_WINDOW
+        self._lock = threading.Lock()
+
+    def _semaphore(self, kind):
+        with self._lock:
+            if kind not in self._semaphores:
+                limit = self.concurrency.get(kind)
+                self._semaphores[kind] = None if limit is None else threading.BoundedSemaphore(limit)
+            return self._semaphores[kind]
+
+    def _count(self, kind, **values):
+        with self._lock:
+            metrics = self._metrics.setdefault(kind, {
+                "calls": 0, "successes": 0, "failures": 0, "retries": 0, "throttled": 0,
+                "rejected": 0, "wait_seconds": 0.0})
+            for name, value in values.items():
+                metrics[name] += value
+
+    def _throttle(self):
+        # Quota errors come in bursts: halve the rate at most once per THROTTLE_WINDOW.
+        now = time.monotonic()
+        with self._lock:
+            if self.bucket is None or now - self._throttled_at < THROTTLE_WINDOW:
+                return
+            self._throttled_at = now
+        self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+
+    def _recover(self):
+        if self.bucket is not None and self.bucket.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate / 50))
+
+    def call(self, kind, func, *args, retries=None, **kwargs):
+        """ Call func(*args, **kwargs) as a server request of the given kind.
+
+            Args:
+                kind (str): The call kind, e.g. getInfo, data, getMapId or export.
+                func (callable): The blocking server call.
+                retries (int|optional): Override the number of retries. Default to None.
+
+            Returns:
+                object: The value returned by func.
+        """
+        retries = self.retries if retries is None else retries
+        if tracing.enabled():
+            return tracing.record_call(kind, func, args, lambda: self._call(kind, func, args, kwargs, retries))
+        return self._call(kind, func, args, kwargs, retries)
+
+    def _call(self, kind, func, args, kwargs, retries):
+        semaphore = self._semaphore(kind)
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before()
+            except CircuitOpenError:
+                self._count(kind, rejected=1)
+                raise
+            waited = self.bucket.acquire(self.sleep) if self.bucket is not None else 0.0
+            start = time.monotonic()
+            if semaphore is not None:
+                semaphore.acquire()
+            waited += time.monotonic() - start
+            self._count(kind, calls=1, wait_seconds=waited)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                quota = is_quota_error(e)
+                transient = quota or is_transient(e)
+                # Quota errors are handled by throttling, and deterministic errors say nothing
+                # about the health of the server: only other transient errors open the circuit.
+                self.breaker.record(quota or not transient)
+                if quota:
+                    self._count(kind, throttled=1)
+                    self._throttle()
+                if not transient or attempt >= retries:
+                    self._count(kind, failures=1)
+                    raise
+            else:
+                self.breaker.record(True)
+                self._recover()
+                self._count(kind, successes=1)
+                return result
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            self._count(kind, retries=1, wait_seconds=delay)
+            self.sleep(delay)
+            attempt += 1
+
+    def metrics(self):
+        """ Return a copy of the metrics: {kind: {calls, successes, failures, retries, throttled,
+            rejected, wait_seconds}}, plus the current rate and circuit state under "executor"."""
+        with self._lock:
+            metrics = {kind: dict(values) for kind, values in self._metrics.items()}
+        metrics["executor"] = {"rate": None if self.bucket is None else self.bucket.rate,
+                               "circuit": self.breaker.state}
+        return metrics
+
+    def reset_metrics(self):
+        """ Clear the metrics."""
+        with self._lock:
+            self._metrics.clear()
+
+
+_default_executor = RequestExecutor()
+
+
+def get_executor():
+    """ Return the executor running the server calls of pymapee."""
+    return _default_executor
+
+
+def set_executor(executor):
+    """ Replace the executor running the server calls of pymapee.
+
+        Args:
+            executor (RequestExecutor): The new executor.
+
+        Returns:
+            RequestExecutor: The previous executor.
+    """
+    global _default_executor
+    if not isinstance(executor, RequestExecutor):
+        raise TypeError("Unsupported data type. Expected RequestExecutor")
+    previous = _default_executor
+    _default_executor = executor
+    return previous
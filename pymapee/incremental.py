@@ -0,0 +1,240 @@
+""" Incremental, append-only composites for rolling monitoring.
+
+A weekly job re-running monthly_composite -> calculate_vci over the whole archive recomputes
+every month although only the newest one changed. update_composites keeps a manifest of the
+periods already produced in a store, each with a fingerprint of its input images, and only
+builds the periods that are new or whose inputs changed:
+
+    store = AssetStore("users/me/vci", aoi, "vci_manifest.json")
+    climatology, _ = persistent_climatology(baseline_col, ("min", "max"))
+    update_composites(ee.ImageCollection("MODIS/061/MOD13A2").select("NDVI"), store,
+                      index="vci", climatology=climatology)
+
+The climatology is identified by its expression: when the baseline changes, every period is
+recomputed, unless invalidate_on_baseline is False.
+"""
+import hashlib
+import json
+import os
+
+import ee
+
+from . import pymapee
+from .cache import expression_key, fetch_info, get_info
+from .executor import get_executor
+from .tasks import TaskError, iter_tasks, load_manifest, save_manifest
+from .utils import PERIOD_KEY, group_composite, period_key, tag_period
+
+INDICES = ("vci", "ndvi_anomaly", "zscore")
+
+
+def period_fingerprints(rows):
+    """ Return {period start: fingerprint} of (period start, *image properties) rows.
+
+        The fingerprint of a period only depends on the set of its input images, not on their order.
+    """
+    images = {}
+    for row in rows:
+        images.setdefault(int(row[0]), []).append(json.dumps(list(row[1:]), default=str))
+    return {millis: hashlib.sha256("\n".join(sorted(values)).encode("utf-8")).hexdigest()[:32]
+            for millis, values in images.items()}
+
+
+def period_inventory(col, period="month", properties=("system:index",)):
+    """ List the input images of every period in one request and return their fingerprints.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            period (str|optional): The period name, see utils.period_start. Default to month.
+            properties (tuple|optional): The image properties identifying an input, e.g.
+                                         ("system:index", "system:version") for reprocessed
+                                         products. Default to ("system:index",).
+
+        Returns:
+            dict: {period start (millis): fingerprint}.
+    """
+    selectors = [PERIOD_KEY] + list(properties)
+    table = tag_period(col, period).reduceColumns(ee.Reducer.toList(len(selectors)), selectors)
+    # The archive grows between runs: never served from the getInfo cache.
+    return period_fingerprints(fetch_info(table.get("list")))
+
+
+def period_image(col, millis, period="month", reducer="max", index=None, climatology=None):
+    """ Build the output image of one period: its composite, or its monthly index."""
+    period_col = tag_period(col, period).filter(ee.Filter.eq(PERIOD_KEY, millis))
+    if index is None:
+        out = group_composite(period_col, period, reducer)
+    elif index == "vci":
+        out = pymapee.calculate_vci(period_col, climatology)
+    elif index == "ndvi_anomaly":
+        out = pymapee.calculate_ndvi_anomaly(period_col, 1, climatology)
+    else:
+        out = pymapee.calculate_zscore(period_col, 1, climatology)
+    return ee.Image(out.first()).set(PERIOD_KEY, millis)
+
+
+def update_composites(col, store, period="month", reducer="max", index=None, climatology=None,
+                      invalidate_on_baseline=True, properties=("system:index",)):
+    """ Compute and append to a store the periods that are new or whose inputs changed.
+
+        Args:
+            col (ee.ImageCollection): The input image collection, e.g. the whole growing archive.
+            store (AssetStore|LocalStore): Where the periods are written: any object with a
+                                           manifest_path and a write(outputs, replace) generator.
+            period (str|optional): The period name, see utils.period_start. Default to month.
+            reducer (str|ee.Reducer|optional): The composite reducer. Default to max.
+            index (str|optional): "vci", "ndvi_anomaly" or "zscore" to store a monthly index
+                                  (computed from the monthly maximum) instead of the composite.
+                                  Default to None.
+            climatology (ee.ImageCollection|optional): The fixed baseline of the index, e.g.
+                                                       from persistent_climatology. Required with index.
+            invalidate_on_baseline (bool|optional): If True, a new climatology recomputes every
+                                                    period; otherwise only new or changed periods
+                                                    use it. Default to True.
+            properties (tuple|optional): The image properties fingerprinted, see period_inventory.
+                                         Default to ("system:index",).
+
+        Returns:
+            dict: {"computed": keys written, "unchanged": keys skipped, "failed": keys not written,
+                   "errors": {key: error message} of the failed exports}.
+    """
+    if not isinstance(col, ee.ImageCollection):
+        raise TypeError("Unsupported data type. Expected data is ee.ImageCollection")
+    if index is not None:
+        if index not in INDICES:
+            raise ValueError("Unsupported index. Expected one of {}".format(", ".join(INDICES)))
+        if period != "month":
+            raise ValueError("The indices are monthly: period must be month.")
+        if climatology is None:
+            raise ValueError("A fixed climatology is required to update an index incrementally.")
+    recipe = expression_key({"period": period, "index": index, "properties": list(properties),
+                             "reducer": reducer if index is None else "max"})[:32]
+    baseline = None if climatology is None else expression_key(climatology)[:32]
+
+    manifest = load_manifest(store.manifest_path)
+    periods = manifest.setdefault("periods", {})
+    stale, unchanged = {}, []
+    for millis, fingerprint in sorted(period_inventory(col, period, properties).items()):
+        key = period_key(millis)
+        entry = periods.get(key, {})
+        # Another composite or index, or another baseline, can't be reused.
+        if (entry.get("fingerprint") == fingerprint and entry.get("recipe") == recipe
+                and (entry.get("baseline") == baseline or not invalidate_on_baseline)):
+            unchanged.append(key)
+        else:
+            stale[key] = (millis, fingerprint)
+    outputs = {key: period_image(col, millis, period, reducer, index, climatology)
+               for key, (millis, _) in stale.items()}
+    written, errors = [], {}
+    # The periods already in the store are replaced, the others appended.
+    try:
+        for key in store.write(outputs, replace=set(periods) & set(stale)):
+            # Recorded as soon as it is written, so an interrupted run keeps its progress.
+            periods[key] = {"fingerprint": stale[key][1], "recipe": recipe, "baseline": baseline}
+            save_manifest(manifest, store.manifest_path)
+            written.append(key)
+    except TaskError as error:
+        # The failed periods stay stale and are retried by the next run.
+        errors = error.failed
+    return {"computed": sorted(written), "unchanged": unchanged,
+            "failed": sorted(set(stale) - set(written)), "errors": errors}
+
+
+class AssetStore:
+    """ Store every period as an image asset <assetId>_<YYYYMMDD>, with a local JSON manifest.
+
+        The exports run with at most max_concurrent tasks (see tasks.iter_tasks); a period is
+        recorded as soon as its export completed.
+
+        Args:
+            assetId (str): The asset id prefix.
+            aoi (ee.FeatureCollection): The area to export.
+            manifest_path (str): The JSON manifest of the produced periods.
+            res (int|optional): The export resolution in meters. Default to 1000.
+            crs (str|optional): The export crs. Default to EPSG:4326.
+            max_concurrent (int|optional): The maximum number of running exports. Default to 4.
+    """
+
+    def __init__(self, assetId, aoi, manifest_path, res=1000, crs=None, max_concurrent=4):
+        self.assetId = assetId
+        self.aoi = aoi
+        self.manifest_path = manifest_path
+        self.res = res
+        self.crs = crs or "EPSG:4326"
+        self.max_concurrent = max_concurrent
+
+    def write(self, outputs, replace=()):
+        """ Export {key: ee.Image}, replacing the existing assets of the keys.
+
+            Not only the replace keys: an interrupted run may have left the asset of a new key.
+
+            Yields:
+                str: The keys, as soon as each export completed.
+
+            Raises:
+                tasks.TaskError: After the completed keys, if some exports failed.
+        """
+        if not outputs:
+            return
+        region = get_info(self.aoi.geometry().bounds())["coordinates"]
+
+        def factory(key, img):
+            asset_id = "{}_{}".format(self.assetId, key)
+
+            def create():
+                # An export can't overwrite an existing asset.
+                if get_executor().call("data", ee.data.getInfo, asset_id) is not None:
+                    get_executor().call("data", ee.data.deleteAsset, asset_id)
+                return pymapee._asset_task(img.clip(self.aoi), region, asset_id, key, self.res, self.crs)
+            return create
+        # The task manifest is kept when the run is interrupted, to re-attach to the running exports.
+        tasks_path = self.manifest_path + ".tasks"
+        handles, failed = {}, {}
+        for key, task, error in iter_tasks({key: factory(key, img) for key, img in outputs.items()},
+                                           max_concurrent=self.max_concurrent, manifest_path=tasks_path):
+            handles[key] = task
+            if error is None:
+                yield key
+            else:
+                failed[key] = error
+        os.remove(tasks_path)
+        if failed:
+            raise TaskError(failed, handles)
+
+
+class LocalStore:
+    """ Store every period as a <YYYYMMDD>.npy array of a folder (see download.download_image).
+
+        Args:
+            folder (str): The output folder, also holding manifest.json.
+            aoi (ee.FeatureCollection|ee.Geometry|list): The area, or its bounds.
+            res (float): The pixel size in crs units.
+            crs (str|optional): The crs. Default to EPSG:4326.
+            download_args (dict|optional): Other arguments of download_image (bands, max_workers...).
+    """
+
+    def __init__(self, folder, aoi, res, crs="EPSG:4326", **download_args):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.aoi = aoi
+        self.res = res
+        self.crs = crs
+        self.download_args = download_args
+        self.manifest_path = os.path.join(folder, "manifest.json")
+
+    def write(self, outputs, replace=()):
+        """ Download {key: ee.Image}, replacing the arrays of the replace keys.
+
+            Yields:
+                str: The keys, as soon as each one is written.
+        """
+        from .download import download_image
+        for key, img in outputs.items():
+            path = os.path.join(self.folder, key + ".npy")
+            if key in replace:
+                # A finished download of the old inputs would be kept as complete.
+                for stale_path in (path, path + ".tiles.json"):
+                    if os.path.exists(stale_path):
+                        os.remove(stale_path)
+            download_image(img, self.aoi, path, self.res, self.crs, **self.download_args)
+            yield key
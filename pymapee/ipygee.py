@@ -3,8 +3,8 @@ import os
 import ipyleaflet
 from ipyleaflet import (DrawControl, ScaleControl, LayersControl, MeasureControl, basemap_to_tiles,
                         basemaps, FullScreenControl, TileLayer, GeoJSON)
-import shapefile
 from .utils import (shapefile_to_geojson, read_geojson, ee_tile_layer)
+from .vector import read_features
 
 
 ZOOM = 5
@@ -59,15 +59,20 @@ class Map(ipyleaflet.Map):
         self.add_control(DrawControl(position="topleft"))
         self.add_control(MeasureControl())
 
-    def add_shapefile(self, file_path, style=None, layer_name=None):
+    def add_shapefile(self, file_path, style=None, layer_name=None, tolerance=None, precision=None):
         """Add a shapefile to Map.
 
         Args:
             file_path (str): The input shapefile path.
             style (dict, optional): A dict contains styling map. Defaults to None.
             layer_name (str, optional): The displaying name on the map. Defaults to None.
+            tolerance (float, optional): Simplify the geometries while reading (see vector.read_features). Defaults to None.
+            precision (int, optional): Round the coordinates to this number of decimals. Defaults to None.
         """
-        data = shapefile_to_geojson(file_path=os.path.abspath(file_path))
+        if tolerance is None and precision is None:
+            data = shapefile_to_geojson(file_path=os.path.abspath(file_path))
+        else:
+            data = _read_simplified(os.path.abspath(file_path), tolerance, precision)
         if style is None:
             style = self.styles
         if layer_name is None:
@@ -75,15 +80,20 @@ class Map(ipyleaflet.Map):
         geojson_data = GeoJSON(data=data, style=style, name=layer_name)
         self.add_layer(geojson_data)
 
-    def add_geojson(self, file_path, style=None, layer_name=None):
+    def add_geojson(self, file_path, style=None, layer_name=None, tolerance=None, precision=None):
         """Add a vector in GeoJSON format to the map.
 
         Args:
             file_path (str): The input GeoJSON file.
             style (str, optional): The styling map to display. Defaults to None.
             layer_name (str, optional): The displaying name on the map. Defaults to None.
+            tolerance (float, optional): Simplify the geometries while reading (see vector.read_features). Defaults to None.
+            precision (int, optional): Round the coordinates to this number of decimals. Defaults to None.
         """
-        data = read_geojson(os.path.abspath(file_path))
+        if tolerance is None and precision is None:
+            data = read_geojson(os.path.abspath(file_path))
+        else:
+            data = _read_simplified(os.path.abspath(file_path), tolerance, precision)
         if style is None:
             style = self.styles
         if layer_name is None:
@@ -91,8 +101,25 @@ class Map(ipyleaflet.Map):
         geojson_data = GeoJSON(data=data, style=style, name=layer_name)
         self.add_layer(geojson_data)
 
-    def add_ee_layer(self, ee_object, vis_params={}, layer_name="Image", show=True, opacity=1):
+    def add_ee_layer(self, ee_object, vis_params={}, layer_name="Image", show=True, opacity=1, proxy=None):
+        """Add an Earth Engine object to the map.
+
+        Args:
+            ee_object (ee.Image|ee.ImageCollection|ee.FeatureCollection): The object to display.
+            vis_params (dict, optional): The visualization parameters. Defaults to {}.
+            layer_name (str, optional): The displaying name on the map. Defaults to "Image".
+            show (bool, optional): The layer visibility. Defaults to True.
+            opacity (int|float, optional): The layer opacity. Defaults to 1.
+            proxy (tiles.TileProxy, optional): A running local tile proxy caching and prefetching
+                the tiles. Defaults to None.
+        """
         img = ee_tile_layer(ee_object, vis_params=vis_params,
-                            layer_name=layer_name, show=show, opacity=opacity)
+                            layer_name=layer_name, show=show, opacity=opacity, proxy=proxy)
         self.add_layer(img)
     addLayer = add_ee_layer
+
+
+def _read_simplified(file_path, tolerance, precision):
+    # Only the simplified features are kept in memory.
+    return {"type": "FeatureCollection",
+            "features": list(read_features(file_path, tolerance, precision))}
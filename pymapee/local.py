@@ -0,0 +1,853 @@
+""" Local NumPy implementations of the pymapee algorithms.
+
+Arrays follow the Earth Engine conventions used in pymapee: time is the first axis,
+masked pixels are NaN and timestamps are either datetime objects or
+system:time_start milliseconds.
+"""
+import datetime
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+##############################################################################
+#                            Datetime Untilities                             #
+##############################################################################
+
+
+def to_datetime(value):
+    """ Convert a timestamp to a naive UTC Python datetime.
+
+        Args:
+            value (datetime.datetime|datetime.date|numpy.datetime64|int|float): The timestamp.
+                  Numbers are read as system:time_start milliseconds.
+
+        Returns:
+            datetime.datetime: The Python datetime object.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    if isinstance(value, (int, float)):
+        return EPOCH + datetime.timedelta(milliseconds=value)
+    if hasattr(value, "astype"):
+        # numpy.datetime64
+        return EPOCH + datetime.timedelta(microseconds=int(value.astype("datetime64[us]").astype("int64")))
+    raise TypeError("Unsupported data type!")
+
+
+def to_millis(value):
+    """ Convert a timestamp to system:time_start milliseconds."""
+    delta = to_datetime(value) - EPOCH
+    return int(round(delta.total_seconds() * 1000))
+
+
+def _period_day(date):
+    return datetime.datetime(date.year, date.month, date.day)
+
+
+def _period_pentad(date):
+    return datetime.datetime(date.year, date.month, min((date.day - 1) // 5, 5) * 5 + 1)
+
+
+def _period_week(date):
+    return _period_day(date) - datetime.timedelta(days=date.weekday())
+
+
+def _period_dekad(date):
+    return datetime.datetime(date.year, date.month, min((date.day - 1) // 10, 2) * 10 + 1)
+
+
+def _period_month(date):
+    return datetime.datetime(date.year, date.month, 1)
+
+
+def _period_year(date):
+    return datetime.datetime(date.year, 1, 1)
+
+
+# The start months of the periods made of whole months. A custom calendar is given as its own
+# tuple of start months, e.g. (11, 5) for a November-April wet and a May-October dry season.
+SEASONS = {
+    "season": (3, 6, 9, 12),
+    "water_year": (10,),
+}
+
+
+def season_table(months):
+    """ Return the season of every calendar month for a tuple of season start months.
+
+        Returns:
+            list: 12 (year offset, start month, season number from 1) tuples, for January to December.
+                  A season starting in an earlier year (e.g. December for January) has offset -1.
+    """
+    months = sorted(months)
+    table = []
+    for month in range(1, 13):
+        earlier = [m for m in months if m <= month]
+        if earlier:
+            table.append((0, earlier[-1], len(earlier)))
+        else:
+            table.append((-1, months[-1], len(months)))
+    return table
+
+
+def _period_season(date, months):
+    offset, start, _ = season_table(months)[date.month - 1]
+    return datetime.datetime(date.year + offset, start, 1)
+
+
+PERIODS = {
+    "day": _period_day,
+    "pentad": _period_pentad,
+    "week": _period_week,
+    "dekad": _period_dekad,
+    "month": _period_month,
+    "season": lambda date: _period_season(date, SEASONS["season"]),
+    "water_year": lambda date: _period_season(date, SEASONS["water_year"]),
+    "year": _period_year,
+}
+
+
+def normalize_period(period):
+    """ Validate a period, shared by the local and server implementations.
+
+        Args:
+            period (str|tuple): A period name (see PERIODS) or a tuple of season start months (1-12).
+
+        Returns:
+            str|tuple: The lower-case period name, or the sorted tuple of start months.
+    """
+    if isinstance(period, (tuple, list)):
+        months = tuple(sorted(set(period)))
+        if not months or not all(isinstance(m, int) and 1 <= m <= 12 for m in months):
+            raise ValueError("A custom season is a tuple of start months between 1 and 12.")
+        return months
+    if not isinstance(period, str):
+        raise TypeError("Unsupported data type. Period should be string or a tuple of months")
+    period = period.lower().strip()
+    if period not in PERIODS:
+        raise ValueError(
+            "Unsupported period. Please choose one of {} or a tuple of start months".format(
+                ", ".join(PERIODS)))
+    return period
+
+
+def period_start(date, period="month"):
+    """ Return the start of the period that contains a date (see utils.period_start).
+
+        Args:
+            date (datetime.datetime|int): The input date or system:time_start milliseconds.
+            period (str|tuple|optional): The period name or a tuple of season start months.
+                                         Default to month.
+
+        Returns:
+            datetime.datetime: The first date of the period.
+    """
+    period = normalize_period(period)
+    date = to_datetime(date)
+    if isinstance(period, tuple):
+        return _period_season(date, period)
+    return PERIODS[period](date)
+
+
+def period_slot(date, period="month"):
+    """ Return the position of the period of a date within its year (see utils.period_slot).
+
+        The slot keys the climatologies: the day of year, pentad 1-72, ISO week 1-53,
+        dekad 1-36, month 1-12, the season number (1 for the earliest start month in the year)
+        and 1 for years.
+
+        Args:
+            date (datetime.datetime|int): The input date or system:time_start milliseconds.
+            period (str|tuple|optional): The period name or a tuple of season start months.
+                                         Default to month.
+
+        Returns:
+            int: The slot of the period.
+    """
+    period = normalize_period(period)
+    date = to_datetime(date)
+    if isinstance(period, tuple) or period in SEASONS:
+        return season_table(SEASONS.get(period, period))[date.month - 1][2]
+    if period == "day":
+        return date.timetuple().tm_yday
+    if period == "pentad":
+        return (date.month - 1) * 6 + min((date.day - 1) // 5, 5) + 1
+    if period == "week":
+        return date.isocalendar()[1]
+    if period == "dekad":
+        return (date.month - 1) * 3 + min((date.day - 1) // 10, 2) + 1
+    if period == "month":
+        return date.month
+    return 1
+
+
+def period_sequence(start, end, period="month"):
+    """ Return the starts of the periods overlapping [start, end) (see utils.period_sequence).
+
+        Args:
+            start (datetime.datetime|int): The first date.
+            end (datetime.datetime|int): The end date (exclusive).
+            period (str|tuple|optional): The period name or a tuple of season start months.
+                                         Default to month.
+
+        Returns:
+            list: The period start datetimes, sorted.
+    """
+    end = to_datetime(end)
+    current = period_start(start, period)
+    starts = []
+    while current < end:
+        starts.append(current)
+        # Step to the first day of the next period.
+        day = current
+        while period_start(day, period) == current:
+            day += datetime.timedelta(days=1)
+        current = day
+    return starts
+
+
+##############################################################################
+#                            Temporal Compositing                            #
+##############################################################################
+
+
+def _first_valid(data, reverse=False):
+    import numpy as np
+    valid = ~np.isnan(data)
+    if reverse:
+        data, valid = data[::-1], valid[::-1]
+    index = np.expand_dims(valid.argmax(axis=0), 0)
+    out = np.take_along_axis(data, index, axis=0)[0]
+    return out
+
+
+REDUCERS = {
+    "mean": "nanmean", "average": "nanmean",
+    "max": "nanmax", "maximum": "nanmax",
+    "min": "nanmin", "minimum": "nanmin",
+    "median": "nanmedian", "mvc": "nanmedian",
+    "sum": "nansum", "total": "nansum",
+    "std": "nanstd",
+}
+
+
+def get_reducer(reducer):
+    """ Return a NumPy function reducing over the first (time) axis.
+
+        Args:
+            reducer (str|callable): The reducer name (see utils.get_reducer) or a function
+                                    taking an array and returning it reduced over axis 0.
+
+        Returns:
+            callable: The reducer function.
+    """
+    import numpy as np
+    if callable(reducer):
+        return reducer
+    if not isinstance(reducer, str):
+        raise TypeError("Unsupported data type. Reducer should be string")
+    name = reducer.lower().strip()
+    if name in REDUCERS:
+        func = getattr(np, REDUCERS[name])
+        return lambda data: func(data, axis=0)
+    if name == "count":
+        return lambda data: (~np.isnan(data)).sum(axis=0)
+    if name == "first":
+        return _first_valid
+    if name == "last":
+        return lambda data: _first_valid(data, reverse=True)
+    if name.startswith("p") and name[1:].replace(".", "", 1).isdigit():
+        return lambda data: np.nanpercentile(data, float(name[1:]), axis=0)
+    raise ValueError(
+        "Unsupported reducer. Please choose one of {}, count, first, last or p<N>".format(", ".join(REDUCERS)))
+
+
+def group_composite(times, data, period="month", reducer="max"):
+    """ Composite a local time-series cube by period, mirroring utils.group_composite.
+
+        Args:
+            times (list): The timestamps of the first axis of data.
+            data (numpy.ndarray): The input cube with time as the first axis. NaN is treated as masked.
+            period (str|optional): The period name, see period_start. Default to month.
+            reducer (str|callable|optional): The reducer, see get_reducer. Default to max.
+
+        Returns:
+            tuple: (list of period start datetimes, numpy.ndarray with one slice per period).
+    """
+    import numpy as np
+    import warnings
+    data = np.asarray(data, dtype="float64")
+    if len(times) != data.shape[0]:
+        raise ValueError("The number of timestamps must match the first axis of data.")
+    func = get_reducer(reducer)
+    keys = np.array([to_millis(period_start(t, period)) for t in times])
+    starts = np.unique(keys)
+    out = np.empty((len(starts),) + data.shape[1:], dtype="float64")
+    with warnings.catch_warnings():
+        # All-NaN pixels stay NaN (masked) as they do in Earth Engine.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for i, key in enumerate(starts):
+            out[i] = func(data[keys == key])
+    return [to_datetime(int(k)) for k in starts], out
+
+
+##############################################################################
+#                                 Cloud Mask                                 #
+##############################################################################
+
+
+def bitwise_extract(qa, from_bit, to_bit):
+    """ Extract bits from_bit..to_bit (inclusive) of an integer QA array (see utils.bitwise_extract)."""
+    import numpy as np
+    qa = np.asarray(qa)
+    if qa.dtype.kind == "f":
+        # Masked (NaN) QA values are kept masked by the caller.
+        qa = np.nan_to_num(qa, nan=0)
+    mask = (1 << (to_bit - from_bit + 1)) - 1
+    return (qa.astype("int64") >> from_bit) & mask
+
+
+def cloud_mask(data, from_bit, to_bit, QA_band, threshold=1):
+    """ Mask cloud-related pixels of a (..., band) array, mirroring utils.cloud_mask.
+
+        Args:
+            data (numpy.ndarray): The input cube with bands as the last axis.
+            from_bit (int): The starting bit to extract bitmask.
+            to_bit (int): The ending bit value to extract bitmask.
+            QA_band (int): The index of the quality assurance band.
+            threshold (int|optional): The threshold that retains cloud-free pixels.
+
+        Returns:
+            numpy.ndarray: A float cube where every band of a cloudy pixel is NaN.
+    """
+    import numpy as np
+    data = np.asarray(data, dtype="float64")
+    qa = data[..., QA_band]
+    keep = (bitwise_extract(qa, from_bit, to_bit) <= threshold) & ~np.isnan(qa)
+    return np.where(keep[..., None], data, np.nan)
+
+
+def compile_qa_rules(rules):
+    """ Compile QA bit rules into the terms of a single bitwise test (see utils.qa_mask).
+
+        A pixel is kept when qa & zero_mask == 0 and ((qa >> from_bit) & mask) <= threshold for every
+        field: all the rules with a zero threshold share one bitwise AND, and the rules that keep every
+        value are dropped.
+
+        Args:
+            rules (list): The (from_bit, to_bit, threshold) rules.
+
+        Returns:
+            tuple: (zero_mask, list of (from_bit, mask, threshold) fields).
+    """
+    zero_mask, fields = 0, []
+    for from_bit, to_bit, threshold in rules:
+        if from_bit < 0 or to_bit < from_bit:
+            raise ValueError("Invalid bit range: {}-{}.".format(from_bit, to_bit))
+        if threshold < 0:
+            raise ValueError("The threshold of a QA rule can't be negative.")
+        mask = (1 << (to_bit - from_bit + 1)) - 1
+        if threshold >= mask:
+            continue
+        if threshold == 0:
+            zero_mask |= mask << from_bit
+        else:
+            fields.append((from_bit, mask, threshold))
+    return zero_mask, fields
+
+
+def qa_mask(data, rules, QA_band):
+    """ Mask the pixels failing any QA bit rule of a (..., band) array, mirroring utils.qa_mask.
+
+        Args:
+            data (numpy.ndarray): The input cube with bands as the last axis.
+            rules (list): The (from_bit, to_bit, threshold) rules.
+            QA_band (int): The index of the quality assurance band.
+
+        Returns:
+            numpy.ndarray: A float cube where every band of a masked pixel is NaN.
+    """
+    import numpy as np
+    data = np.asarray(data, dtype="float64")
+    qa = data[..., QA_band]
+    bits = np.nan_to_num(qa, nan=0).astype("int64")
+    zero_mask, fields = compile_qa_rules(rules)
+    keep = ((bits & zero_mask) == 0) & ~np.isnan(qa)
+    for from_bit, mask, threshold in fields:
+        keep &= ((bits >> from_bit) & mask) <= threshold
+    return np.where(keep[..., None], data, np.nan)
+
+
+##############################################################################
+#                                Climatology                                 #
+##############################################################################
+
+
+def period_climatology(times, data, period="month", stats=("mean", "min", "max", "std")):
+    """ Per-slot statistics of a cube, mirroring utils.period_climatology.
+
+        Returns:
+            dict: {slot (see period_slot): {statistic: array}} for the slots present in times.
+    """
+    import numpy as np
+    data = np.asarray(data, dtype="float64")
+    slots = np.array([period_slot(t, period) for t in times])
+    out = {}
+    for slot in np.unique(slots):
+        subset = data[slots == slot]
+        out[int(slot)] = {stat: get_reducer(stat)(subset) for stat in stats}
+    return out
+
+
+def monthly_climatology(times, data, stats=("mean", "min", "max", "std")):
+    """ Per-calendar-month statistics of a cube, mirroring utils.monthly_climatology.
+
+        Returns:
+            dict: {month (1-12): {statistic: array}} for the months present in times.
+    """
+    return period_climatology(times, data, "month", stats)
+
+
+def calculate_vci(times, data, period="month"):
+    """ Vegetation condition index of a cube, mirroring pymapee.calculate_vci.
+
+        Returns:
+            tuple: (list of period start datetimes, numpy.ndarray of VCI values).
+    """
+    import numpy as np
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        clim = period_climatology(times, data, period, ("min", "max"))
+        starts, composites = group_composite(times, data, period, "max")
+        vci = np.empty_like(composites)
+        for i, start in enumerate(starts):
+            stats = clim[period_slot(start, period)]
+            vci[i] = (composites[i] - stats["min"]) / (stats["max"] - stats["min"]) * 100
+    # Earth Engine masks divisions by zero.
+    vci[~np.isfinite(vci)] = np.nan
+    return starts, vci
+
+
+def calculate_zscore(times, data, scale=1, period="month"):
+    """ Z-scores of a cube, mirroring pymapee.calculate_zscore.
+
+        The maxima of every period are standardized with the mean and standard deviation of all
+        the (scaled) observations of the same slot, e.g. of their calendar month.
+
+        Returns:
+            tuple: (list of period start datetimes, numpy.ndarray of z-scores).
+    """
+    import numpy as np
+    import warnings
+    data = np.asarray(data, dtype="float64") * scale
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        clim = period_climatology(times, data, period, ("mean", "std"))
+        starts, composites = group_composite(times, data, period, "max")
+        zscore = np.empty_like(composites)
+        for i, start in enumerate(starts):
+            stats = clim[period_slot(start, period)]
+            zscore[i] = (composites[i] - stats["mean"]) / stats["std"]
+    zscore[~np.isfinite(zscore)] = np.nan
+    return starts, zscore
+
+
+# The output band of every index of calculate_indices (see pymapee.calculate_indices).
+INDEX_SUITE = {"vci": "VCI", "tci": "TCI", "vhi": "VHI", "ndvi_anomaly": "VAI", "zscore": "ZSCORE",
+               "spi": "SPI"}
+
+# Every fused index is (a - b) / (hi - lo) * k: the input role and statistic of a, b, hi and lo
+# (None for the composite, a number for a constant), and k.
+INDEX_TERMS = {
+    "vci": (("vegetation", None), ("vegetation", "min"), ("vegetation", "max"),
+            ("vegetation", "min"), 100),
+    "tci": (("temperature", "max"), ("temperature", None), ("temperature", "max"),
+            ("temperature", "min"), 100),
+    "ndvi_anomaly": (("vegetation", None), ("vegetation", "mean"), 1, 0, 1),
+    "zscore": (("vegetation", None), ("vegetation", "mean"), ("vegetation", "std"), 0, 1),
+    "spi": (("precipitation", None), ("precipitation", "mean"), ("precipitation", "std"), 0, 1),
+}
+
+
+def index_inputs(indices, vegetation=None, temperature=None, precipitation=None):
+    """ Check the indices of calculate_indices and return what they need, shared with pymapee.
+
+        Returns:
+            tuple: (list of the fused indices, in INDEX_TERMS order, {role: band name},
+                   {role: list of climatology statistics}).
+    """
+    if isinstance(indices, str):
+        indices = [indices]
+    indices = list(indices)
+    unknown = [name for name in indices if name not in INDEX_SUITE]
+    if not indices or unknown:
+        raise ValueError("Unsupported index. Please choose from {}".format(", ".join(INDEX_SUITE)))
+    fused = set(indices) - {"vhi"}
+    if "vhi" in indices:
+        fused |= {"vci", "tci"}
+    fused = [name for name in INDEX_TERMS if name in fused]
+    bands = {"vegetation": vegetation, "temperature": temperature, "precipitation": precipitation}
+    stats = {}
+    for name in fused:
+        for term in INDEX_TERMS[name][:4]:
+            if isinstance(term, tuple):
+                role, stat = term
+                if bands[role] is None:
+                    raise ValueError("{} requires the {} band.".format(name, role))
+                stats.setdefault(role, [])
+                if stat is not None and stat not in stats[role]:
+                    stats[role].append(stat)
+    bands = {role: band for role, band in bands.items() if role in stats}
+    # The statistics in the order of utils.CLIMATOLOGY_STATS, like the reducers.
+    stats = {role: [stat for stat in ("mean", "min", "max", "std", "count") if stat in values]
+             for role, values in stats.items()}
+    return fused, bands, stats
+
+
+def calculate_indices(times, vegetation=None, temperature=None, precipitation=None,
+                      indices=("vci", "ndvi_anomaly", "zscore"), scale=1, period="month", vhi_weight=0.5):
+    """ Drought and vegetation indices of cubes, mirroring pymapee.calculate_indices.
+
+        Args:
+            times (list): The timestamps of the first axis of the cubes.
+            vegetation, temperature, precipitation (numpy.ndarray|optional): The input cubes.
+            indices (list|optional): The index names. Default to (vci, ndvi_anomaly, zscore).
+            scale (int|float|optional): Scaling factor of the inputs. Default to 1.
+            period (str|tuple|optional): The period, see period_start. Default to month.
+            vhi_weight (float|optional): The weight of VCI in VHI. Default to 0.5.
+
+        Returns:
+            tuple: (list of period start datetimes, {index name: numpy.ndarray}).
+    """
+    import numpy as np
+    import warnings
+    if isinstance(indices, str):
+        indices = [indices]
+    arrays = {"vegetation": vegetation, "temperature": temperature, "precipitation": precipitation}
+    fused, bands, stats = index_inputs(indices, **{role: role for role, array in arrays.items()
+                                                   if array is not None})
+    out = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        composites, clim = {}, {}
+        for role in bands:
+            data = np.asarray(arrays[role], dtype="float64") * scale
+            reducer = "sum" if role == "precipitation" else "max"
+            starts, composites[role] = group_composite(times, data, period, reducer)
+            if role == "precipitation":
+                # Standardized with the statistics of the period totals.
+                clim[role] = period_climatology(starts, composites[role], period, stats[role])
+            else:
+                clim[role] = period_climatology(times, data, period, stats[role])
+        slots = [period_slot(start, period) for start in starts]
+
+        def operand(term, i):
+            if not isinstance(term, tuple):
+                return term
+            role, stat = term
+            return composites[role][i] if stat is None else clim[role][slots[i]][stat]
+        for name in fused:
+            values = np.empty_like(composites[INDEX_TERMS[name][0][0]])
+            for i in range(len(starts)):
+                a, b, hi, lo = (operand(term, i) for term in INDEX_TERMS[name][:4])
+                values[i] = (a - b) / (hi - lo) * INDEX_TERMS[name][4]
+            # Earth Engine masks divisions by zero.
+            values[~np.isfinite(values)] = np.nan
+            out[name] = values
+    if "vhi" in indices:
+        out["vhi"] = vhi_weight * out["vci"] + (1 - vhi_weight) * out["tci"]
+    return starts, {name: out[name] for name in indices}
+
+
+##############################################################################
+#                         Interpolation Untilities                           #
+##############################################################################
+
+
+def nearest_valid_index(valid, reverse=False):
+    """ Index of the nearest valid observation at or before (or after) each step of the first axis.
+
+        Args:
+            valid (numpy.ndarray): A boolean array with time as the first axis.
+            reverse (bool|optional): If True, look at or after each step. Default to False.
+
+        Returns:
+            numpy.ndarray: The indices, -1 (or len) where there is none.
+    """
+    import numpy as np
+    n = valid.shape[0]
+    steps = np.arange(n).reshape((n,) + (1,) * (valid.ndim - 1))
+    if reverse:
+        index = np.where(valid, steps, n)
+        return np.minimum.accumulate(index[::-1], axis=0)[::-1]
+    index = np.where(valid, steps, -1)
+    return np.maximum.accumulate(index, axis=0)
+
+
+def linear_interpolate_nan(times, data, days=30):
+    """ Fill masked values by linear interpolation in time, mirroring pymapee.gee_linear_interpolate_nan.
+
+        For every masked value, the nearest valid observations at most `days` before and after
+        are interpolated in time. Values without a neighbour on both sides stay NaN. Like the
+        Earth Engine version, the interpolation times come from the validity of the first band.
+
+        Args:
+            times (list): The timestamps of the first axis of data.
+            data (numpy.ndarray): The input cube (time, ..., band). NaN is treated as masked.
+            days (int|optional): The search window in days. Default to 30.
+
+        Returns:
+            numpy.ndarray: The interpolated cube.
+    """
+    import numpy as np
+    if not isinstance(days, int):
+        raise TypeError("Invalid data type!")
+    data = np.asarray(data, dtype="float64")
+    millis = np.array([to_millis(t) for t in times], dtype="float64")
+    order = np.argsort(millis, kind="stable")
+    data, millis = data[order], millis[order]
+    window = days * 86400000.0
+    shape = (-1,) + (1,) * (data.ndim - 1)
+    t = millis.reshape(shape)
+
+    def neighbours(valid, reverse):
+        index = nearest_valid_index(valid, reverse)
+        found = (index >= 0) & (index < len(millis))
+        index = np.clip(index, 0, len(millis) - 1)
+        found &= np.abs(millis[index] - t) <= window
+        return index, found
+
+    # Timestamps follow the mask of the first band, as col_timestamp_band does.
+    valid_t = ~np.isnan(data[..., :1])
+    i1, f1 = neighbours(valid_t, False)
+    i2, f2 = neighbours(valid_t, True)
+    t1 = np.where(f1, millis[i1], np.nan)
+    t2 = np.where(f2, millis[i2], np.nan)
+    valid = ~np.isnan(data)
+    j1, g1 = neighbours(valid, False)
+    j2, g2 = neighbours(valid, True)
+    before = np.where(g1, np.take_along_axis(data, j1, axis=0), np.nan)
+    after = np.where(g2, np.take_along_axis(data, j2, axis=0), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = (t - t1) / (t2 - t1)
+        interpolated = before + (after - before) * ratio
+    interpolated[~np.isfinite(interpolated)] = np.nan
+    out = np.where(valid, data, interpolated)
+    return out[np.argsort(order, kind="stable")]
+
+
+GAP_FILL_METHODS = ("linear", "nearest", "spline")
+
+
+def _shift_index(nearest, index, step):
+    """ Look up nearest[index + step] along the first axis, -1/len where out of range."""
+    import numpy as np
+    n = nearest.shape[0]
+    shifted = index + step
+    inside = (shifted >= 0) & (shifted < n)
+    out = np.take_along_axis(nearest, np.clip(shifted, 0, n - 1), axis=0)
+    return np.where(inside, out, -1 if step < 0 else n)
+
+
+def _gap_fill_block(data, millis, method, max_gap, window):
+    import numpy as np
+    n = data.shape[0]
+    t = millis.reshape((-1,) + (1,) * (data.ndim - 1))
+    valid = ~np.isnan(data)
+    previous = nearest_valid_index(valid)
+    following = nearest_valid_index(valid, reverse=True)
+
+    def lookup(index):
+        found = (index >= 0) & (index < n)
+        index = np.clip(index, 0, n - 1)
+        return np.where(found, np.take_along_axis(data, index, axis=0), np.nan), \
+            np.where(found, millis[index], np.nan)
+
+    p1, t1 = lookup(previous)
+    p2, t2 = lookup(following)
+    usable = np.isfinite(t1) & np.isfinite(t2)
+    if max_gap is not None:
+        usable &= (t2 - t1) <= max_gap
+    if window is not None:
+        usable &= ((t - t1) <= window) & ((t2 - t) <= window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        h = t2 - t1
+        s = np.where(h > 0, (t - t1) / h, 0.0)
+        if method == "nearest":
+            filled = np.where(t - t1 <= t2 - t, p1, p2)
+        elif method == "linear":
+            filled = p1 + (p2 - p1) * s
+        else:
+            # Cubic Hermite spline with three-point (Bessel) tangents on uneven time steps,
+            # falling back to the secant where there is no outer neighbour.
+            p0, t0 = lookup(_shift_index(previous, previous, -1))
+            p3, t3 = lookup(_shift_index(following, following, 1))
+            secant = (p2 - p1) / h
+            m1 = ((t2 - t1) * (p1 - p0) / (t1 - t0) + (t1 - t0) * secant) / (t2 - t0)
+            m2 = ((t3 - t2) * secant + h * (p3 - p2) / (t3 - t2)) / (t3 - t1)
+            m1 = np.where(np.isfinite(m1), m1, secant)
+            m2 = np.where(np.isfinite(m2), m2, secant)
+            s2, s3 = s * s, s * s * s
+            filled = ((2 * s3 - 3 * s2 + 1) * p1 + (s3 - 2 * s2 + s) * h * m1 +
+                      (-2 * s3 + 3 * s2) * p2 + (s3 - s2) * h * m2)
+    filled = np.where(usable & np.isfinite(filled), filled, np.nan)
+    return np.where(valid, data, filled)
+
+
+def gap_fill(times, data, method="linear", max_gap=None, window=None):
+    """ Fill masked values of a time series cube in one vectorized pass over the time axis.
+
+        The nearest valid observations before and after every step are found with a forward and
+        backward fill of indices, then interpolated. Dask arrays are processed block by block
+        (the time axis is merged into a single chunk), so cubes larger than memory can be filled.
+
+        Args:
+            times (list): The timestamps of the first axis of data.
+            data (numpy.ndarray|dask.array.Array): The input cube with time as the first axis. NaN is masked.
+            method (str|optional): "linear", "nearest" or "spline" (piecewise cubic Hermite). Default to linear.
+            max_gap (int|float|optional): The longest gap in days, between the two valid observations,
+                                          that is filled. Default to None (no limit).
+            window (int|float|optional): The maximum distance in days to each valid neighbour, like the
+                                         days of gee_linear_interpolate_nan. Default to None (no limit).
+
+        Returns:
+            numpy.ndarray|dask.array.Array: The filled cube, in the input time order.
+    """
+    import numpy as np
+    if method not in GAP_FILL_METHODS:
+        raise ValueError("Unsupported method. Please choose {}".format(", ".join(GAP_FILL_METHODS)))
+    millis = np.array([to_millis(t) for t in times], dtype="float64")
+    if len(millis) != data.shape[0]:
+        raise ValueError("The number of timestamps must match the first axis of data.")
+    day = 86400000.0
+    max_gap = None if max_gap is None else max_gap * day
+    window = None if window is None else window * day
+    order = np.argsort(millis, kind="stable")
+    restore = np.argsort(order, kind="stable")
+    sorted_millis = millis[order]
+    if hasattr(data, "map_blocks") and hasattr(data, "rechunk"):
+        # dask.array: every block holds the full time axis of some pixels.
+        blocks = data[order].astype("float64").rechunk({0: -1})
+        filled = blocks.map_blocks(_gap_fill_block, sorted_millis, method, max_gap, window,
+                                   dtype="float64")
+        return filled[restore]
+    data = np.asarray(data, dtype="float64")[order]
+    return _gap_fill_block(data, sorted_millis, method, max_gap, window)[restore]
+
+
+##############################################################################
+#                               xarray adapters                              #
+##############################################################################
+
+
+def is_dataarray(obj):
+    """ Return True if obj is an xarray.DataArray (without importing xarray)."""
+    import sys
+    xr = sys.modules.get("xarray")
+    return xr is not None and isinstance(obj, xr.DataArray)
+
+
+def _time_first(da, time_dim="time"):
+    if time_dim not in da.dims:
+        raise ValueError("The DataArray needs a '{}' dimension.".format(time_dim))
+    da = da.transpose(time_dim, ...)
+    return da, list(da[time_dim].values)
+
+
+def _band_index(da, band):
+    if "band" not in da.dims:
+        raise ValueError("The DataArray needs a 'band' dimension.")
+    if isinstance(band, int):
+        return band
+    return list(da["band"].values).index(band)
+
+
+def _replace_time(da, starts, values, name=None):
+    import numpy as np
+    out = da.isel(time=slice(0, len(starts))).copy(data=values)
+    out = out.assign_coords(time=np.array(starts, dtype="datetime64[ns]"))
+    if name is not None and "band" in out.dims and out.sizes["band"] == 1:
+        out = out.assign_coords(band=[name])
+    return out
+
+
+def xr_cloud_mask(da, from_bit, to_bit, QA_band, threshold=1):
+    """ cloud_mask for an xarray.DataArray with a band dimension."""
+    band_axis = da.dims.index("band") if "band" in da.dims else None
+    if band_axis is None:
+        raise ValueError("The DataArray needs a 'band' dimension.")
+    moved = da.transpose(..., "band")
+    values = cloud_mask(moved.values, from_bit, to_bit, _band_index(da, QA_band), threshold)
+    return moved.copy(data=values).transpose(*da.dims)
+
+
+def xr_qa_mask(da, rules, QA_band):
+    """ qa_mask for an xarray.DataArray with a band dimension."""
+    if "band" not in da.dims:
+        raise ValueError("The DataArray needs a 'band' dimension.")
+    moved = da.transpose(..., "band")
+    values = qa_mask(moved.values, rules, _band_index(da, QA_band))
+    return moved.copy(data=values).transpose(*da.dims)
+
+
+def xr_group_composite(da, period="month", reducer="max"):
+    """ group_composite for an xarray.DataArray with a time dimension."""
+    da, times = _time_first(da)
+    starts, values = group_composite(times, da.values, period, reducer)
+    return _replace_time(da, starts, values)
+
+
+def xr_calculate_vci(da, period="month"):
+    """ calculate_vci for an xarray.DataArray with a time dimension."""
+    da, times = _time_first(da)
+    starts, values = calculate_vci(times, da.values, period)
+    return _replace_time(da, starts, values, name="VCI")
+
+
+def xr_calculate_zscore(da, scale=1, period="month"):
+    """ calculate_zscore for an xarray.DataArray with a time dimension."""
+    da, times = _time_first(da)
+    starts, values = calculate_zscore(times, da.values, scale, period)
+    return _replace_time(da, starts, values, name="ZSCORE")
+
+
+def xr_calculate_indices(da, indices=("vci", "ndvi_anomaly", "zscore"), vegetation=None,
+                         temperature=None, precipitation=None, scale=1, period="month", vhi_weight=0.5):
+    """ calculate_indices for an xarray.DataArray with time and band dimensions."""
+    import numpy as np
+    if isinstance(indices, str):
+        indices = [indices]
+    da, times = _time_first(da)
+    da = da.transpose("time", ..., "band") if "band" in da.dims else da
+    roles = {"vegetation": vegetation, "temperature": temperature, "precipitation": precipitation}
+    arrays = {role: da.values[..., _band_index(da, band)] for role, band in roles.items() if band is not None}
+    starts, values = calculate_indices(times, indices=indices, scale=scale, period=period,
+                                       vhi_weight=vhi_weight, **arrays)
+    names = [INDEX_SUITE[name] for name in indices]
+    out = da.isel(time=slice(0, len(starts)), band=[0] * len(names))
+    out = out.copy(data=np.stack([values[name] for name in indices], axis=-1))
+    return out.assign_coords(time=np.array(starts, dtype="datetime64[ns]"), band=names)
+
+
+def xr_linear_interpolate_nan(da, days=30):
+    """ linear_interpolate_nan for an xarray.DataArray (time, ..., band)."""
+    dims = da.dims
+    da, times = _time_first(da)
+    moved = da.transpose("time", ..., "band") if "band" in dims else da.expand_dims("band", -1)
+    values = linear_interpolate_nan(times, moved.values, days)
+    out = moved.copy(data=values)
+    if "band" not in dims:
+        out = out.isel(band=0, drop=True)
+    return out.transpose(*dims)
+
+
+def xr_gap_fill(da, method="linear", max_gap=None, window=None):
+    """ gap_fill for an xarray.DataArray with a time dimension (NumPy or Dask backed)."""
+    dims = da.dims
+    da, times = _time_first(da)
+    return da.copy(data=gap_fill(times, da.data, method, max_gap, window)).transpose(*dims)
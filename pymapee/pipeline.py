@@ -0,0 +1,322 @@
+""" A lazy pipeline builder chaining mask, scale, composite, index and export steps.
+
+The steps are only recorded; build() optimizes the plan before creating the Earth Engine
+expression:
+
+- filter_date/filter_bounds are moved before the per-image steps that keep the image properties,
+- consecutive per-image steps are fused into a single ImageCollection.map,
+- the copyProperties of the fused steps are merged into one at the end of the chain.
+
+    pipe = (Pipeline(ee.ImageCollection("MODIS/061/MOD13A2"))
+            .cloud_mask(0, 1, "DetailedQA")
+            .scale(0.0001)
+            .filter_date("2010-01-01", "2020-01-01")
+            .filter_bounds(aoi.geometry())
+            .composite("month", "max")
+            .index("vci")
+            .export_to_asset(aoi, "users/me/vci"))
+    print(pipe.explain())
+    task = pipe.run()
+"""
+import ee
+
+from . import pymapee, utils
+
+# How a per-image step treats the image properties: "keep" steps preserve them (e.g. updateMask),
+# "copy" steps lose them and need a copyProperties from their input, "opaque" steps may read or
+# change them.
+PROPERTY_MODES = ("keep", "copy", "opaque")
+
+INDICES = ("vci", "ndvi_anomaly", "zscore")
+
+
+class Step:
+    """ A recorded pipeline step.
+
+        Args:
+            kind (str): "filter", "map" (per image), "collection" or "export".
+            name (str): The step name shown by explain.
+            func (callable): Called with an image for map steps, with a collection otherwise.
+            args (tuple|optional): The arguments shown by explain. Default to ().
+            properties (str|optional): The property mode of a map step (see PROPERTY_MODES). Default to "keep".
+    """
+
+    def __init__(self, kind, name, func, args=(), properties="keep"):
+        if properties not in PROPERTY_MODES:
+            raise ValueError("properties must be one of {}.".format(", ".join(PROPERTY_MODES)))
+        self.kind = kind
+        self.name = name
+        self.func = func
+        self.args = args
+        self.properties = properties
+
+    def __repr__(self):
+        return "{}({})".format(self.name, ", ".join(_describe(arg) for arg in self.args))
+
+
+def _describe(value):
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return repr(value)
+    return "<{}>".format(type(value).__name__)
+
+
+class FusedMap:
+    """ Consecutive map steps run in a single ImageCollection.map."""
+
+    kind = "map"
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+
+    @property
+    def copies(self):
+        """ The number of copyProperties per image."""
+        return len(_copy_runs(self.steps))
+
+    def __call__(self, img):
+        source, out, pending = img, img, False
+        for step in self.steps:
+            if step.properties == "opaque":
+                # The step may read the properties: carry them over before it.
+                if pending:
+                    # copyProperties returns an ee.Element.
+                    out = ee.Image(out.copyProperties(source, source.propertyNames()))
+                    pending = False
+                out = step.func(out)
+                source = out
+            else:
+                out = step.func(out)
+                pending = pending or step.properties == "copy"
+        if pending:
+            out = ee.Image(out.copyProperties(source, source.propertyNames()))
+        return out
+
+    def __repr__(self):
+        return "map[{}]".format(" + ".join(repr(step) for step in self.steps))
+
+
+def _copy_runs(steps):
+    # The runs of non-opaque steps containing a "copy" step, each needing one copyProperties.
+    runs, current = [], []
+    for step in steps + [None]:
+        if step is None or step.properties == "opaque":
+            if any(s.properties == "copy" for s in current):
+                runs.append(current)
+            current = []
+        else:
+            current.append(step)
+    return runs
+
+
+def push_filters(steps):
+    """ Move the filter steps before the map steps that don't depend on the image properties.
+
+        The relative order of the filters is kept, and filters never cross collection,
+        export or opaque map steps.
+    """
+    steps = list(steps)
+    for i in range(len(steps)):
+        if steps[i].kind != "filter":
+            continue
+        j = i
+        while j > 0 and steps[j - 1].kind == "map" and steps[j - 1].properties != "opaque":
+            steps[j - 1], steps[j] = steps[j], steps[j - 1]
+            j -= 1
+    return steps
+
+
+def fuse_maps(steps):
+    """ Replace runs of consecutive map steps with FusedMap steps."""
+    fused, run = [], []
+    for step in list(steps) + [None]:
+        if step is not None and step.kind == "map":
+            run.append(step)
+            continue
+        if run:
+            fused.append(FusedMap(run))
+            run = []
+        if step is not None:
+            fused.append(step)
+    return fused
+
+
+def optimize(steps):
+    """ Return the optimized plan of a list of steps (see push_filters and fuse_maps)."""
+    return fuse_maps(push_filters(steps))
+
+
+def plan_stats(plan):
+    """ Return the number of collection maps, filters and copyProperties per image of a plan."""
+    maps = [step for step in plan if step.kind == "map"]
+    copies = 0
+    for step in maps:
+        copies += step.copies if isinstance(step, FusedMap) else int(step.properties == "copy")
+    return {"maps": len(maps), "filters": sum(step.kind == "filter" for step in plan),
+            "copy_properties": copies}
+
+
+class Pipeline:
+    """ A lazily built chain of operations on an ImageCollection.
+
+        Every method returns a new Pipeline, so that a common prefix can be shared between several
+        pipelines. Nothing is computed before run(), and no step calls getInfo.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+    """
+
+    def __init__(self, col, steps=()):
+        if not isinstance(col, ee.ImageCollection):
+            raise TypeError("Unsupported data type. Expected ee.ImageCollection")
+        self.col = col
+        self.steps = tuple(steps)
+
+    def _add(self, step):
+        if self.steps and self.steps[-1].kind == "export":
+            raise ValueError("No step can follow an export.")
+        return Pipeline(self.col, self.steps + (step,))
+
+    def filter_date(self, start, end=None):
+        """ Keep the images between two dates (see ee.ImageCollection.filterDate)."""
+        return self._add(Step("filter", "filter_date", lambda col: col.filterDate(start, end),
+                              (start, end)))
+
+    def filter_bounds(self, geometry):
+        """ Keep the images intersecting a geometry (see ee.ImageCollection.filterBounds)."""
+        return self._add(Step("filter", "filter_bounds", lambda col: col.filterBounds(geometry),
+                              (geometry,)))
+
+    def cloud_mask(self, from_bit, to_bit, QA_band, threshold=1):
+        """ Mask out cloud-related pixels (see utils.cloud_mask)."""
+        return self._add(Step(
+            "map", "cloud_mask",
+            lambda img: utils.cloud_mask_image(img, from_bit, to_bit, QA_band, threshold),
+            (from_bit, to_bit, QA_band, threshold)))
+
+    def qa_mask(self, rules, QA_band=None):
+        """ Mask out the pixels failing any of several QA bit rules (see utils.qa_mask)."""
+        band, compiled = utils.qa_rules(rules, QA_band)
+        return self._add(Step("map", "qa_mask", lambda img: utils.qa_mask_image(img, compiled, band),
+                              (rules if isinstance(rules, str) else band,)))
+
+    def scale(self, scale_factor):
+        """ Multiply the pixel values by a scale factor (see utils.scaling_data)."""
+        return self._add(Step("map", "scale", lambda img: img.multiply(scale_factor),
+                              (scale_factor,), "copy"))
+
+    def kelvin_celsius(self):
+        """ Convert temperatures from Kelvin to Celsius (see utils.kelvin_celsius)."""
+        return self._add(Step("map", "kelvin_celsius", lambda img: img.subtract(273.15), (), "copy"))
+
+    def map(self, func, copy_properties=False, name=None):
+        """ Apply a function to every image.
+
+            Args:
+                func (callable): Called with an ee.Image, returns an ee.Image.
+                copy_properties (bool|optional): If True, func only changes the pixels and the image
+                                                 properties are carried over from its input, which lets
+                                                 the filters move before it. Default to False.
+                name (str|optional): The step name shown by explain. Default to the function name.
+        """
+        name = name or getattr(func, "__name__", "map")
+        return self._add(Step("map", name, func, (), "copy" if copy_properties else "opaque"))
+
+    def composite(self, period="month", reducer="max"):
+        """ Composite the images of each period (see utils.group_composite)."""
+        return self._add(Step("collection", "composite",
+                              lambda col: utils.group_composite(col, period, reducer),
+                              (period, reducer)))
+
+    def index(self, name, climatology=None, period="month"):
+        """ Compute a monthly (or other period) index: "vci", "ndvi_anomaly" or "zscore".
+
+            Args:
+                name (str): The index name.
+                climatology (ee.ImageCollection|optional): A precomputed period_climatology.
+                                                           Default to None.
+                period (str|tuple|optional): The period, see utils.period_start. Default to month.
+        """
+        if name == "vci":
+            func = lambda col: pymapee.calculate_vci(col, climatology, period)
+        elif name == "ndvi_anomaly":
+            func = lambda col: pymapee.calculate_ndvi_anomaly(col, 1, climatology, period)
+        elif name == "zscore":
+            func = lambda col: pymapee.calculate_zscore(col, 1, climatology, period)
+        else:
+            raise ValueError("Unsupported index. Expected one of {}".format(", ".join(INDICES)))
+        args = (name,) if period == "month" else (name, period)
+        return self._add(Step("collection", "index", func, args))
+
+    def export_to_asset(self, aoi, assetId, description="Exported_Data_To_Asset", res=1000, crs=None,
+                        slice_period=None):
+        """ Export the result to an asset when run (see pymapee.export_to_asset)."""
+        return self._add(Step(
+            "export", "export_to_asset",
+            lambda col: pymapee.export_to_asset(col, aoi, assetId, description, res, crs, slice_period),
+            (assetId,)))
+
+    def export_to_googledrive(self, aoi, folder_name="GEE_Data", file_name="NDVI_data", res=1000,
+                              slice_period=None):
+        """ Export the result to Google Drive when run (see pymapee.export_to_googledrive)."""
+        return self._add(Step(
+            "export", "export_to_googledrive",
+            lambda col: pymapee.export_to_googledrive(col, aoi, folder_name, file_name, res, slice_period),
+            (folder_name, file_name)))
+
+    def plan(self, optimized=True):
+        """ Return the list of steps, optimized by default, without the export."""
+        steps = [step for step in self.steps if step.kind != "export"]
+        return optimize(steps) if optimized else steps
+
+    def build(self, optimized=True):
+        """ Return the ee.ImageCollection computed by the plan (before the export).
+
+            Args:
+                optimized (bool|optional): If False, every step is applied as recorded, with one
+                                           map per step. Default to True.
+        """
+        col = self.col
+        for step in self.plan(optimized):
+            if step.kind == "map":
+                col = col.map(step if isinstance(step, FusedMap) else FusedMap([step]))
+            else:
+                col = step.func(col)
+        return col
+
+    def run(self):
+        """ Build the optimized plan and start its export, if any.
+
+            Returns:
+                ee.batch.Task|dict|ee.ImageCollection: The started task (or tasks, with a slice_period),
+                                                       or the collection without export.
+        """
+        col = self.build()
+        if self.steps and self.steps[-1].kind == "export":
+            return self.steps[-1].func(col)
+        return col
+
+    def explain(self, graph_size=True):
+        """ Describe the optimized plan and compare it with the recorded one.
+
+            Args:
+                graph_size (bool|optional): If True, also serialize both plans to compare the size of
+                                            the request sent to the server (see utils.expression_stats).
+                                            Default to True.
+
+            Returns:
+                str: The description.
+        """
+        plan = self.plan()
+        lines = ["Optimized plan:"]
+        lines.extend("  {}. {}".format(i, step) for i, step in enumerate(plan, 1))
+        if self.steps and self.steps[-1].kind == "export":
+            lines.append("  {}. {}".format(len(plan) + 1, self.steps[-1]))
+        before, after = plan_stats(self.plan(False)), plan_stats(plan)
+        lines.append("Collection maps: {} -> {}".format(before["maps"], after["maps"]))
+        lines.append("copyProperties per image: {} -> {}".format(
+            before["copy_properties"], after["copy_properties"]))
+        if graph_size:
+            before, after = utils.expression_stats(self.build(False)), utils.expression_stats(self.build())
+            lines.append("Graph size: {} -> {} bytes, {} -> {} nodes".format(
+                before["bytes"], after["bytes"], before["nodes"], after["nodes"]))
+        return "\n".join(lines)
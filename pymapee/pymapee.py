@@ -1,10 +1,19 @@
 """Main module."""
 import ee
-from .utils import (date_range_col, monthly_datetime_list,
-                    cloud_mask, scaling_data, data_format,
-                    gee_service_account, non_service_account, time_search_limit,
-                    max_diff_filter, first_filter, second_filter, first_join_result,
-                    second_join_result, linear_interpolation, col_timestamp_band, arange)
+from . import local
+from .batch import run_pages
+from .cache import fetch_info, get_info
+from .executor import get_executor
+from .local import INDEX_SUITE, INDEX_TERMS, index_inputs, is_dataarray
+from .tasks import run_tasks
+from .utils import (cloud_mask, scaling_data, data_format,
+                    gee_service_account, non_service_account, first_filter, second_filter, first_join_result,
+                    second_join_result, linear_interpolation, col_timestamp_band, array_interpolation,
+                    group_composite, get_reducer, long_format,
+                    grid_layout, grid_cells, server_grid, monthly_climatology, period_climatology,
+                    climatology_band, join_climatology, stack_climatology,
+                    unstack_climatology, climatology_fingerprint, tag_period, period_key,
+                    climatology_key, CLIMATOLOGY_STATS, PERIOD_KEY)
 
 
 def initialize_ee(token_name="EARTHENGINE_TOKEN", autho_mode="notebook", service_account=False):
@@ -49,14 +58,14 @@ def modis_cloud_mask(col, from_bit, to_bit, QA_band="DetailedQA", threshold=1):
         Returns:
             ee.ImageCollection: The output collection with cloud-free pixels.
     """
-    if not isinstance(col, ee.ImageCollection):
+    if not (isinstance(col, ee.ImageCollection) or is_dataarray(col)):
         raise TypeError(
             "Unsupported data type. It only supports ee.ImageCollection")
     out_col = cloud_mask(col, from_bit, to_bit, QA_band, threshold)
     return out_col
 
 
-def landsat_cloud_mask(col, from_bit, to_bit, QA_band="QA_PIXEL ", threshold=1):
+def landsat_cloud_mask(col, from_bit, to_bit, QA_band="QA_PIXEL", threshold=1):
     """ Return a collection of Landsat cloud-free images
 
         Args:
@@ -69,7 +78,7 @@ def landsat_cloud_mask(col, from_bit, to_bit, QA_band="QA_PIXEL ", threshold=1):
         Returns:
             ee.ImageCollection: The output collection with cloud-free pixels.
     """
-    if not isinstance(col, ee.ImageCollection):
+    if not (isinstance(col, ee.ImageCollection) or is_dataarray(col)):
         raise TypeError(
             "Unsupported data type. It only supports ee.ImageCollection")
     out_col = cloud_mask(col, from_bit, to_bit, QA_band, threshold)
@@ -89,7 +98,7 @@ def sentinel2_cloud_mask(col, from_bit, to_bit, QA_band="QA60", threshold=0):
         Returns:
             ee.ImageCollection: The output collection with cloud-free pixels.
     """
-    if not isinstance(col, ee.ImageCollection):
+    if not (isinstance(col, ee.ImageCollection) or is_dataarray(col)):
         raise TypeError(
             "Unsupported data type. It only supports ee.ImageCollection")
     out_col = cloud_mask(col, from_bit, to_bit, QA_band, threshold)
@@ -101,51 +110,25 @@ def monthly_composite(col, mode=None):
 
         Args:
             col (ee.ImageCollection): The input image collection.
-            mode (str): The aggregated method. Supported modes 'max', 'min',
-                        'median', 'mean', 'sum'. Default to None.
+            mode (str|ee.Reducer): The aggregated method. Supported modes 'max', 'min',
+                        'median', 'mean', 'sum', 'count', 'std', percentiles such as 'p90'
+                        or any ee.Reducer. Default to None (max).
 
         Returns:
             ee.ImageCollection: A output image collection of monthly images.
+
+        An xarray.DataArray with a time dimension is composited locally (see local.group_composite).
    """
+    if is_dataarray(col):
+        return local.xr_group_composite(col, "month", "max" if mode is None else mode)
     if not isinstance(col, ee.ImageCollection):
         raise TypeError(
             "Unsupported data type. Expected data is ee.ImageCollection")
-    if not isinstance(mode, (str, type(None))):
+    if not isinstance(mode, (str, ee.Reducer, type(None))):
         raise TypeError("Unsupported data type. Mode should be string")
     if mode is None:
         mode = "max"
-    mode = mode.lower().strip()
-    if mode not in ["max", "mean", "median", "mvc", "min", "sum"]:
-        raise ValueError(
-            "Unsupported methods. Please choose mean, max, min, sum, or median")
-
-    first_date, latest_date = date_range_col(col)
-    monthly_list = monthly_datetime_list(first_date, latest_date)
-
-    def monthly_data(date):
-        start_date = ee.Date(date)
-        end_date = start_date.advance(1, "month")
-        monthly_col = col.filterDate(start_date, end_date)
-        size = monthly_col.size()
-
-        if mode == "mean":
-            img = monthly_col.mean().set(
-                {"system:time_start": start_date.millis()})
-        elif mode == "max":
-            img = monthly_col.max().set(
-                {"system:time_start": start_date.millis()})
-        elif mode == "min":
-            img = monthly_col.min().set(
-                {"system:time_start": start_date.millis()})
-        elif mode in ["median", "mvc"]:
-            img = monthly_col.median().set(
-                {"system:time_start": start_date.millis()})
-        else:
-            img = monthly_col.sum().set(
-                {"system:time_start": start_date.millis()})
-        return ee.Algorithms.If(size.gt(0), img)
-    composite_col = ee.ImageCollection.fromImages(
-        monthly_list.map(monthly_data))
+    composite_col = group_composite(col, "month", mode)
     return composite_col
 
 
@@ -154,55 +137,79 @@ def daily_composite(ds, mode="max"):
 
     Args:
         ds (ImageCollection): The input image collection.
-        mode (str|optional): Aggregated modes [max, min, mean, median, sum]. Default to max.
+        mode (str|ee.Reducer|optional): Aggregated modes [max, min, mean, median, sum, count, std, p<N>]
+                                        or any ee.Reducer. Default to max.
 
     Return:
         ImageCollection: The daily composite
     """
-    if isinstance(mode, str):
-        mode = mode.lower().strip()
-
-    # Get the starting and ending dates of the collection
-    start_date = ee.Date(ee.Date(ds.first().get(
-        "system:time_start")).format('YYYY-MM-dd'))
-    end_date = ee.Date(ee.Date(ds.sort('system:time_start', False).first().get(
-        "system:time_start")).format('YYYY-MM-dd'))
-
-    # Get the number of days
-    daynum = end_date.difference(start_date, 'day')
-    slist = ee.List.sequence(0, daynum)
-    date_list = slist.map(lambda i: start_date.advance(i, "day"))
-
-    def sub_col(date_input):
-        first_date = ee.Date(date_input)
-        last_date = first_date.advance(1, "day")
-        subcol = ds.filterDate(first_date, last_date)
-        size = subcol.size()
-
-        if mode in ["max", "maximum"]:
-            img = subcol.max().set({"system:time_start": first_date.millis()})
-        elif mode in ["mean", "average"]:
-            img = subcol.mean().set({"system:time_start": first_date.millis()})
-        elif mode in ["min", "minimum"]:
-            img = subcol.min().set({"system:time_start": first_date.millis()})
-        elif mode in ["median"]:
-            img = subcol.median().set(
-                {"system:time_start": first_date.millis()})
-        elif mode in ["sum", "total"]:
-            img = subcol.sum().set({"system:time_start": first_date.millis()})
-
-        return ee.Algorithms.If(size.gt(0), img)
-
-    new_col = ee.ImageCollection.fromImages(date_list.map(sub_col))
+    if not isinstance(ds, ee.ImageCollection):
+        raise TypeError(
+            "Unsupported data type. Expected data is ee.ImageCollection")
+    new_col = group_composite(ds, "day", mode)
     return new_col
 
 
-def calculate_ndvi_anomaly(col, scale=1):
-    """ Return a collection of monthly vegetation anomaly index.
+def persistent_climatology(col, stats=("mean", "min", "max", "std"), assetId=None, aoi=None,
+                           res=1000, crs=None):
+    """ Return the monthly climatology of a collection, reusing a stored copy when the input is unchanged.
+
+        The climatology is identified by a fingerprint of the collection expression and statistics.
+        With assetId, an asset carrying the same fingerprint is loaded instead of recomputing the
+        statistics. Otherwise an export of the stacked climatology to that asset is started, after
+        deleting any existing asset at that id (another fingerprint, or none).
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            stats (tuple|optional): The statistics, see utils.monthly_climatology. Default to (mean, min, max, std).
+            assetId (str|optional): The image asset storing the climatology. Default to None.
+            aoi (ee.FeatureCollection|optional): The area to export; required with assetId. Default to None.
+            res (int|optional): The export resolution in meters. Default to 1000.
+            crs (str|optional): The export crs. Default to EPSG:4326.
+
+        Returns:
+            tuple: (ee.ImageCollection, ee.batch.Task): The output of utils.monthly_climatology or
+                   the stored copy, and the started export task to monitor (None when nothing is exported).
+    """
+    stats = tuple(stats)
+    fingerprint = climatology_fingerprint(col, stats)
+    exists = False
+    if assetId is not None:
+        exists = get_executor().call("data", ee.data.getInfo, assetId) is not None
+        if exists and fetch_info(ee.Image(assetId).get("fingerprint")) == fingerprint:
+            return unstack_climatology(ee.Image(assetId)), None
+    clim = monthly_climatology(col, stats)
+    task = None
+    if assetId is not None:
+        if aoi is None:
+            raise ValueError("aoi is required to store the climatology as an asset.")
+        if exists:
+            # An export can't overwrite an existing asset.
+            get_executor().call("data", ee.data.deleteAsset, assetId)
+        stacked = stack_climatology(clim).set("fingerprint", fingerprint).clip(aoi)
+        task = _asset_task(stacked, get_info(aoi.geometry().bounds())["coordinates"], assetId,
+                           "Climatology", res, crs or "EPSG:4326")
+        get_executor().call("export", task.start)
+    return clim, task
+
+
+def _with_climatology(col, climatology, stats, period="month"):
+    if climatology is None:
+        climatology = period_climatology(col, period, stats)
+    return join_climatology(group_composite(col, period, "max"), climatology, period)
+
+
+def calculate_ndvi_anomaly(col, scale=1, climatology=None, period="month"):
+    """ Return a collection of monthly (or other period) vegetation anomaly index.
 
         Args:
             col (ee.ImageCollection): The input image collection.
             scale (int|float|optional): Scaling factor
+            climatology (ee.ImageCollection|optional): A precomputed period_climatology (with mean)
+                                                       of the scaled collection. Default to None.
+            period (str|tuple|optional): The period of the composites and climatology, e.g. dekad
+                                         or a tuple of season start months (see utils.period_start).
+                                         Default to month.
 
         Returns:
             ee.ImageCollection: The output collection with vegetation Anomaly Index (VAI).
@@ -212,62 +219,244 @@ def calculate_ndvi_anomaly(col, scale=1):
             "Unsupported data type. Please provide ee.ImageCollection.")
     col = scaling_data(col, scale)
 
-    first_date, latest_date = date_range_col(col)
-    monthly_list = monthly_datetime_list(first_date, latest_date)
-
-    def ndvi_anomaly(date):
-        start_time = ee.Date(date)
-        set_month = ee.Number.parse(start_time.format("MM"))
-        last_time = start_time.advance(1, "month")
-        col_month = col.filter(ee.Filter.calendarRange(
-            set_month, set_month, "month"))
-        subcol = col.filterDate(start_time, last_time)
-        size = subcol.size()
-        mean = col_month.mean()
-        anomaly = subcol.max().subtract(mean).set(
-            {"system:time_start": start_time.millis()})
-        return ee.Algorithms.If(size.gt(0), anomaly.rename("VAI"))
-    vai = ee.ImageCollection.fromImages(monthly_list.map(ndvi_anomaly))
+    def ndvi_anomaly(img):
+        clim = ee.Image(img.get("climatology"))
+        anomaly = img.subtract(climatology_band(clim, "mean"))
+        return anomaly.rename("VAI").set({"system:time_start": img.get("system:time_start")})
+    vai = _with_climatology(col, climatology, ("mean",), period).map(ndvi_anomaly)
     return vai
 
 
-def calculate_vci(col):
+def calculate_vci(col, climatology=None, period="month"):
     """ Return a collection of vegetation condition index.
 
         Args:
             col (ee.ImageCollection): The input image collection.
-            scale (int|float|optional): Scaling factor
+            climatology (ee.ImageCollection|optional): A precomputed period_climatology (with min
+                                                       and max). Default to None.
+            period (str|tuple|optional): The period of the composites and climatology, e.g. dekad
+                                         or a tuple of season start months (see utils.period_start).
+                                         Default to month.
 
         Returns:
-            ee.ImageCollection: The output collection with vegetation Anomaly Index (VAI).
+            ee.ImageCollection: The output collection with vegetation condition index (VCI).
+
+        An xarray.DataArray with a time dimension is processed locally (see local.calculate_vci),
+        which computes its own climatology.
     """
+    if is_dataarray(col):
+        if climatology is not None:
+            raise ValueError("climatology is not supported with xarray.DataArray input.")
+        return local.xr_calculate_vci(col, period)
     if not isinstance(col, ee.ImageCollection):
         raise TypeError(
             "Unsupported data type. Please provide ee.ImageCollection.")
 
-    first_date, latest_date = date_range_col(col)
-    monthly_list = monthly_datetime_list(first_date, latest_date)
-
-    def vci(date):
-        start_time = ee.Date(date)
-        set_month = ee.Number.parse(start_time.format("MM"))
-        last_time = start_time.advance(1, "month")
-        col_month = col.filter(ee.Filter.calendarRange(
-            set_month, set_month, "month"))
-        subcol = col.filterDate(start_time, last_time)
-        size = subcol.size()
-        mean = col_month.mean()
-        min_value = col_month.min()
-        max_value = col_month.max()
-        vci_img = subcol.max().subtract(min_value).divide(
+    def vci(img):
+        clim = ee.Image(img.get("climatology"))
+        min_value = climatology_band(clim, "min")
+        max_value = climatology_band(clim, "max")
+        vci_img = img.subtract(min_value).divide(
             max_value.subtract(min_value)).multiply(100)
-        vci_img = vci_img.set(
-            {"system:time_start": start_time.millis()}).rename("VCI")
-        return ee.Algorithms.If(size.gt(0), vci_img)
-    vci_col = ee.ImageCollection.fromImages(monthly_list.map(vci))
+        return vci_img.rename("VCI").set({"system:time_start": img.get("system:time_start")})
+    vci_col = _with_climatology(col, climatology, ("min", "max"), period).map(vci)
     return vci_col
 
 
+def calculate_zscore(col, scale=1, climatology=None, period="month"):
+    """ Return a collection of monthly (or other period) standardized anomalies (z-scores).
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            scale (int|float|optional): Scaling factor
+            climatology (ee.ImageCollection|optional): A precomputed period_climatology (with mean
+                                                       and std) of the scaled collection. Default to None.
+            period (str|tuple|optional): The period of the composites and climatology, e.g. dekad
+                                         or a tuple of season start months (see utils.period_start).
+                                         Default to month.
+
+        Returns:
+            ee.ImageCollection: The output collection with the z-score (ZSCORE) of the period maximum.
+
+        An xarray.DataArray with a time dimension is processed locally (see local.calculate_zscore).
+    """
+    if is_dataarray(col):
+        if climatology is not None:
+            raise ValueError("climatology is not supported with xarray.DataArray input.")
+        return local.xr_calculate_zscore(col, scale, period)
+    if not isinstance(col, ee.ImageCollection):
+        raise TypeError(
+            "Unsupported data type. Please provide ee.ImageCollection.")
+    col = scaling_data(col, scale)
+
+    def zscore(img):
+        clim = ee.Image(img.get("climatology"))
+        z_img = img.subtract(climatology_band(clim, "mean")).divide(climatology_band(clim, "std"))
+        return z_img.rename("ZSCORE").set({"system:time_start": img.get("system:time_start")})
+    z_col = _with_climatology(col, climatology, ("mean", "std"), period).map(zscore)
+    return z_col
+
+
+def index_composites(col, bands, period="month"):
+    """ Composite the index inputs of every period in one grouped pass.
+
+        The vegetation and temperature bands are reduced to their period maximum, the
+        precipitation band to its period total.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            bands (dict): {role: band name}, see index_inputs.
+            period (str|tuple|optional): The period, see utils.period_start. Default to month.
+
+        Returns:
+            ee.ImageCollection: One image per period with the input bands, sorted by time.
+    """
+    maxima = [bands[role] for role in ("vegetation", "temperature") if role in bands]
+    tagged = tag_period(col, period)
+    groups = ee.Join.saveAll("images").apply(
+        **{"primary": tagged.distinct(PERIOD_KEY), "secondary": tagged,
+           "condition": ee.Filter.equals(**{"leftField": PERIOD_KEY, "rightField": PERIOD_KEY})})
+
+    def reduce_group(img):
+        images = ee.ImageCollection.fromImages(img.get("images"))
+        parts = []
+        if maxima:
+            parts.append(images.select(maxima).max())
+        if "precipitation" in bands:
+            parts.append(images.select([bands["precipitation"]]).sum())
+        return ee.Image.cat(parts).set({"system:time_start": img.get(PERIOD_KEY)})
+    return ee.ImageCollection(groups.map(reduce_group)).sort("system:time_start")
+
+
+def index_climatology(col, indices, vegetation=None, temperature=None, precipitation=None, scale=1,
+                      period="month"):
+    """ Compute the one climatology shared by a set of indices of calculate_indices.
+
+        The vegetation and temperature statistics are computed over all the (scaled) observations
+        of every period slot, as in calculate_vci; the precipitation statistics over the period
+        totals (see index_composites).
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            indices (list): The index names, see calculate_indices.
+            vegetation (str|optional): The vegetation band, e.g. NDVI. Default to None.
+            temperature (str|optional): The land surface temperature band. Default to None.
+            precipitation (str|optional): The precipitation band. Default to None.
+            scale (int|float|optional): Scaling factor. Default to 1.
+            period (str|tuple|optional): The period, see utils.period_start. Default to month.
+
+        Returns:
+            ee.ImageCollection: One image per slot with <band>_<statistic> bands, keyed by
+                                utils.climatology_key(period), e.g. to store with persistent copies.
+    """
+    _, bands, stats = index_inputs(indices, vegetation, temperature, precipitation)
+    col = scaling_data(col, scale)
+    parts = []
+    observed = [role for role in ("vegetation", "temperature") if role in bands]
+    if observed:
+        # One reducer with every statistic: a few more bands, one pass over the observations.
+        parts.append(period_climatology(col.select([bands[role] for role in observed]), period,
+                                        [stat for stat in CLIMATOLOGY_STATS
+                                         if any(stat in stats[role] for role in observed)]))
+    if "precipitation" in bands:
+        totals = index_composites(col, {"precipitation": bands["precipitation"]}, period)
+        parts.append(period_climatology(totals, period, stats["precipitation"]))
+    if len(parts) == 1:
+        return parts[0]
+    key = climatology_key(period)
+    joined = ee.Join.saveFirst("totals").apply(
+        **{"primary": parts[0], "secondary": parts[1],
+           "condition": ee.Filter.equals(**{"leftField": key, "rightField": key})})
+    return ee.ImageCollection(joined).map(lambda img: img.addBands(ee.Image(img.get("totals"))))
+
+
+def calculate_indices(col, indices=("vci", "ndvi_anomaly", "zscore"), vegetation=None, temperature=None,
+                      precipitation=None, scale=1, climatology=None, period="month", vhi_weight=0.5):
+    """ Return a multi-band collection of drought and vegetation indices computed in one pass.
+
+        The period composites (index_composites) and the climatology (index_climatology) are
+        built once for all the indices, and every index is evaluated by one multi-band
+        expression per image instead of one composite/climatology/join chain per index.
+        The indices are:
+
+            vci: vegetation condition index, 100 * (V - Vmin) / (Vmax - Vmin).
+            tci: temperature condition index, 100 * (Tmax - T) / (Tmax - Tmin).
+            vhi: vegetation health index, vhi_weight * VCI + (1 - vhi_weight) * TCI.
+            ndvi_anomaly: V - Vmean.
+            zscore: (V - Vmean) / Vstd.
+            spi: standardized precipitation anomaly, (P - Pmean) / Pstd of the period totals
+                 (SPI-like: the totals are not fitted to a gamma distribution).
+
+        vci, ndvi_anomaly and zscore give the same values as calculate_vci,
+        calculate_ndvi_anomaly and calculate_zscore.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            indices (list|optional): The index names. Default to (vci, ndvi_anomaly, zscore).
+            vegetation (str|optional): The vegetation band, e.g. NDVI. Default to None.
+            temperature (str|optional): The land surface temperature band (tci, vhi). Default to None.
+            precipitation (str|optional): The precipitation band (spi). Default to None.
+            scale (int|float|optional): Scaling factor of the input bands. Default to 1.
+            climatology (ee.ImageCollection|optional): A precomputed index_climatology. Default to None.
+            period (str|tuple|optional): The period, see utils.period_start. Default to month.
+            vhi_weight (float|optional): The weight of VCI in VHI. Default to 0.5.
+
+        Returns:
+            ee.ImageCollection: One image per period with a band per index (VCI, TCI, VHI, VAI,
+                                ZSCORE, SPI), in the requested order.
+
+        An xarray.DataArray with time and band dimensions is processed locally
+        (see local.calculate_indices).
+    """
+    if isinstance(indices, str):
+        indices = [indices]
+    if is_dataarray(col):
+        if climatology is not None:
+            raise ValueError("climatology is not supported with xarray.DataArray input.")
+        return local.xr_calculate_indices(col, indices, vegetation, temperature, precipitation,
+                                          scale, period, vhi_weight)
+    if not isinstance(col, ee.ImageCollection):
+        raise TypeError(
+            "Unsupported data type. Please provide ee.ImageCollection.")
+    fused, bands, _ = index_inputs(indices, vegetation, temperature, precipitation)
+    if climatology is None:
+        climatology = index_climatology(col, indices, vegetation, temperature, precipitation, scale, period)
+    # The same scaled collection as in index_climatology: serialized once.
+    col = scaling_data(col, scale)
+    names = [INDEX_SUITE[name] for name in fused]
+
+    def operand(term):
+        if isinstance(term, tuple):
+            role, stat = term
+            if stat is None:
+                return bands[role]
+            return "{}_{}".format(bands[role], CLIMATOLOGY_STATS[stat])
+        return "c{}".format(term)
+
+    stacks = {key: [operand(INDEX_TERMS[name][i]) for name in fused]
+              for i, key in enumerate(("a", "b", "hi", "lo"))}
+    constants = sorted({term for name in fused for term in INDEX_TERMS[name][:4]
+                        if not isinstance(term, tuple)})
+    factors = [INDEX_TERMS[name][4] for name in fused]
+
+    def fused_indices(img):
+        inputs = img.addBands(ee.Image(img.get("climatology")))
+        if constants:
+            inputs = inputs.addBands(
+                ee.Image.constant(constants).rename(["c{}".format(c) for c in constants]))
+        # Every operand is a stack with one band per index: the expression is evaluated band-wise.
+        operands = {key: inputs.select(selectors, names) for key, selectors in stacks.items()}
+        operands["k"] = ee.Image.constant(factors).rename(names)
+        out = inputs.expression("(a - b) / (hi - lo) * k", operands).rename(names)
+        if "vhi" in indices:
+            out = out.addBands(out.expression("w * VCI + (1 - w) * TCI", {
+                "VCI": out.select("VCI"), "TCI": out.select("TCI"), "w": vhi_weight}).rename("VHI"))
+        out = out.select([INDEX_SUITE[name] for name in indices])
+        return out.set({"system:time_start": img.get("system:time_start")})
+    composites = index_composites(col, bands, period)
+    return join_climatology(composites, climatology, period).map(fused_indices)
+
+
 def resample_collection(col, resample_method=None, scale=None, crs=None):
     """ Return a collection of resampled images. Resampling methods include max, min,
         bilinear, bicubic, average, mode, and median.
@@ -285,9 +474,9 @@ def resample_collection(col, resample_method=None, scale=None, crs=None):
         resample_method = "bilinear"
     if crs is None:
         if isinstance(col, ee.Image):
-            crs = col.select(0).projection().getInfo()["crs"]
+            crs = get_info(col.select(0).projection())["crs"]
         elif isinstance(col, ee.ImageCollection):
-            crs = col.first().select(0).projection().getInfo()["crs"]
+            crs = get_info(col.first().select(0).projection())["crs"]
     if scale is None:
         scale = 1000
     if not (isinstance(resample_method, str) and isinstance(crs, str) and isinstance(scale, (int, float))):
@@ -303,49 +492,195 @@ def resample_collection(col, resample_method=None, scale=None, crs=None):
     return data
 
 
-def value_from_image(img, polygon, method=None, scale=None, keep_geometry=False):
+def _check_extraction_args(img, polygon, method, scale):
+    if not isinstance(img, ee.Image):
+        raise TypeError("Unsupported data type!")
+    if not isinstance(polygon, ee.FeatureCollection):
+        raise TypeError("Unsupported data type!")
+    if method is None:
+        method = "median"
+    if scale is None:
+        scale = 1000
+    if not (isinstance(method, str) and isinstance(scale, (int, float))):
+        raise TypeError("Unsupported data type!")
+    return method, scale
+
+
+def iter_values_from_image(img, polygon, method=None, scale=None, keep_geometry=False,
+                           batch_size=1000, max_workers=4, retries=3, progress=None):
+    """ Extract values from an image page by page and yield one DataFrame per page.
+
+        The features are split into pages of at most batch_size features, which are reduced
+        concurrently on a bounded thread pool, bypassing the getInfo cache, and retried by the
+        request executor (see executor.RequestExecutor) on transient and quota errors.
+
+        Args:
+            img (ee.Image): The image that is used to extract values from.
+            polygon (ee.FeatureCollection): The shapefile feature collection.
+            method (str|optional): The reducer name used over each feature, see utils.get_reducer. Default to None (median).
+            scale (int|float|optional): The scale value in meters.
+            keep_geometry (bol|optional): If True, then keep the coordinate values. Default to False.
+            batch_size (int|optional): The maximum number of features per request. Default to 1000.
+            max_workers (int|optional): The number of concurrent requests. Default to 4.
+            retries (int|optional): The number of retries of a failed page. Default to 3.
+            progress (callable|optional): Called with (done, total, page_index, seconds) after each page,
+                                          e.g. batch.print_progress. Default to None.
+
+        Yields:
+            pandas.DataFrame: The extracted values of each page, in feature order.
+    """
+    method, scale = _check_extraction_args(img, polygon, method, scale)
+    band_names = get_info(img.bandNames())
+    n_features = get_info(polygon.size())
+
+    reducer = get_reducer(method).forEach(band_names)
+
+    def fetch_page(offset, size):
+        page = ee.FeatureCollection(polygon.toList(size, offset))
+        value = img.reduceRegions(collection=page, reducer=reducer, scale=scale)
+        return fetch_info(value.select(band_names, retainGeometry=keep_geometry), retries=retries)
+
+    # Retries are done by the request executor, with backoff adapted to quota errors.
+    for _, dict_value, _ in run_pages(fetch_page, n_features, batch_size, max_workers=max_workers,
+                                      retries=0, progress=progress):
+        yield data_format(dict_value)
+
+
+def value_from_image(img, polygon, method=None, scale=None, keep_geometry=False, batch_size=None,
+                     max_workers=4, retries=3, progress=None):
     """ Extract values from an multi-band image using polygon (e.g., point, polygon).
 
         Args:
             img (ee.Image): The image that is used to extract values from.
             polygon (ee.FeatureCollection): The shapefile feature collection.
-            method (str|optional): The method for extracting values using shapefile feature. Default to None.
+            method (str|optional): The reducer name used over each feature, see utils.get_reducer. Default to None (median).
             scale (int|float|optional): The scale value in meters.
             keep_geometry (bol|optional): If True, then keep the coordinate values. Default to False.
+            batch_size (int|optional): If given, extract pages of at most batch_size features
+                                       concurrently (see iter_values_from_image). Default to None.
+            max_workers (int|optional): The number of concurrent requests in batch mode. Default to 4.
+            retries (int|optional): The number of retries of a failed page in batch mode. Default to 3.
+            progress (callable|optional): The page progress callback in batch mode. Default to None.
 
         Returns:
             pandas.DataFrame: The extracted dataframe.
     """
-    if not isinstance(img, ee.Image):
-        raise TypeError("Unsupported data type!")
-    if not isinstance(polygon, ee.FeatureCollection):
-        raise TypeError("Unsupported data type!")
-    if method is None:
-        method = "median"
-    if scale is None:
-        scale = 1000
-    if not (isinstance(method, str) and isinstance(scale, (int, float))):
-        raise TypeError("Unsupported data type!")
-    value = img.reduceRegions(collection=polygon, reducer=method, scale=scale)
-    dict_value = value.select(
-        img.bandNames().getInfo(), retainGeometry=keep_geometry).getInfo()
+    if batch_size is not None:
+        import pandas as pd
+        pages = list(iter_values_from_image(img, polygon, method, scale, keep_geometry, batch_size,
+                                            max_workers, retries, progress))
+        if not pages:
+            return data_format({"features": []})
+        return pd.concat(pages, ignore_index=True)
+    method, scale = _check_extraction_args(img, polygon, method, scale)
+    band_names = get_info(img.bandNames())
+    # forEach names the outputs after the bands, also for single-band images.
+    reducer = get_reducer(method).forEach(band_names)
+    value = img.reduceRegions(collection=polygon, reducer=reducer, scale=scale)
+    dict_value = fetch_info(value.select(band_names, retainGeometry=keep_geometry))
     df = data_format(dict_value)
     return df
 
 
-def gee_linear_interpolate_nan(col, days=30):
+def extract_timeseries(col, features, reducer="mean", scale=1000, id_column=None,
+                       images_per_request=None, max_workers=4, retries=3, progress=None,
+                       parquet_path=None):
+    """ Extract the values of every image of a collection over many features into a long table.
+
+        reduceRegions is mapped over the collection and flattened server side, and the collection
+        is requested in pages of images_per_request images, so the number of round trips does not
+        grow with the number of dates.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            features (ee.FeatureCollection): The points or polygons to extract values from.
+            reducer (str|ee.Reducer|optional): The reducer, see utils.get_reducer. Multi-output reducers
+                                              give <band>_<output> bands. Default to mean.
+            scale (int|float|optional): The scale value in meters. Default to 1000.
+            id_column (str|optional): The feature property identifying features. Default to None (system:index).
+            images_per_request (int|optional): The number of images per request. Default to None,
+                                               which keeps each request under 5000 rows.
+            max_workers (int|optional): The number of concurrent requests. Default to 4.
+            retries (int|optional): The number of retries of a failed request. Default to 3.
+            progress (callable|optional): The page progress callback, see batch.run_pages. Default to None.
+            parquet_path (str|optional): If given, also write the table to this Parquet file. Default to None.
+
+        Returns:
+            pandas.DataFrame: A table with feature_id (str), date (datetime), band (category) and value (float).
+    """
+    import pandas as pd
+    if not isinstance(col, ee.ImageCollection):
+        raise TypeError("Unsupported data type. Expected data is ee.ImageCollection")
+    if not isinstance(features, ee.FeatureCollection):
+        raise TypeError("Unsupported data type. Expected data is ee.FeatureCollection")
+    if not isinstance(scale, (int, float)):
+        raise TypeError("Unsupported data type!")
+    ee_reducer = get_reducer(reducer)
+    if id_column is None:
+        features = features.map(lambda feat: feat.set("feature_id", feat.get("system:index")))
+    else:
+        features = features.map(lambda feat: feat.set("feature_id", feat.get(id_column)))
+    band_names = get_info(col.first().bandNames())
+    n_images, n_features = get_info(ee.List([col.size(), features.size()]))
+    # reduceRegions names single-band outputs after the reducer; forEach names them after the bands,
+    # prefixed to the outputs of multi-output reducers (e.g. NDVI_p10, NDVI_p90).
+    outputs = get_info(ee_reducer.getOutputs())
+    ee_reducer = ee_reducer.forEach(band_names)
+    if len(outputs) == 1:
+        columns = band_names
+    else:
+        columns = ["{}_{}".format(band, output) for band in band_names for output in outputs]
+    if images_per_request is None:
+        images_per_request = max(1, 5000 // max(n_features, 1))
+
+    def reduce_image(img):
+        values = img.reduceRegions(collection=features, reducer=ee_reducer, scale=scale)
+        return values.map(lambda feat: feat.set("date", img.get("system:time_start")))
+
+    def fetch_page(offset, size):
+        images = ee.ImageCollection(col.toList(size, offset))
+        values = images.map(reduce_image).flatten()
+        return fetch_info(values.select(["feature_id", "date"] + columns, retainGeometry=False),
+                          retries=retries)
+
+    frames = [data_format(dict_value) for _, dict_value, _ in
+              run_pages(fetch_page, n_images, images_per_request, max_workers=max_workers,
+                        retries=0, progress=progress)]
+    frames = [df for df in frames if not df.empty]
+    wide = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["feature_id", "date"] + columns)
+    df = long_format(wide.reindex(columns=["feature_id", "date"] + columns))
+    if parquet_path is not None:
+        df.to_parquet(parquet_path, index=False)
+    return df
+
+
+def gee_linear_interpolate_nan(col, days=30, mode="join"):
     """ Interpolating missing values
 
         Args:
             col (ee.ImageCollection): The input image collection.
             days (int, optional): The number of days to search for image before and after the missing values. Default o 30 days.
+            mode (str, optional): "join" attaches every image within the window to each image with two
+                                  saveAll joins and mosaics them. "array" stacks the series once per pixel
+                                  with toArray and slices the nearest observations, which avoids the
+                                  before/after lists on dense collections; a pixel then counts as valid only
+                                  where all bands are valid. Default to join.
 
         Returns:
             ee.ImageCollection: The output collection with missing valued being interpolated.
+
+        An xarray.DataArray with a time dimension is interpolated locally (see local.linear_interpolate_nan).
     """
+    if is_dataarray(col):
+        return local.xr_linear_interpolate_nan(col, days)
     if not isinstance(col, ee.ImageCollection):
         raise TypeError("Invalid data type. Only support ee.ImageCollection")
+    if mode not in ("join", "array"):
+        raise ValueError("Unsupported mode. Please choose join or array")
     time_col = col_timestamp_band(col)
+    if mode == "array":
+        return array_interpolation(time_col, days)
     filter1 = first_filter(days)
     filter2 = second_filter(days)
     ket1 = first_join_result(time_col, filter1)
@@ -354,13 +689,22 @@ def gee_linear_interpolate_nan(col, days=30):
     return interpolated_col
 
 
-def chunk_maker(feature_col, ncols, nrows):
+def chunk_maker(feature_col, ncols=None, nrows=None, cell_size=None, units="degrees", crs=None,
+                method=None, intersect=True):
     """ Split the study area into different chunks to facilitate the computation.
 
         Args:
             feature_col (ee.FeatureCollection): A region of interest
             ncols (n): The number of columns
             nrows (n): The number of rows
+            cell_size (int|float|optional): The cell size, used instead of ncols/nrows. Default to None.
+            units (str|optional): The units of cell_size: "degrees" (or any projection units of crs)
+                                  or "meters", which uses ee.Geometry.coveringGrid. Default to degrees.
+            crs (str|optional): The grid projection. Default to EPSG:4326 (EPSG:3857 for meters).
+            method (str|optional): "server" builds the cells with ee.List.sequence, "client" builds
+                                   them in Python and sends every rectangle. Not used with meters.
+                                   Default to None (server).
+            intersect (bool|optional): If True, keep only the cells intersecting the area. Default to True.
 
         Return:
             FeatureCollection: The number of chunks covers the study area.
@@ -369,42 +713,37 @@ def chunk_maker(feature_col, ncols, nrows):
         data = feature_col
     else:
         raise TypeError("Data must be ee.FeatureCollection!")
-
-    def get_bound(feature_col):
-        """ Get the min, max of the longitude and latitude of the study area
-
-        Return:
-            list: [(min_long, max_long), (min_lat, max_lat)]
-
-        """
-        bbox = feature_col.geometry().bounds().coordinates().getInfo()[0]
-        min_long = min(bbox[0][0], bbox[1][0], bbox[2][0], bbox[3][0])
-        max_long = max(bbox[0][0], bbox[1][0], bbox[2][0], bbox[3][0])
-
-        min_lat = min(bbox[0][1], bbox[1][1], bbox[2][1], bbox[3][1])
-        max_lat = max(bbox[0][1], bbox[1][1], bbox[2][1], bbox[3][1])
-
-        return [(round(min_long), round(max_long+1)), (round(min_lat-1), round(max_lat+1))]
-    bbox = get_bound(data)
-    min_lon, max_lon = bbox[0]
-    min_lat, max_lat = bbox[1]
-    # Space or distance of chunks
-    lon_dist = (max_lon - min_lon) / ncols
-    lat_dist = (max_lat - min_lat) / nrows
-
-    polys = []
-    cell = 0
-    for lon in arange(min_lon, max_lon, lon_dist):
-        x1 = lon
-        x2 = lon+lon_dist
-        for lat in arange(min_lat, max_lat, lat_dist):
-            cell += 1
-            y1 = lat
-            y2 = lat+lat_dist
-            polys.append(ee.Feature(ee.Geometry.Rectangle(
-                x1, y1, x2, y2), {"label": cell}))
-    feat_polys = ee.FeatureCollection(polys)
-    grid = feat_polys.filterBounds(feature_col)
+    if units not in ("degrees", "meters"):
+        raise ValueError("Unsupported units. Please choose degrees or meters")
+    if units == "meters" and method is not None:
+        raise ValueError("method is not supported with meters, which always uses coveringGrid.")
+    if method is None:
+        method = "server"
+    if method not in ("server", "client"):
+        raise ValueError("Unsupported method. Please choose server or client")
+    if cell_size is None and (ncols is None or nrows is None):
+        raise ValueError("Please provide ncols and nrows, or cell_size.")
+
+    if units == "meters":
+        if cell_size is None:
+            raise ValueError("cell_size is required when units is meters.")
+        proj = ee.Projection(crs or "EPSG:3857").atScale(cell_size)
+        # coveringGrid only returns the cells that intersect the geometry.
+        grid = data.geometry().coveringGrid(proj)
+        grid = grid.map(lambda feat: feat.set("label", feat.get("system:index")))
+    elif method == "server":
+        grid = server_grid(data, ncols, nrows, cell_size, crs or "EPSG:4326")
+    else:
+        crs = crs or "EPSG:4326"
+        bbox = get_info(data.geometry().bounds(1, crs).coordinates())[0]
+        xs = [point[0] for point in bbox]
+        ys = [point[1] for point in bbox]
+        layout = grid_layout(min(xs), max(xs), min(ys), max(ys), ncols, nrows, cell_size)
+        grid = ee.FeatureCollection([
+            ee.Feature(ee.Geometry.Rectangle([x1, y1, x2, y2], crs, False), {"label": label})
+            for label, x1, y1, x2, y2 in grid_cells(*layout)])
+    if intersect:
+        grid = grid.filterBounds(data)
     index_list = ee.List.sequence(0, grid.size().subtract(1))
     flist = grid.toList(grid.size())
     final_col = index_list.map(lambda i: ee.Feature(
@@ -414,49 +753,96 @@ def chunk_maker(feature_col, ncols, nrows):
     return final_col
 
 
-def export_to_googledrive(ds, aoi, folder_name="GEE_Data", file_name="NDVI_data", res=1000):
-    """ Export an image from GEE with a given scale and area of interest
-    to the Google Drive. If input data is an ImageCollection, it will convert it
-    into an image and then export. The collection should contains only single data,
-    for example NDVI bands or precipitation bands or LST bands.
+def _export_image(ds):
+    """ Return the image to export: a collection is stacked with toBands and its band names reversed.
 
-        Args:
-            ds (ee.Image|ee.ImageCollection): The input ee.Image or ee.ImageCollection
-            aoi (FeatureCollection): The area of interest to clip the images.
-            folder_name (str): An output file name. Default is GEE_Data
-            res (int): A spatial resolution in meters. Default is 1km.
-
-        Returns:
-            ee.Image: the clipped image with crs: 4326
+        The "<image id>_<band>" names of toBands become "<band>_<image id>" on the server, so no
+        band list is fetched before the export starts.
     """
     if isinstance(ds, ee.ImageCollection):
         # Convert it to an image
         img = ds.toBands()
-        # get bands and rename
-        oldband = img.bandNames().getInfo()
-        newband = ["_".join(i.split("_")[::-1]) for i in oldband]
-        # Rename it
-        new_img = img.select(oldband, newband).clip(aoi)
+        newband = img.bandNames().map(
+            lambda name: ee.List(ee.String(name).split("_")).reverse().join("_"))
+        return img.rename(newband)
     elif isinstance(ds, ee.Image):
-        new_img = ds.clip(aoi)
+        return ds
     else:
         raise TypeError("Unsupported data type!")
 
-    # Initialize the task of downloading an image
-    task = ee.batch.Export.image.toDrive(image=new_img,  # an ee.Image object.
+
+def _export_slices(ds, aoi, slice_period, make_task):
+    """ Start one export per period of a collection and return {YYYYMMDD: task}."""
+    if not isinstance(ds, ee.ImageCollection):
+        raise TypeError("slice_period requires an ee.ImageCollection.")
+    tagged = tag_period(ds, slice_period)
+    # A few dates (one per file), but the collection may grow between calls.
+    starts = fetch_info(tagged.aggregate_array(PERIOD_KEY).distinct().sort())
+    region = get_info(aoi.geometry().bounds())["coordinates"]
+    tasks = {}
+    for millis in starts:
+        key = period_key(millis)
+        img = _export_image(tagged.filter(ee.Filter.eq(PERIOD_KEY, millis))).clip(aoi)
+        tasks[key] = make_task(img, region, key)
+        get_executor().call("export", tasks[key].start)
+    return tasks
+
+
+def _drive_task(img, region, folder_name, file_name, res):
+    return ee.batch.Export.image.toDrive(image=img,  # an ee.Image object.
                                          # an ee.Geometry object.
-                                         region=aoi.geometry().bounds().getInfo()[
-                                             "coordinates"],
+                                         region=region,
                                          description=folder_name,
                                          folder=folder_name,
                                          fileNamePrefix=file_name,
                                          crs="EPSG:4326",
-                                         scale=res, 
-                                        maxPixels=1e13)
-    task.start()
+                                         scale=res,
+                                         maxPixels=1e13)
+
+
+def _asset_task(img, region, assetId, description, res, crs):
+    return ee.batch.Export.image.toAsset(image=img,  # an ee.Image object.
+                                         # an ee.Geometry object.
+                                         region=region,
+                                         description=description,
+                                         assetId=assetId,
+                                         crs=crs,
+                                         scale=res)
+
+
+def export_to_googledrive(ds, aoi, folder_name="GEE_Data", file_name="NDVI_data", res=1000,
+                          slice_period=None):
+    """ Export an image from GEE with a given scale and area of interest
+    to the Google Drive. If input data is an ImageCollection, it will convert it
+    into an image and then export. The collection should contains only single data,
+    for example NDVI bands or precipitation bands or LST bands.
+
+        Args:
+            ds (ee.Image|ee.ImageCollection): The input ee.Image or ee.ImageCollection
+            aoi (FeatureCollection): The area of interest to clip the images.
+            folder_name (str): An output file name. Default is GEE_Data
+            res (int): A spatial resolution in meters. Default is 1km.
+            slice_period (str|optional): Export a collection as one file per period (e.g. year,
+                                         see utils.period_start) named <file_name>_<YYYYMMDD>,
+                                         instead of one image with every band, which can exceed
+                                         maxPixels. Default to None.
+
+        Returns:
+            ee.batch.Task|dict: The started export task (crs: 4326), or {YYYYMMDD: task} with slice_period.
+    """
+    if slice_period is not None:
+        return _export_slices(ds, aoi, slice_period, lambda img, region, key: _drive_task(
+            img, region, folder_name, "{}_{}".format(file_name, key), res))
+    new_img = _export_image(ds).clip(aoi)
+    # Initialize the task of downloading an image
+    task = _drive_task(new_img, get_info(aoi.geometry().bounds())["coordinates"],
+                       folder_name, file_name, res)
+    get_executor().call("export", task.start)
+    return task
 
 
-def export_to_asset(ds, aoi, assetId, description="Exported_Data_To_Asset", res=1000, crs=None):
+def export_to_asset(ds, aoi, assetId, description="Exported_Data_To_Asset", res=1000, crs=None,
+                    slice_period=None):
     """ Export an image from GEE with a given scale and area of interest
     to the Google Drive. If input data is an ImageCollection, it will convert it
     into an image and then export. The collection should contains only single data,
@@ -468,32 +854,76 @@ def export_to_asset(ds, aoi, assetId, description="Exported_Data_To_Asset", res=
             folder_name (str): An output file name. Default is GEE_Data
             res (int): A spatial resolution in meters. Default is 1km.
             crs (str|optional): The output crs. Default to EPSG:4326
+            slice_period (str|optional): Export a collection as one asset per period (e.g. year,
+                                         see utils.period_start) named <assetId>_<YYYYMMDD>.
+                                         Default to None.
 
         Returns:
-            ee.Image: the clipped image with crs: 4326
+            ee.batch.Task|dict: The started export task, or {YYYYMMDD: task} with slice_period.
     """
     if crs is None:
         crs = "EPSG:4326"
-    if isinstance(ds, ee.ImageCollection):
-        # Convert it to an image
-        img = ds.toBands()
-        # get bands and rename
-        oldband = img.bandNames().getInfo()
-        newband = ["_".join(i.split("_")[::-1]) for i in oldband]
-        # Rename it
-        new_img = img.select(oldband, newband).clip(aoi)
-    elif isinstance(ds, ee.Image):
-        new_img = ds.clip(aoi)
-    else:
-        raise TypeError("Unsupported data type!")
-
+    if slice_period is not None:
+        return _export_slices(ds, aoi, slice_period, lambda img, region, key: _asset_task(
+            img, region, "{}_{}".format(assetId, key), "{}_{}".format(description, key), res, crs))
+    new_img = _export_image(ds).clip(aoi)
     # Initialize the task of downloading an image
-    task = ee.batch.Export.image.toAsset(image=new_img,  # an ee.Image object.
-                                         # an ee.Geometry object.
-                                         region=aoi.geometry().bounds().getInfo()[
-                                             "coordinates"],
-                                         description=description,
-                                         assetId=assetId,
-                                         crs=crs,
-                                         scale=res)
-    task.start()
+    task = _asset_task(new_img, get_info(aoi.geometry().bounds())["coordinates"],
+                       assetId, description, res, crs)
+    get_executor().call("export", task.start)
+    return task
+
+
+def export_tiles(ds, grid, destination="drive", folder_name="GEE_Data", file_name="NDVI_data",
+                 assetId=None, res=1000, crs=None, max_concurrent=4, max_retries=2,
+                 manifest_path=None, poll_interval=5, verbose=False):
+    """ Export an image or collection tile by tile, one task per cell of a grid (e.g. from chunk_maker).
+
+        At most max_concurrent tasks run at the same time, failed tasks are resubmitted and
+        progress is recorded in a JSON manifest so an interrupted run can be resumed
+        (see tasks.run_tasks).
+
+        Args:
+            ds (ee.Image|ee.ImageCollection): The input ee.Image or ee.ImageCollection.
+            grid (ee.FeatureCollection): The tiles, e.g. the output of chunk_maker.
+            destination (str|optional): "drive" or "asset". Default to drive.
+            folder_name (str|optional): The Google Drive folder. Default to GEE_Data.
+            file_name (str|optional): The file name prefix, suffixed with the tile id. Default to NDVI_data.
+            assetId (str|optional): The asset id prefix, suffixed with the tile id. Required for assets.
+            res (int|optional): A spatial resolution in meters. Default is 1km.
+            crs (str|optional): The output crs of asset exports. Default to EPSG:4326.
+            max_concurrent (int|optional): The maximum number of running tasks. Default to 4.
+            max_retries (int|optional): The number of resubmissions of a failed tile. Default to 2.
+            manifest_path (str|optional): The JSON manifest used to resume. Default to None.
+            poll_interval (int|float|optional): The first delay in seconds between polls. Default to 5.
+            verbose (bool|optional): If True, print task state changes. Default to False.
+
+        Returns:
+            dict: {tile id: ee.batch.Task}.
+
+        Raises:
+            tasks.TaskError: If tiles still failed after max_retries resubmissions, with the
+                             error of each one. Running again with the manifest only redoes them.
+    """
+    if not isinstance(grid, ee.FeatureCollection):
+        raise TypeError("Grid must be ee.FeatureCollection!")
+    if destination not in ("drive", "asset"):
+        raise ValueError("Unsupported destination. Please choose drive or asset")
+    if destination == "asset" and assetId is None:
+        raise ValueError("assetId is required to export to assets.")
+    if crs is None:
+        crs = "EPSG:4326"
+    img = _export_image(ds)
+
+    def factory(tile_id, geometry):
+        tile_img = img.clip(ee.Geometry(geometry))
+        region = geometry["coordinates"]
+        if destination == "drive":
+            return lambda: _drive_task(tile_img, region, folder_name,
+                                       "{}_{}".format(file_name, tile_id), res)
+        return lambda: _asset_task(tile_img, region, "{}_{}".format(assetId, tile_id),
+                                   "{}_{}".format(file_name, tile_id), res, crs)
+    task_factories = {str(feat["id"]): factory(feat["id"], feat["geometry"])
+                      for feat in fetch_info(grid)["features"]}
+    return run_tasks(task_factories, max_concurrent=max_concurrent, max_retries=max_retries,
+                     manifest_path=manifest_path, poll_interval=poll_interval, verbose=verbose)
@@ -0,0 +1,177 @@
+""" Orchestration of many ee.batch export tasks with a concurrency cap and a resumable manifest."""
+import json
+import os
+import time
+
+import ee
+
+from .executor import get_executor
+
+ACTIVE_STATES = ("UNSUBMITTED", "READY", "RUNNING", "CANCEL_REQUESTED")
+FAILED_STATES = ("FAILED", "CANCELLED")
+COMPLETED = "COMPLETED"
+
+
+class TaskError(RuntimeError):
+    """ Raised by run_tasks when tasks still failed after their resubmissions.
+
+        Attributes:
+            failed (dict): {key: error message} of the failed tasks.
+            handles (dict): {key: the last ee.batch.Task handle} of all the tasks, as returned by run_tasks.
+    """
+
+    def __init__(self, failed, handles):
+        super().__init__("{} task(s) failed: {}".format(len(failed), "; ".join(
+            "{}: {}".format(key, message) for key, message in sorted(failed.items()))))
+        self.failed = failed
+        self.handles = handles
+
+
+def _state(value):
+    # ee.batch.Task.State is an enum in recent versions of earthengine-api.
+    return getattr(value, "value", value)
+
+
+def load_manifest(manifest_path):
+    """ Read a task manifest written by run_tasks.
+
+        Args:
+            manifest_path (str): The JSON manifest path.
+
+        Returns:
+            dict: {task key: {"state", "attempts", "id", "name", "error"}}, empty if the file doesn't exist.
+    """
+    if manifest_path is None or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as file:
+        return json.load(file)
+
+
+def save_manifest(manifest, manifest_path):
+    """ Atomically write a task manifest."""
+    if manifest_path is None:
+        return
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def attach_task(entry):
+    """ Re-attach to a submitted export task recorded in a manifest entry."""
+    return ee.batch.Task(entry.get("id"), ee.batch.Task.Type.EXPORT_IMAGE,
+                         ee.batch.Task.State.RUNNING, name=entry.get("name"))
+
+
+def iter_tasks(task_factories, max_concurrent=4, max_retries=2, manifest_path=None,
+               poll_interval=5, max_poll_interval=120, attach=attach_task, sleep=time.sleep,
+               verbose=False):
+    """ Start export tasks with at most max_concurrent running, yielding each one once it settled.
+
+        The arguments are the ones of run_tasks. The manifest is saved before each yield, so a
+        task yielded as completed stays completed when the run is interrupted afterwards.
+
+        Yields:
+            tuple: (key, the last ee.batch.Task handle, None) once a task completed (with a None
+                   handle for tasks completed in a previous run), or (key, handle, error message)
+                   once it failed after max_retries resubmissions.
+    """
+    if not isinstance(max_concurrent, int) or max_concurrent < 1:
+        raise ValueError("max_concurrent must be a positive integer.")
+    manifest = load_manifest(manifest_path)
+    queue = []
+    running = {}
+    done = []
+    for key in task_factories:
+        entry = manifest.setdefault(key, {"state": "UNSUBMITTED", "attempts": 0})
+        if entry["state"] == COMPLETED:
+            done.append(key)
+        elif entry["state"] in ACTIVE_STATES and entry.get("name"):
+            running[key] = attach(entry)
+        else:
+            queue.append(key)
+    for key in done:
+        yield key, None, None
+
+    def report(key):
+        if verbose:
+            print("{}: {} (attempt {})".format(key, manifest[key]["state"], manifest[key]["attempts"]))
+
+    delay = poll_interval
+    while queue or running:
+        while queue and len(running) < max_concurrent:
+            key = queue.pop(0)
+            task = task_factories[key]()
+            get_executor().call("export", task.start)
+            entry = manifest[key]
+            entry.update({"state": "READY", "attempts": entry["attempts"] + 1,
+                          "id": task.id, "name": getattr(task, "name", None), "error": None})
+            running[key] = task
+            report(key)
+        save_manifest(manifest, manifest_path)
+        sleep(delay)
+        changed = False
+        settled = []
+        for key, task in list(running.items()):
+            status = get_executor().call("data", task.status)
+            state = _state(status["state"])
+            entry = manifest[key]
+            if state != entry["state"]:
+                changed = True
+                entry["state"] = state
+                report(key)
+            if state == COMPLETED:
+                del running[key]
+                settled.append((key, task, None))
+            elif state in FAILED_STATES:
+                del running[key]
+                entry["error"] = status.get("error_message")
+                if entry["attempts"] <= max_retries:
+                    queue.append(key)
+                else:
+                    # A cancelled task has no error message.
+                    settled.append((key, task, entry["error"] or state))
+        delay = poll_interval if changed else min(delay * 2, max_poll_interval)
+        save_manifest(manifest, manifest_path)
+        for result in settled:
+            yield result
+
+
+def run_tasks(task_factories, max_concurrent=4, max_retries=2, manifest_path=None,
+              poll_interval=5, max_poll_interval=120, attach=attach_task, sleep=time.sleep,
+              verbose=False):
+    """ Start export tasks with at most max_concurrent running, and wait for all of them.
+
+        Task status is polled through the executor with exponential backoff (reset whenever a
+        task changes state), failed or cancelled tasks are resubmitted up to max_retries times
+        and every change is written to a JSON manifest. Running again with the same manifest
+        skips completed tasks and re-attaches to tasks that are still active. See iter_tasks to
+        handle each task as soon as it settled.
+
+        Args:
+            task_factories (dict): {key: callable returning a new, unstarted ee.batch.Task}.
+            max_concurrent (int|optional): The maximum number of active tasks. Default to 4.
+            max_retries (int|optional): The number of resubmissions of a failed task. Default to 2.
+            manifest_path (str|optional): The JSON manifest path. Default to None (no manifest).
+            poll_interval (int|float|optional): The first delay in seconds between polls. Default to 5.
+            max_poll_interval (int|float|optional): The maximum delay between polls. Default to 120.
+            attach (callable|optional): Rebuild a task handle from a manifest entry. Default to attach_task.
+            sleep (callable|optional): The sleep function. Default to time.sleep.
+            verbose (bool|optional): If True, print state changes. Default to False.
+
+        Returns:
+            dict: {key: the last ee.batch.Task handle} (None for tasks completed in a previous run).
+
+        Raises:
+            TaskError: Once every task settled, if some of them failed after max_retries resubmissions.
+    """
+    handles = {key: None for key in task_factories}
+    failed = {}
+    for key, task, error in iter_tasks(task_factories, max_concurrent, max_retries, manifest_path,
+                                       poll_interval, max_poll_interval, attach, sleep, verbose):
+        handles[key] = task
+        if error is not None:
+            failed[key] = error
+    if failed:
+        raise TaskError(failed, handles)
+    return handles
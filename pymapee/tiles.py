@@ -0,0 +1,331 @@
+""" Map id caching and a local caching/prefetching XYZ tile proxy for interactive maps."""
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .cache import expression_key
+from .executor import get_executor
+
+
+def default_map_id(ee_object, vis_params):
+    """ Request a map id from the server through the request executor."""
+    return get_executor().call("getMapId", ee_object.getMapId, vis_params)
+
+
+class MapIdCache:
+    """ A LRU cache of getMapId results keyed on the expression and the visualization parameters.
+
+        Args:
+            maxsize (int|optional): The maximum number of entries. Default to 128.
+            ttl (int|float|optional): The lifetime of an entry in seconds, kept below the lifetime of
+                                      the map id tokens. Default to 3600. None never expires.
+            transport (callable|optional): Called with (ee_object, vis_params) on a miss. Default to getMapId.
+    """
+
+    def __init__(self, maxsize=128, ttl=3600, transport=None):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize must be a positive integer.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.transport = transport or default_map_id
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ee_object, vis_params=None):
+        """ Return the map id of an object, requesting it only on a cache miss."""
+        vis_params = vis_params or {}
+        key = expression_key(ee_object) + expression_key(vis_params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        map_id = self.transport(ee_object, vis_params)
+        with self._lock:
+            self._entries[key] = (map_id, None if self.ttl is None else now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return map_id
+
+    def stats(self):
+        """ Return hits, misses, hit_ratio and size."""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0, "size": len(self._entries)}
+
+
+_map_id_cache = MapIdCache()
+
+
+def get_map_id(ee_object, vis_params=None):
+    """ Memoized ee_object.getMapId(vis_params) used by ee_tile_layer."""
+    return _map_id_cache.get(ee_object, vis_params)
+
+
+def map_id_cache():
+    """ Return the map id cache used by get_map_id."""
+    return _map_id_cache
+
+
+class TileCache:
+    """ An on-disk LRU cache of tiles bounded by a total size in bytes.
+
+        Args:
+            folder (str): The cache folder.
+            max_bytes (int|optional): The maximum total size of the cached tiles. Default to 256 MB.
+    """
+
+    def __init__(self, folder, max_bytes=256 * 2 ** 20):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        # Pick up tiles of a previous session, oldest access first.
+        existing = []
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                existing.append((os.path.getatime(path), name, os.path.getsize(path)))
+        for _, name, size in sorted(existing):
+            self._files[name] = size
+            self.size += size
+        self._evict()
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ Return the cached bytes of a tile, or None."""
+        name = self._name(key)
+        with self._lock:
+            if name not in self._files:
+                return None
+            self._files.move_to_end(name)
+        try:
+            with open(os.path.join(self.folder, name), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._files.pop(name, 0)
+            return None
+
+    def put(self, key, content):
+        """ Store the bytes of a tile and evict the least recently used tiles if needed."""
+        name = self._name(key)
+        tmp_path = os.path.join(self.folder, name + ".tmp")
+        with open(tmp_path, "wb") as file:
+            file.write(content)
+        os.replace(tmp_path, os.path.join(self.folder, name))
+        with self._lock:
+            self.size += len(content) - self._files.get(name, 0)
+            self._files[name] = len(content)
+            self._files.move_to_end(name)
+            self._evict()
+
+    def __contains__(self, key):
+        name = self._name(key)
+        with self._lock:
+            return name in self._files
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._files:
+            name, size = self._files.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+
+
+MAX_ZOOM = 22
+
+
+def fetch_url(url, timeout=30):
+    """ Download a tile."""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+def neighbour_tiles(z, x, y, radius=1, zoom=True, max_zoom=MAX_ZOOM):
+    """ Return the distinct tiles around (z, x, y), plus its parent and children when zoom is True.
+
+        Columns wrap around the antimeridian, rows outside the world and children deeper
+        than max_zoom are dropped.
+    """
+    n = 2 ** z
+    tiles = []
+    for dx in range(-radius, radius + 1):
+        for dy in range(-radius, radius + 1):
+            if 0 <= y + dy < n:
+                tiles.append((z, (x + dx) % n, y + dy))
+    if zoom:
+        if z > 0:
+            tiles.append((z - 1, x // 2, y // 2))
+        if z < max_zoom:
+            tiles.extend((z + 1, 2 * x + i, 2 * y + j) for i in (0, 1) for j in (0, 1))
+    # Wrapping can reach the same column twice (or the tile itself) at low zoom levels.
+    tiles = dict.fromkeys(tiles)
+    tiles.pop((z, x, y), None)
+    return list(tiles)
+
+
+class TileProxy:
+    """ A local XYZ tile server caching upstream tiles on disk and prefetching neighbouring tiles.
+
+        Register a layer with add_layer(url_format) and give the returned URL to a TileLayer.
+
+        Args:
+            cache_dir (str): The on-disk tile cache folder.
+            max_bytes (int|optional): The maximum size of the tile cache. Default to 256 MB.
+            prefetch_radius (int|optional): The neighbouring tiles fetched in the background
+                                            around every requested tile (0 disables it). Default to 1.
+            prefetch_zoom (bool|optional): If True, also prefetch the parent and child tiles. Default to True.
+            max_zoom (int|optional): The deepest zoom level prefetched. Default to 22.
+            max_workers (int|optional): The number of prefetching threads. Default to 4.
+            host (str|optional): The interface to listen on. Default to 127.0.0.1.
+            port (int|optional): The port. Default to 0 (any free port).
+            fetch (callable|optional): Download an upstream URL. Default to fetch_url.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 2 ** 20, prefetch_radius=1, prefetch_zoom=True,
+                 max_zoom=MAX_ZOOM, max_workers=4, host="127.0.0.1", port=0, fetch=fetch_url):
+        self.cache = TileCache(cache_dir, max_bytes)
+        self.prefetch_radius = prefetch_radius
+        self.prefetch_zoom = prefetch_zoom
+        self.max_zoom = max_zoom
+        self.fetch = fetch
+        self.layers = {}
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        """ Start serving in a background thread and return the proxy."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop the server and the prefetching threads."""
+        if self._thread is not None:
+            self._server.shutdown()
+        self._server.server_close()
+        self._executor.shutdown(wait=True)
+        self._thread = None
+
+    def add_layer(self, url_format, name=None):
+        """ Register an upstream {z}/{x}/{y} URL template and return the proxied template."""
+        if name is None:
+            name = hashlib.sha256(url_format.encode("utf-8")).hexdigest()[:16]
+        self.layers[name] = url_format
+        return "{}/{}/{{z}}/{{x}}/{{y}}".format(self.url, name)
+
+    def _key(self, layer, z, x, y):
+        return json.dumps([self.layers[layer], z, x, y])
+
+    def _download(self, layer, z, x, y):
+        content = self.fetch(self.layers[layer].format(z=z, x=x, y=y))
+        self.cache.put(self._key(layer, z, x, y), content)
+        return content
+
+    def get_tile(self, layer, z, x, y):
+        """ Return the bytes of a tile from the cache or upstream, and prefetch its neighbours."""
+        content = self.cache.get(self._key(layer, z, x, y))
+        with self._lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if content is None:
+            content = self._download(layer, z, x, y)
+        if self.prefetch_radius or self.prefetch_zoom:
+            for tile in neighbour_tiles(z, x, y, self.prefetch_radius, self.prefetch_zoom,
+                                        self.max_zoom):
+                self._prefetch(layer, *tile)
+        return content
+
+    def _prefetch(self, layer, z, x, y):
+        key = self._key(layer, z, x, y)
+        with self._lock:
+            if key in self._pending or key in self.cache:
+                return
+            self._pending.add(key)
+
+        def run():
+            try:
+                self._download(layer, z, x, y)
+                with self._lock:
+                    self.prefetched += 1
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+        self._executor.submit(run)
+
+    def wait_prefetch(self, timeout=10):
+        """ Wait until the scheduled prefetches are done (mostly for tests)."""
+        deadline = time.time() + timeout
+        while self._pending and time.time() < deadline:
+            time.sleep(0.01)
+
+    def stats(self):
+        """ Return hits, misses, hit_ratio, prefetched tiles and the cache size in bytes."""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0,
+                "prefetched": self.prefetched, "cache_bytes": self.cache.size}
+
+    def _handler(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                try:
+                    layer, z, x, y = parts[0], int(parts[1]), int(parts[2]), int(parts[3])
+                    if layer not in proxy.layers:
+                        raise KeyError(layer)
+                except (IndexError, ValueError, KeyError):
+                    self.send_error(404)
+                    return
+                try:
+                    content = proxy.get_tile(layer, z, x, y)
+                except Exception as e:
+                    self.send_error(502, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(content)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+        return Handler
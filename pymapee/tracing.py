@@ -0,0 +1,233 @@
+""" Per-call tracing of the server round trips of pymapee.
+
+Every request going through the request executor (getInfo, data pages, getMapId, task starts) is
+recorded while a trace is active:
+
+    from pymapee import tracing
+
+    sink = tracing.MemorySink()
+    with tracing.trace(sink, tracing.LoggingSink()):
+        value_from_image(img, regions)
+    print(sink.summary())
+
+Each record is a dict with the call kind, the calling function (the outermost pymapee function, or
+the user code calling pymapee), the start time, the wall time in seconds including retries, the
+request and response sizes in bytes and the error, if any. A sink is any callable taking a record.
+When no trace is active the executor only checks an empty tuple.
+"""
+import contextlib
+import json
+import logging
+import sys
+import threading
+import time
+
+import ee
+
+logger = logging.getLogger(__name__)
+
+# Modules that forward calls to the server: the calling function is looked up above them.
+INFRASTRUCTURE = ("pymapee.executor", "pymapee.cache", "pymapee.tracing", "pymapee.batch",
+                  "pymapee.tiles", "pymapee.tasks", "pymapee.aio")
+
+_sinks = ()
+_lock = threading.Lock()
+# The calling function of the requests made by worker threads (see propagate).
+_local = threading.local()
+
+
+def enabled():
+    """ Return True if a trace is active."""
+    return bool(_sinks)
+
+
+@contextlib.contextmanager
+def trace(*sinks):
+    """ Send a record of every server call made inside the block to the sinks.
+
+        Traces can be nested: a call is recorded by the sinks of every active trace. Also usable
+        as a decorator: @trace(sink).
+
+        Args:
+            sinks (callable): Called with each record (see MemorySink, LoggingSink, SpanSink).
+
+        Returns:
+            The sink, or the tuple of sinks, as the target of the with statement.
+    """
+    global _sinks
+    with _lock:
+        _sinks = _sinks + sinks
+    try:
+        yield sinks[0] if len(sinks) == 1 else sinks
+    finally:
+        with _lock:
+            remaining = list(_sinks)
+            for sink in sinks:
+                remaining.remove(sink)
+            _sinks = tuple(remaining)
+
+
+def payload_size(value):
+    """ Return the serialized size in bytes of an Earth Engine expression, a task or a JSON value."""
+    if value is None:
+        return 0
+    if isinstance(value, ee.ComputedObject):
+        return len(ee.serializer.toJSON(value))
+    config = getattr(value, "config", None)
+    if isinstance(config, dict):
+        value = config
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _request(func, args):
+    # The expression sent: the first argument, or the object of a bound method (getMapId, start).
+    for arg in args:
+        if isinstance(arg, ee.ComputedObject):
+            return arg
+    return getattr(func, "__self__", args[0] if args else None)
+
+
+def calling_function():
+    """ Return "module.function" of the outermost pymapee function on the stack, or of its caller."""
+    caller = getattr(_local, "caller", None)
+    if caller is not None:
+        return caller
+    frame = sys._getframe(1)
+    found = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("pymapee") and module not in INFRASTRUCTURE:
+            found = "{}.{}".format(module, frame.f_code.co_name)
+        elif found is None and not module.startswith("pymapee"):
+            found = "{}.{}".format(module, frame.f_code.co_name)
+        elif found is not None and not module.startswith("pymapee"):
+            break
+        frame = frame.f_back
+    return found
+
+
+def propagate(func):
+    """ Attribute the server calls made by func on another thread to the current calling function.
+
+        Returns func itself when no trace is active.
+    """
+    if not _sinks:
+        return func
+    caller = calling_function()
+
+    def run(*args, **kwargs):
+        previous = getattr(_local, "caller", None)
+        _local.caller = caller
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.caller = previous
+    return run
+
+
+def record_call(kind, func, args, run):
+    """ Run a server call and send its record to the active sinks.
+
+        Args:
+            kind (str): The call kind.
+            func (callable): The server call, used to find the request.
+            args (tuple): Its arguments.
+            run (callable): Runs the call (with retries) and returns its result.
+
+        Returns:
+            object: The value returned by run.
+    """
+    sinks = _sinks
+    record = {"kind": kind, "function": calling_function(), "start": time.time(),
+              "request_bytes": payload_size(_request(func, args)), "response_bytes": 0, "error": None}
+    start = time.perf_counter()
+    try:
+        result = run()
+    except Exception as e:
+        record["error"] = "{}: {}".format(type(e).__name__, e)
+        raise
+    else:
+        record["response_bytes"] = payload_size(result)
+        return result
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        for sink in sinks:
+            try:
+                sink(record)
+            except Exception:
+                logger.exception("Tracing sink %r failed.", sink)
+
+
+class MemorySink:
+    """ Keep the records in a list, e.g. for tests or notebooks."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        """ Return {function: {calls, seconds, request_bytes, response_bytes, errors}}."""
+        out = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            entry = out.setdefault(record["function"], {
+                "calls": 0, "seconds": 0.0, "request_bytes": 0, "response_bytes": 0, "errors": 0})
+            entry["calls"] += 1
+            entry["seconds"] += record["seconds"]
+            entry["request_bytes"] += record["request_bytes"]
+            entry["response_bytes"] += record["response_bytes"]
+            entry["errors"] += record["error"] is not None
+        return out
+
+
+class LoggingSink:
+    """ Log every record on a logger.
+
+        Args:
+            logger (logging.Logger|optional): The logger. Default to the pymapee.tracing logger.
+            level (int|optional): The logging level. Default to logging.INFO.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(self.level, "%s %s %.3fs request=%dB response=%dB%s", record["kind"],
+                        record["function"], record["seconds"], record["request_bytes"],
+                        record["response_bytes"], " error=" + record["error"] if record["error"] else "")
+
+
+class SpanSink:
+    """ Convert every record to an OpenTelemetry-style span and pass it to an exporter.
+
+        Each span is a dict with name, start_time and end_time (nanoseconds since the epoch), status
+        ("OK" or "ERROR") and attributes.
+
+        Args:
+            exporter (object): Any object with an export(spans) method, e.g. a batching adapter to an
+                               OpenTelemetry SpanExporter.
+    """
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+
+    def __call__(self, record):
+        start = int(record["start"] * 1e9)
+        span = {"name": "pymapee.{}".format(record["kind"]), "start_time": start,
+                "end_time": start + int(record["seconds"] * 1e9),
+                "status": "ERROR" if record["error"] else "OK",
+                "attributes": {"code.function": record["function"],
+                               "pymapee.request_bytes": record["request_bytes"],
+                               "pymapee.response_bytes": record["response_bytes"]}}
+        if record["error"]:
+            span["attributes"]["exception.message"] = record["error"]
+        self.exporter.export([span])
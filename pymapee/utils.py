@@ -3,7 +3,9 @@ import datetime
 import ee
 import os
 import json
-from ipyleaflet import TileLayer
+import operator
+from . import local
+from .local import is_dataarray
 
 ##############################################################################
 #                                 Cloud Mask                                 #
@@ -39,16 +41,104 @@ def cloud_mask(col, from_bit, to_bit, QA_band, threshold=1):
 
         Returns:
             ee.ImageCollection: Cloud masked ImageCollection.
+
+        An xarray.DataArray with a band dimension, or a NumPy array with bands as the last axis
+        (QA_band is then a band index), is masked locally with NaN (see local.cloud_mask).
     """
-    def img_mask(img):
-        qa_band = img.select(QA_band)
-        bitmask_band = bitwise_extract(qa_band, from_bit, to_bit)
-        mask_threshold = bitmask_band.lte(threshold)
-        masked_band = img.updateMask(mask_threshold)
-        return masked_band
-    cloudless_col = col.map(img_mask)
+    if is_dataarray(col):
+        return local.xr_cloud_mask(col, from_bit, to_bit, QA_band, threshold)
+    if not isinstance(col, ee.ComputedObject) and hasattr(col, "shape"):
+        return local.cloud_mask(col, from_bit, to_bit, QA_band, threshold)
+    cloudless_col = col.map(lambda img: cloud_mask_image(img, from_bit, to_bit, QA_band, threshold))
     return cloudless_col
 
+
+def cloud_mask_image(img, from_bit, to_bit, QA_band, threshold=1):
+    """ Mask out the cloud-related pixels of one image (see cloud_mask)."""
+    qa_band = img.select(QA_band)
+    bitmask_band = bitwise_extract(qa_band, from_bit, to_bit)
+    mask_threshold = bitmask_band.lte(threshold)
+    masked_band = img.updateMask(mask_threshold)
+    return masked_band
+
+
+# The QA band and the (from_bit, to_bit, threshold) rules of each sensor, keeping the pixels whose
+# bits are lower than or equal to the threshold.
+QA_PRESETS = {
+    # MOD13/MYD13 vegetation indices.
+    "modis": ("DetailedQA", {"vi_quality": (0, 1, 1), "adjacent_cloud": (8, 8, 0),
+                             "mixed_clouds": (10, 10, 0), "snow_ice": (14, 14, 0),
+                             "shadow": (15, 15, 0)}),
+    # Landsat Collection 2 Level 2.
+    "landsat": ("QA_PIXEL", {"fill": (0, 0, 0), "dilated_cloud": (1, 1, 0), "cirrus": (2, 2, 0),
+                             "cloud": (3, 3, 0), "cloud_shadow": (4, 4, 0), "snow": (5, 5, 0)}),
+    # Sentinel-2 Level 1C/2A.
+    "sentinel2": ("QA60", {"opaque_cloud": (10, 10, 0), "cirrus": (11, 11, 0)}),
+}
+
+
+def qa_rules(rules, QA_band=None):
+    """ Return the QA band and the list of (from_bit, to_bit, threshold) rules of a mask.
+
+        Args:
+            rules (str|dict|list): A QA_PRESETS name, or {name: rule} or a list of rules.
+            QA_band (str|int|optional): The QA band, required with custom rules. Default to None
+                                        (the band of the preset).
+
+        Returns:
+            tuple: (QA_band, list of rules).
+    """
+    if isinstance(rules, str):
+        if rules not in QA_PRESETS:
+            raise ValueError("Unsupported preset. Expected one of {}".format(", ".join(QA_PRESETS)))
+        band, named = QA_PRESETS[rules]
+        return band if QA_band is None else QA_band, list(named.values())
+    if QA_band is None:
+        raise ValueError("QA_band is required with custom rules.")
+    if isinstance(rules, dict):
+        rules = rules.values()
+    return QA_band, [tuple(rule) for rule in rules]
+
+
+def qa_mask(col, rules, QA_band=None):
+    """ Mask out the pixels failing any of several QA bit rules in a single map.
+
+        The rules are compiled once into one bitwise test per image (see local.compile_qa_rules),
+        instead of one cloud_mask pass per bit range.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            rules (str|dict|list): A QA_PRESETS name ("modis", "landsat", "sentinel2"), or
+                                   (from_bit, to_bit, threshold) rules as a list or {name: rule}.
+            QA_band (str|optional): The quality assurance band. Default to None (the band of the preset).
+
+        Returns:
+            ee.ImageCollection: The masked ImageCollection.
+
+        An xarray.DataArray with a band dimension, or a NumPy array with bands as the last axis
+        (QA_band is then a band index), is masked locally with NaN (see local.qa_mask).
+    """
+    band, rules = qa_rules(rules, QA_band)
+    if is_dataarray(col):
+        return local.xr_qa_mask(col, rules, band)
+    if not isinstance(col, ee.ComputedObject) and hasattr(col, "shape"):
+        return local.qa_mask(col, rules, band)
+    return col.map(lambda img: qa_mask_image(img, rules, band))
+
+
+def qa_mask_image(img, rules, QA_band=None):
+    """ Mask out the pixels of one image failing any of several QA bit rules (see qa_mask)."""
+    band, rules = qa_rules(rules, QA_band)
+    zero_mask, fields = local.compile_qa_rules(rules)
+    qa = img.select(band)
+    keep = qa.bitwiseAnd(zero_mask).eq(0) if zero_mask else None
+    for from_bit, mask, threshold in fields:
+        field = qa.rightShift(from_bit).bitwiseAnd(mask).lte(threshold)
+        keep = field if keep is None else keep.And(field)
+    if keep is None:
+        return img
+    return img.updateMask(keep)
+
 ##############################################################################
 #                            Datetime Untilities                             #
 ##############################################################################
@@ -132,6 +222,395 @@ def adjust_date_col(ds):
     fin_col = ee.ImageCollection(ds.map(adjust_date))
     return fin_col
 
+##############################################################################
+#                            Temporal Compositing                            #
+##############################################################################
+
+PERIOD_KEY = "period_start"
+
+
+def _period_month(date):
+    return ee.Date.fromYMD(date.get("year"), date.get("month"), 1)
+
+
+def _period_day(date):
+    return ee.Date.fromYMD(date.get("year"), date.get("month"), date.get("day"))
+
+
+def _period_pentad(date):
+    pentad = ee.Number(date.get("day")).subtract(1).divide(5).floor().min(5)
+    return ee.Date.fromYMD(date.get("year"), date.get("month"), pentad.multiply(5).add(1))
+
+
+def _period_week(date):
+    # Joda weeks start on Monday, which gives ISO weeks.
+    day = _period_day(date)
+    return day.advance(date.getRelative("day", "week").multiply(-1), "day")
+
+
+def _period_dekad(date):
+    dekad = ee.Number(date.get("day")).subtract(1).divide(10).floor().min(2)
+    return ee.Date.fromYMD(date.get("year"), date.get("month"), dekad.multiply(10).add(1))
+
+
+def _season_lookup(months, column, date):
+    # The 12-entry table is built on the client, the server only indexes it by month.
+    values = [row[column] for row in local.season_table(months)]
+    return ee.List(values).get(ee.Number(date.get("month")).subtract(1))
+
+
+def _period_season(date, months):
+    year = ee.Number(date.get("year")).add(_season_lookup(months, 0, date))
+    return ee.Date.fromYMD(year, _season_lookup(months, 1, date), 1)
+
+
+def _period_year(date):
+    return ee.Date.fromYMD(date.get("year"), 1, 1)
+
+
+PERIODS = {
+    "day": _period_day,
+    "pentad": _period_pentad,
+    "week": _period_week,
+    "dekad": _period_dekad,
+    "month": _period_month,
+    "season": lambda date: _period_season(date, local.SEASONS["season"]),
+    "water_year": lambda date: _period_season(date, local.SEASONS["water_year"]),
+    "year": _period_year,
+}
+
+
+def period_start(date, period="month"):
+    """ Return the start date of the period that contains a date.
+
+        Args:
+            date (ee.Date): The input date.
+            period (str|tuple|optional): The period name. Supported periods are day, pentad
+                                         (days 1, 6, 11, 16, 21 and 26 of the month), week (ISO),
+                                         dekad, month, season (DJF, MAM, JJA, SON), water_year
+                                         (from October) and year, or a tuple of season start
+                                         months, e.g. (11, 5). Default to month.
+
+        Returns:
+            ee.Date: The first date of the period.
+    """
+    period = local.normalize_period(period)
+    if isinstance(period, tuple):
+        return _period_season(ee.Date(date), period)
+    return PERIODS[period](ee.Date(date))
+
+
+def period_slot(date, period="month"):
+    """ Return the position of the period of a date within its year, keying the climatologies.
+
+        Args:
+            date (ee.Date): The input date.
+            period (str|tuple|optional): The period, see period_start. Default to month.
+
+        Returns:
+            ee.Number: The day of year, pentad (1-72), ISO week (1-53), dekad (1-36), month,
+                       season number (1 for the earliest start month) or 1 for years.
+    """
+    period = local.normalize_period(period)
+    date = ee.Date(date)
+    if isinstance(period, tuple) or period in local.SEASONS:
+        return ee.Number(_season_lookup(local.SEASONS.get(period, period), 2, date))
+    if period in ("pentad", "dekad"):
+        per_month, days = (6, 5) if period == "pentad" else (3, 10)
+        index = ee.Number(date.get("day")).subtract(1).divide(days).floor().min(per_month - 1)
+        return ee.Number(date.get("month")).subtract(1).multiply(per_month).add(index).add(1)
+    if period == "day":
+        return ee.Number(date.getRelative("day", "year")).add(1)
+    if period == "week":
+        return date.get("week")
+    if period == "month":
+        return date.get("month")
+    return ee.Number(1)
+
+
+# The first days of the sub-monthly periods.
+PERIOD_DAYS = {"pentad": [1, 6, 11, 16, 21, 26], "dekad": [1, 11, 21]}
+
+
+def period_sequence(start, end, period="month"):
+    """ Return the starts of the periods overlapping [start, end) as one server-side list.
+
+        The boundaries are generated in a single expression (sequence, map and filter),
+        without a client loop or ee.Algorithms.If, e.g. to build the periods of a composite or
+        an export. local.period_sequence is the client-side equivalent.
+
+        Args:
+            start (ee.Date|str): The first date.
+            end (ee.Date|str): The end date (exclusive).
+            period (str|tuple|optional): The period, see period_start. Default to month.
+
+        Returns:
+            ee.List: The period starts in milliseconds, sorted.
+    """
+    period = local.normalize_period(period)
+    first = period_start(start, period)
+    end = ee.Date(end)
+    if period in ("day", "week", "month", "year"):
+        step, unit = (7, "day") if period == "week" else (1, period)
+        count = end.difference(first, unit).divide(step).ceil().max(0)
+        starts = ee.List.sequence(0, count).map(
+            lambda n: first.advance(ee.Number(n).multiply(step), unit).millis())
+    else:
+        if period in PERIOD_DAYS:
+            days = PERIOD_DAYS[period]
+
+            def month_starts(n):
+                month = first.advance(n, "month")
+                return ee.List(days).map(lambda day: ee.Date.fromYMD(
+                    month.get("year"), month.get("month"), day).millis())
+        else:
+            months = local.SEASONS.get(period, period)
+            # 1 for the calendar months starting a season, 0 for the others.
+            is_start = [int(month in months) for month in range(1, 13)]
+
+            def month_starts(n):
+                month = first.advance(n, "month")
+                keep = ee.List(is_start).get(ee.Number(month.get("month")).subtract(1))
+                return ee.List([month.millis()]).slice(0, keep)
+        count = end.difference(first, "month").ceil().max(0)
+        starts = ee.List.sequence(0, count).map(month_starts).flatten()
+    # The counts are rounded up: the filter drops the starts past the end.
+    return starts.filter(ee.Filter.And(ee.Filter.gte("item", first.millis()),
+                                       ee.Filter.lt("item", end.millis())))
+
+
+def period_key(millis):
+    """ Return the YYYYMMDD name of a period start given in milliseconds (UTC)."""
+    date = datetime.datetime.fromtimestamp(millis / 1000, tz=datetime.timezone.utc)
+    return date.strftime("%Y%m%d")
+
+
+def tag_period(col, period="month"):
+    """ Tag each image of a collection with the start (millis) of its period.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            period (str|optional): The period name, see period_start. Default to month.
+
+        Returns:
+            ee.ImageCollection: The collection with a period_start property on every image.
+    """
+    def tag(img):
+        return img.set(PERIOD_KEY, period_start(img.date(), period).millis())
+    return col.map(tag)
+
+
+REDUCERS = {
+    "mean": "mean", "average": "mean",
+    "max": "max", "maximum": "max",
+    "min": "min", "minimum": "min",
+    "median": "median", "mvc": "median",
+    "sum": "sum", "total": "sum",
+    "count": "count",
+    "first": "firstNonNull",
+    "last": "lastNonNull",
+    "std": "stdDev",
+}
+
+
+def get_reducer(reducer):
+    """ Return an ee.Reducer from its name.
+
+        Args:
+            reducer (str|ee.Reducer): The reducer name (e.g., mean, max, min, median, sum, count, std)
+                                      or a percentile written as p<N> (e.g., p90).
+
+        Returns:
+            ee.Reducer: The reducer.
+    """
+    if isinstance(reducer, ee.Reducer):
+        return reducer
+    if not isinstance(reducer, str):
+        raise TypeError("Unsupported data type. Reducer should be string or ee.Reducer")
+    name = reducer.lower().strip()
+    if name in REDUCERS:
+        return getattr(ee.Reducer, REDUCERS[name])()
+    if name.startswith("p") and name[1:].replace(".", "", 1).isdigit():
+        return ee.Reducer.percentile([float(name[1:])])
+    raise ValueError(
+        "Unsupported reducer. Please choose one of {} or p<N>".format(", ".join(REDUCERS)))
+
+
+def group_composite(col, period="month", reducer="max"):
+    """ Composite a collection by period in a single grouped pass.
+
+        Every image is tagged once with the start of its period and all images of the
+        same period are gathered with one saveAll join, so no filterDate is built per period
+        and empty periods are skipped without ee.Algorithms.If.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            period (str|optional): The period name, see period_start. Default to month.
+            reducer (str|ee.Reducer|optional): The reducer, see get_reducer. Default to max.
+
+        Returns:
+            ee.ImageCollection: A collection with one image per period, sorted by time.
+    """
+    if not isinstance(col, ee.ImageCollection):
+        raise TypeError(
+            "Unsupported data type. Expected data is ee.ImageCollection")
+    # Named reducers keep the input band names like col.max() does.
+    keep_names = isinstance(reducer, str)
+    ee_reducer = get_reducer(reducer)
+    tagged = tag_period(col, period)
+    groups = ee.Join.saveAll("images").apply(
+        **{"primary": tagged.distinct(PERIOD_KEY), "secondary": tagged,
+           "condition": ee.Filter.equals(**{"leftField": PERIOD_KEY, "rightField": PERIOD_KEY})})
+
+    def reduce_group(img):
+        images = ee.ImageCollection.fromImages(img.get("images"))
+        out_img = images.reduce(ee_reducer)
+        if keep_names:
+            out_img = out_img.rename(ee.Image(images.first()).bandNames())
+        return out_img.set({"system:time_start": img.get(PERIOD_KEY)})
+    composite_col = ee.ImageCollection(groups.map(reduce_group))
+    return composite_col.sort("system:time_start")
+
+
+def expression_stats(ee_object):
+    """ Return the serialized size and node count of an Earth Engine expression.
+
+        Args:
+            ee_object (ee.ComputedObject): Any Earth Engine object.
+
+        Returns:
+            dict: {"bytes": size of the serialized request, "nodes": number of expression nodes}.
+    """
+    encoded = ee.serializer.encode(ee_object, for_cloud_api=True)
+    return {"bytes": len(json.dumps(encoded, separators=(",", ":"))),
+            "nodes": len(encoded.get("values", {}))}
+
+##############################################################################
+#                                Climatology                                 #
+##############################################################################
+
+CLIMATOLOGY_STATS = {"mean": "mean", "min": "min", "max": "max", "std": "stdDev", "count": "count"}
+
+
+def climatology_reducer(stats=("mean", "min", "max", "std")):
+    """ Return one combined reducer computing all the requested statistics in a single pass."""
+    if isinstance(stats, str):
+        stats = [stats]
+    unknown = [stat for stat in stats if stat not in CLIMATOLOGY_STATS]
+    if not stats or unknown:
+        raise ValueError(
+            "Unsupported statistics. Please choose from {}".format(", ".join(CLIMATOLOGY_STATS)))
+    reducers = [getattr(ee.Reducer, CLIMATOLOGY_STATS[stat])() for stat in stats]
+    reducer = reducers[0]
+    for other in reducers[1:]:
+        reducer = reducer.combine(other, None, True)
+    return reducer
+
+
+def climatology_key(period="month"):
+    """ Return the property keying the climatology of a period: month for months, slot otherwise."""
+    return "month" if local.normalize_period(period) == "month" else "slot"
+
+
+def period_climatology(col, period="month", stats=("mean", "min", "max", "std")):
+    """ Compute the statistics of every period slot of a collection once, e.g. per dekad of the year.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            period (str|tuple|optional): The period, see period_start and period_slot. Default to month.
+            stats (tuple|optional): The statistics among mean, min, max, std and count.
+                                    Default to (mean, min, max, std).
+
+        Returns:
+            ee.ImageCollection: One image per slot with a climatology_key property (month, or slot)
+                                and <band>_<statistic> bands (std is named stdDev).
+    """
+    if not isinstance(col, ee.ImageCollection):
+        raise TypeError(
+            "Unsupported data type. Expected data is ee.ImageCollection")
+    reducer = climatology_reducer(stats)
+    key = climatology_key(period)
+    tagged = col.map(lambda img: img.set(key, period_slot(img.date(), period)))
+    groups = ee.Join.saveAll("images").apply(
+        **{"primary": tagged.distinct(key), "secondary": tagged,
+           "condition": ee.Filter.equals(**{"leftField": key, "rightField": key})})
+
+    def reduce_slot(img):
+        images = ee.ImageCollection.fromImages(img.get("images"))
+        return images.reduce(reducer).set(key, img.get(key))
+    return ee.ImageCollection(groups.map(reduce_slot)).sort(key)
+
+
+def monthly_climatology(col, stats=("mean", "min", "max", "std")):
+    """ Compute per-calendar-month statistics of a collection once, as up to 12 images.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            stats (tuple|optional): The statistics among mean, min, max, std and count.
+                                    Default to (mean, min, max, std).
+
+        Returns:
+            ee.ImageCollection: One image per calendar month with a "month" property and
+                                <band>_<statistic> bands (std is named stdDev).
+    """
+    return period_climatology(col, "month", stats)
+
+
+def climatology_band(clim_img, stat):
+    """ Select one statistic of a climatology image, renamed to the original band names."""
+    suffix = "_" + CLIMATOLOGY_STATS[stat]
+    return clim_img.select(".*" + suffix).regexpRename(suffix + "$", "")
+
+
+def join_climatology(col, clim, period="month"):
+    """ Attach to every image the climatology image of its period slot, e.g. its calendar month.
+
+        Args:
+            col (ee.ImageCollection): The input image collection.
+            clim (ee.ImageCollection): The output of period_climatology (or monthly_climatology).
+            period (str|tuple|optional): The period of the climatology. Default to month.
+
+        Returns:
+            ee.ImageCollection: The images (with the climatology_key property) having a
+                                "climatology" property.
+    """
+    key = climatology_key(period)
+    tagged = col.map(lambda img: img.set(key, period_slot(img.date(), period)))
+    joined = ee.Join.saveFirst("climatology").apply(
+        **{"primary": tagged, "secondary": clim,
+           "condition": ee.Filter.equals(**{"leftField": key, "rightField": key})})
+    return ee.ImageCollection(joined)
+
+
+def stack_climatology(clim):
+    """ Stack a climatology into a single image with m<MM>_<band> bands, e.g. to store it as an asset."""
+    def add_month(img, stacked):
+        img = ee.Image(img)
+        prefix = ee.Number(img.get("month")).int().format("m%02d_")
+        return ee.Image(stacked).addBands(img.regexpRename("^", prefix))
+    return ee.Image(clim.iterate(add_month, ee.Image().select([])))
+
+
+def unstack_climatology(img):
+    """ Rebuild the collection of monthly_climatology from the output of stack_climatology."""
+    img = ee.Image(img)
+    present = img.bandNames().map(lambda name: ee.Number.parse(ee.String(name).slice(1, 3)))
+    months = ee.List.sequence(1, 12).filter(ee.Filter.inList("item", present))
+
+    def month_image(month):
+        month = ee.Number(month).int()
+        prefix = ee.String("m").cat(month.format("%02d")).cat("_")
+        return img.select(prefix.cat(".*")).regexpRename(ee.String("^").cat(prefix), "").set(
+            {"month": month})
+    return ee.ImageCollection.fromImages(months.map(month_image))
+
+
+def climatology_fingerprint(col, stats=("mean", "min", "max", "std")):
+    """ Return a fingerprint of a climatology input: the hash of the collection expression and statistics."""
+    from .cache import expression_key
+    return expression_key(col)[:32] + "-" + "-".join(stats)
+
+
 ##############################################################################
 #                         Initialization and Authentication                  #
 ##############################################################################
@@ -248,6 +727,147 @@ def col_timestamp_band(col):
         return img.addBands(time_band_mask)
     return col.map(time_band)
 
+
+def array_interpolation(time_col, days):
+    """ Join-free linear interpolation of a collection returned by col_timestamp_band.
+
+        The whole series is stacked once per pixel with toArray (only observations valid in all
+        bands are kept), and the nearest rows at or before and at or after each date are sliced out
+        of it. A sentinel row far outside the window is added on each side so the slices are never
+        empty. No before/after image lists are attached to the images.
+
+        Args:
+            time_col (ee.ImageCollection): The output of col_timestamp_band.
+            days (int): The number of days to search before and after the missing values.
+
+        Returns:
+            ee.ImageCollection: The interpolated collection, as linear_interpolation returns.
+    """
+    time_col = time_col.sort("system:time_start")
+    names = ee.Image(time_col.first()).bandNames()
+    # The timestamp band is the last column of the array.
+    series = time_col.toArray()
+    times = series.arraySlice(1, -1)
+    window = time_search_limit(days)
+    sentinel = ee.Image(ee.Array(ee.List([ee.List.repeat(-1e18, names.size())])))
+    far_future = ee.Image(ee.Array(ee.List([ee.List.repeat(1e18, names.size())])))
+
+    def row_bands(rows):
+        return rows.arrayProject([1]).arrayFlatten([names])
+
+    def interpolate(image):
+        image = ee.Image(image)
+        t = ee.Number(image.get("system:time_start"))
+        before_rows = series.arrayMask(times.lte(t).And(times.gte(t.subtract(window))))
+        after_rows = series.arrayMask(times.gte(t).And(times.lte(t.add(window))))
+        before = row_bands(sentinel.arrayCat(before_rows, 0).arraySlice(0, -1))
+        after = row_bands(after_rows.arrayCat(far_future, 0).arraySlice(0, 0, 1))
+        t1 = before.select("timestamp")
+        t2 = after.select("timestamp")
+        in_window = t1.gte(t.subtract(window)).And(t2.lte(t.add(window)))
+        ratio = ee.Image.constant(t).subtract(t1).divide(t2.subtract(t1))
+        interpolated = before.add(after.subtract(before).multiply(ratio)).updateMask(in_window)
+        result = image.unmask(interpolated)
+        return result.copyProperties(image, ["system:time_start"])
+    return ee.ImageCollection(time_col.map(interpolate))
+
+##############################################################################
+#                               Grid Utilities                               #
+##############################################################################
+
+
+def grid_layout(min_x, max_x, min_y, max_y, ncols=None, nrows=None, cell_size=None):
+    """ Return the origin, cell size and number of cells of a regular grid covering a box.
+
+        With ncols/nrows the box is expanded outwards to whole units (floor of the minimum,
+        ceiling of the maximum), so the grid always covers it; with cell_size the grid is
+        aligned on multiples of it. server_grid computes the same layout on the server.
+
+        Args:
+            min_x, max_x, min_y, max_y (float): The bounding box.
+            ncols, nrows (int|optional): The number of columns and rows.
+            cell_size (float|optional): The cell size in projection units.
+
+        Returns:
+            tuple: (x0, y0, dx, dy, ncols, nrows)
+    """
+    import math
+    if cell_size is not None:
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive.")
+        x0 = math.floor(min_x / cell_size) * cell_size
+        y0 = math.floor(min_y / cell_size) * cell_size
+        ncols = max(1, math.ceil((max_x - x0) / cell_size))
+        nrows = max(1, math.ceil((max_y - y0) / cell_size))
+        return x0, y0, cell_size, cell_size, ncols, nrows
+    if not (isinstance(ncols, int) and isinstance(nrows, int) and ncols > 0 and nrows > 0):
+        raise ValueError("ncols and nrows must be positive integers.")
+    x0, y0 = math.floor(min_x), math.floor(min_y)
+    x1, y1 = max(math.ceil(max_x), x0 + 1), max(math.ceil(max_y), y0 + 1)
+    return x0, y0, (x1 - x0) / ncols, (y1 - y0) / nrows, ncols, nrows
+
+
+def grid_cells(x0, y0, dx, dy, ncols, nrows):
+    """ Return the cells of a grid with exact integer indexing (no accumulated float steps).
+
+        Returns:
+            list: (label, x1, y1, x2, y2) tuples, column by column, labels starting at 1.
+    """
+    cells = []
+    for i in range(ncols):
+        for j in range(nrows):
+            cells.append((i * nrows + j + 1, x0 + i * dx, y0 + j * dy,
+                          x0 + (i + 1) * dx, y0 + (j + 1) * dy))
+    return cells
+
+
+def server_bounds(feature_col, crs="EPSG:4326"):
+    """ Return the bounding box of a collection as server-side numbers (min_x, max_x, min_y, max_y)."""
+    coords = ee.List(ee.List(feature_col.geometry().bounds(1, crs).coordinates()).get(0))
+    xs = coords.map(lambda c: ee.List(c).get(0))
+    ys = coords.map(lambda c: ee.List(c).get(1))
+    return (ee.Number(xs.reduce(ee.Reducer.min())), ee.Number(xs.reduce(ee.Reducer.max())),
+            ee.Number(ys.reduce(ee.Reducer.min())), ee.Number(ys.reduce(ee.Reducer.max())))
+
+
+def server_layout(min_x, max_x, min_y, max_y, ncols=None, nrows=None, cell_size=None):
+    """ Server-side grid_layout of a box given as ee.Number.
+
+        Returns:
+            tuple: (x0, y0, dx, dy, ncols, nrows) as ee.Number.
+    """
+    if cell_size is not None:
+        x0 = min_x.divide(cell_size).floor().multiply(cell_size)
+        y0 = min_y.divide(cell_size).floor().multiply(cell_size)
+        ncols = max_x.subtract(x0).divide(cell_size).ceil().max(1)
+        nrows = max_y.subtract(y0).divide(cell_size).ceil().max(1)
+        return x0, y0, ee.Number(cell_size), ee.Number(cell_size), ncols, nrows
+    x0, y0 = min_x.floor(), min_y.floor()
+    dx = max_x.ceil().max(x0.add(1)).subtract(x0).divide(ncols)
+    dy = max_y.ceil().max(y0.add(1)).subtract(y0).divide(nrows)
+    return x0, y0, dx, dy, ee.Number(ncols), ee.Number(nrows)
+
+
+def server_grid(feature_col, ncols=None, nrows=None, cell_size=None, crs="EPSG:4326"):
+    """ Build the grid of grid_layout/grid_cells entirely on the server with ee.List.sequence.
+
+        The request only holds the grid parameters, whatever the number of cells.
+
+        Returns:
+            ee.FeatureCollection: The cells with a 1-based label property.
+    """
+    x0, y0, dx, dy, ncols, nrows = server_layout(*server_bounds(feature_col, crs), ncols, nrows, cell_size)
+
+    def cell(index):
+        index = ee.Number(index)
+        i = index.divide(nrows).floor()
+        j = index.mod(nrows)
+        x1, y1 = x0.add(i.multiply(dx)), y0.add(j.multiply(dy))
+        rect = ee.Geometry.Rectangle([x1, y1, x1.add(dx), y1.add(dy)], crs, False)
+        return ee.Feature(rect, {"label": index.add(1)})
+    return ee.FeatureCollection(ee.List.sequence(0, ncols.multiply(nrows).subtract(1)).map(cell))
+
+
 ##############################################################################
 #                             Ipyleaftlet GEE                                #
 ##############################################################################
@@ -311,7 +931,25 @@ def read_geojson(file_path):
             return None
 
 
-def ee_tile_layer(ee_object, vis_params={}, layer_name="Image", show=True, opacity=1):
+def ee_tile_layer(ee_object, vis_params={}, layer_name="Image", show=True, opacity=1, proxy=None):
+    """ Create a TileLayer of an Earth Engine object.
+
+        Map ids are cached on the expression and the visualization parameters, so re-adding a
+        layer doesn't request a new one.
+
+        Args:
+            ee_object (ee.Image|ee.ImageCollection|ee.Feature|ee.FeatureCollection|ee.Geometry): The object.
+            vis_params (dict|optional): The visualization parameters. Default to {}.
+            layer_name (str|optional): The layer name. Default to "Image".
+            show (bool|optional): The layer visibility. Default to True.
+            opacity (int|float|optional): The layer opacity. Default to 1.
+            proxy (tiles.TileProxy|optional): A running local tile proxy serving the tiles. Default to None.
+
+        Returns:
+            ipyleaflet.TileLayer: The tile layer.
+    """
+    from ipyleaflet import TileLayer
+    from .tiles import get_map_id
 
     if not isinstance(ee_object, (ee.Feature, ee.FeatureCollection, ee.Geometry,
                                   ee.Image, ee.ImageCollection)):
@@ -336,9 +974,12 @@ def ee_tile_layer(ee_object, vis_params={}, layer_name="Image", show=True, opaci
         img = ee_object
     if isinstance(ee_object, ee.ImageCollection):
         img = ee_object.mosaic()
-    img_dict = ee.Image(img).getMapId(vis_params)
+    img_dict = get_map_id(ee.Image(img), vis_params)
+    url = img_dict["tile_fetcher"].url_format
+    if proxy is not None:
+        url = proxy.add_layer(url)
     tile_layer = TileLayer(
-        url=img_dict["tile_fetcher"].url_format,
+        url=url,
         attribution="Google Earth Engine",
         name=layer_name,
         opacity=opacity,
@@ -408,26 +1049,223 @@ def kelvin_celsius(col):
     return out_data
 
 
-def data_format(input_data):
-    """ Format data returned by reduceRegions"""
-    if not is_package_install("pandas"):
-        print("pandas is not installed. Try to install it ....")
+def _object_array(values):
+    import numpy as np
+    arr = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        arr[i] = value
+    return arr
+
+
+def _typed_array(values):
+    """ Convert a column of property values to the narrowest NumPy array."""
+    import numpy as np
+    if not isinstance(values, np.ndarray):
+        values = _object_array(list(values))
+    first = next((value for value in values if value is not None), None)
+    if isinstance(first, (bool, int)) and not isinstance(first, float):
+        arr = np.array(values.tolist())
+        if arr.ndim == 1 and arr.dtype.kind in "biuf":
+            return arr
+    if isinstance(first, (bool, int, float)):
         try:
-            package_install("pandas")
-        except:
-            print("Failed to install pandas!")
-    if is_package_install("pandas"):
-        import pandas as pd
-        data = input_data["features"]
-        slist = []
-        for i in data:
-            thuoctinh = i["properties"]
-            slist.append(thuoctinh)
-        df = pd.DataFrame(slist)
-        return df
-    else:
-        raise ValueError(
-            "Please install pandas. Here is the link https://pandas.pydata.org/docs/getting_started/install.html")
+            # Missing numbers become NaN.
+            return values.astype("float64")
+        except (TypeError, ValueError):
+            pass
+    # Strings, bytes and nested values stay Python objects.
+    return values
+
+
+def _ring_centroid(ring):
+    area = cx = cy = 0.0
+    for (x1, y1), (x2, y2) in zip(ring[:-1], ring[1:]):
+        cross = x1 * y2 - x2 * y1
+        area += cross
+        cx += (x1 + x2) * cross
+        cy += (y1 + y2) * cross
+    return area / 2, cx, cy
+
+
+def geometry_centroid(geometry):
+    """ Return the (x, y) centroid of a GeoJSON geometry.
+
+        Polygons use the area-weighted centroid, other geometries the mean of their vertices.
+
+        Args:
+            geometry (dict): A GeoJSON-like geometry.
+
+        Returns:
+            tuple: (x, y), or (nan, nan) for an empty geometry.
+    """
+    if not geometry:
+        return float("nan"), float("nan")
+    kind, coords = geometry["type"], geometry.get("coordinates")
+    if kind == "GeometryCollection":
+        points = [geometry_centroid(geom) for geom in geometry["geometries"]]
+        coords, kind = points, "MultiPoint"
+    polygons = {"Polygon": [coords], "MultiPolygon": coords}.get(kind)
+    if polygons:
+        total = sx = sy = 0.0
+        for polygon in polygons:
+            for i, ring in enumerate(polygon):
+                area, cx, cy = _ring_centroid(ring)
+                # Count the shell positively and holes negatively whatever their winding.
+                if (area < 0) != (i > 0):
+                    area, cx, cy = -area, -cx, -cy
+                total += area
+                sx += cx
+                sy += cy
+        if total:
+            return sx / (6 * total), sy / (6 * total)
+    points = []
+
+    def walk(item):
+        if item and isinstance(item[0], (int, float)):
+            points.append(item)
+        else:
+            for sub in item:
+                walk(sub)
+    walk(coords or [])
+    if not points:
+        return float("nan"), float("nan")
+    return (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+
+
+WKB_TYPES = {"Point": 1, "LineString": 2, "Polygon": 3, "MultiPoint": 4,
+             "MultiLineString": 5, "MultiPolygon": 6, "GeometryCollection": 7}
+
+
+def geometry_to_wkb(geometry):
+    """ Encode a GeoJSON geometry as little-endian 2D WKB.
+
+        Args:
+            geometry (dict): A GeoJSON-like geometry.
+
+        Returns:
+            bytes|None: The WKB bytes, or None for a missing geometry.
+    """
+    import struct
+    if not geometry:
+        return None
+    kind = geometry["type"]
+    header = struct.pack("<BI", 1, WKB_TYPES[kind])
+
+    def points(coords):
+        return struct.pack("<I", len(coords)) + b"".join(struct.pack("<2d", *c[:2]) for c in coords)
+
+    def rings(coords):
+        return struct.pack("<I", len(coords)) + b"".join(points(ring) for ring in coords)
+
+    coords = geometry.get("coordinates")
+    if kind == "Point":
+        return header + struct.pack("<2d", *coords[:2])
+    if kind == "LineString":
+        return header + points(coords)
+    if kind == "Polygon":
+        return header + rings(coords)
+    if kind == "GeometryCollection":
+        parts = geometry["geometries"]
+        return header + struct.pack("<I", len(parts)) + b"".join(geometry_to_wkb(g) for g in parts)
+    part_type = kind[len("Multi"):]
+    return header + struct.pack("<I", len(coords)) + b"".join(
+        geometry_to_wkb({"type": part_type, "coordinates": c}) for c in coords)
+
+
+def data_format(input_data, geometry=None, output="pandas"):
+    """ Format data returned by reduceRegions (or any GeoJSON-like FeatureCollection).
+
+        The properties are decoded column by column into typed NumPy arrays: integer,
+        float (missing values become NaN), boolean or object columns.
+
+        Args:
+            input_data (dict): The getInfo result of a FeatureCollection.
+            geometry (str|optional): Add the geometry as a "geometry" WKB column ("wkb") or as
+                                     "x"/"y" centroid columns ("centroid"). Default to None.
+            output (str|optional): The output type: "pandas", "numpy" (a dict of arrays),
+                                   "arrow" (pyarrow.Table) or "polars". Default to pandas.
+
+        Returns:
+            pandas.DataFrame|dict|pyarrow.Table|polars.DataFrame: The formatted table.
+    """
+    if geometry not in (None, "wkb", "centroid"):
+        raise ValueError("Unsupported geometry. Please choose None, wkb or centroid")
+    if output not in ("pandas", "numpy", "arrow", "polars"):
+        raise ValueError("Unsupported output. Please choose pandas, numpy, arrow or polars")
+    package = {"pandas": "pandas", "numpy": "numpy", "arrow": "pyarrow", "polars": "polars"}[output]
+    for pkg_name in {"numpy", package}:
+        if not is_package_install(pkg_name):
+            raise ValueError(
+                "Please install {}, e.g. pip install {}".format(pkg_name, pkg_name))
+    import numpy as np
+    features = input_data["features"]
+    props = [feat.get("properties") or {} for feat in features]
+    keys = list(props[0]) if props else []
+    try:
+        # reduceRegions features share the same properties: transpose them at C speed.
+        if set(map(len, props)) - {len(keys)}:
+            raise KeyError
+        table = np.empty((len(props), len(keys)), dtype=object)
+        if keys:
+            getter = operator.itemgetter(*keys)
+            table[:] = list(map(getter, props)) if len(keys) > 1 else [(getter(p),) for p in props]
+        columns = {key: _typed_array(table[:, j]) for j, key in enumerate(keys)}
+    except (KeyError, ValueError):
+        # Ordered union of the property names, as pandas does for a list of dicts.
+        keys = list(dict.fromkeys(key for prop in props for key in prop))
+        columns = {key: _typed_array([prop.get(key) for prop in props]) for key in keys}
+    if geometry == "wkb":
+        columns["geometry"] = _typed_array([geometry_to_wkb(feat.get("geometry")) for feat in features])
+    elif geometry == "centroid":
+        xy = np.array([geometry_centroid(feat.get("geometry")) for feat in features],
+                      dtype="float64").reshape(-1, 2)
+        columns["x"], columns["y"] = xy[:, 0], xy[:, 1]
+    if output == "numpy":
+        return columns
+    if output == "arrow":
+        import pyarrow as pa
+        return pa.table({key: pa.array(list(arr) if arr.dtype == object else arr)
+                         for key, arr in columns.items()})
+    if output == "polars":
+        import polars as pl
+        return pl.DataFrame({key: list(arr) if arr.dtype == object else arr
+                             for key, arr in columns.items()})
+    import pandas as pd
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(features)))
+
+
+def long_format(df, id_columns=("feature_id", "date"), value_name="value"):
+    """ Reshape a wide table of band columns into a tidy long table.
+
+        Args:
+            df (pandas.DataFrame): The wide table, e.g. from data_format.
+            id_columns (tuple|optional): The identifier columns. A "date" column holding
+                                         system:time_start milliseconds is converted to datetime.
+                                         Default to (feature_id, date).
+            value_name (str|optional): The name of the value column. Default to value.
+
+        Returns:
+            pandas.DataFrame: A table with the id columns, a band column and a value column,
+                              sorted by the id columns (numerically when every feature_id is a number).
+    """
+    import pandas as pd
+    id_columns = list(id_columns)
+    long_df = df.melt(id_vars=id_columns, var_name="band", value_name=value_name)
+    if "feature_id" in long_df:
+        long_df["feature_id"] = long_df["feature_id"].astype(str)
+    if "date" in long_df:
+        long_df["date"] = pd.to_datetime(long_df["date"], unit="ms")
+    long_df["band"] = long_df["band"].astype("category")
+    long_df[value_name] = pd.to_numeric(long_df[value_name], errors="coerce").astype("float64")
+
+    def sort_key(column):
+        # Numeric ids are ordered as numbers, so that "10" comes after "2".
+        if column.name == "feature_id":
+            numeric = pd.to_numeric(column, errors="coerce")
+            if numeric.notna().all():
+                return numeric
+        return column
+    return long_df.sort_values(id_columns + ["band"], kind="stable", key=sort_key).reset_index(drop=True)
 
 
 def arange(start, stop, step=1):
@@ -0,0 +1,303 @@
+""" Streaming, memory-bounded readers of shapefiles and GeoJSON files.
+
+The readers yield one GeoJSON feature at a time, optionally simplified and quantized, so that
+files with millions of vertices never have to fit in memory. batch_features groups them into
+chunks bounded by their serialized size, and feature_collections turns the chunks into
+ee.FeatureCollection payloads small enough for a request:
+
+    for fc in feature_collections(read_features("parcels.shp", tolerance=1e-5, precision=6)):
+        values = value_from_image(img, fc)
+"""
+import json
+import os
+
+# Earth Engine rejects requests above 10 MB: leave room for the rest of the expression.
+DEFAULT_MAX_BYTES = 4 * 2 ** 20
+
+CHUNK_SIZE = 2 ** 16
+
+GEOJSON_SEQUENCES = (".geojsonl", ".geojsons", ".ndjson", ".jsonl")
+
+
+##############################################################################
+#                          Geometry simplification                           #
+##############################################################################
+
+
+def _segment_distance2(point, start, end):
+    (x, y), (x1, y1), (x2, y2) = point[:2], start[:2], end[:2]
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return (x - x1) ** 2 + (y - y1) ** 2
+    t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+    return (x - x1 - t * dx) ** 2 + (y - y1 - t * dy) ** 2
+
+
+def simplify_line(coords, tolerance):
+    """ Douglas-Peucker simplification of a list of positions, keeping both ends.
+
+        Args:
+            coords (list): The positions.
+            tolerance (float): The maximum distance between the line and its simplification.
+
+        Returns:
+            list: The kept positions.
+    """
+    if len(coords) < 3 or not tolerance:
+        return list(coords)
+    keep = [False] * len(coords)
+    keep[0] = keep[-1] = True
+    tolerance2 = tolerance * tolerance
+    # An explicit stack: long lines would exceed the recursion limit.
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, distance = None, tolerance2
+        for i in range(first + 1, last):
+            d = _segment_distance2(coords[i], coords[first], coords[last])
+            if d > distance:
+                farthest, distance = i, d
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(coords, keep) if kept]
+
+
+def simplify_ring(ring, tolerance):
+    """ Simplify a closed ring, keeping at least 4 positions (a triangle)."""
+    simplified = simplify_line(ring, tolerance)
+    if len(simplified) >= 4:
+        return simplified
+    # Keep the 2 vertices farthest from the first one so the ring stays a valid triangle.
+    others = sorted(range(1, len(ring) - 1), key=lambda i: -_segment_distance2(ring[i], ring[0], ring[0]))
+    return [ring[0]] + [ring[i] for i in sorted(others[:2])] + [ring[-1]]
+
+
+def quantize_positions(coords, precision):
+    """ Round positions to a number of decimals and drop the consecutive duplicates."""
+    out = []
+    for point in coords:
+        point = [round(value, precision) for value in point]
+        if not out or point != out[-1]:
+            out.append(point)
+    return out
+
+
+def transform_geometry(geometry, tolerance=None, precision=None):
+    """ Return a simplified and/or quantized copy of a GeoJSON geometry.
+
+        Args:
+            geometry (dict): A GeoJSON-like geometry.
+            tolerance (float|optional): The Douglas-Peucker tolerance in coordinate units. Default to None.
+            precision (int|optional): The number of decimals kept. Default to None.
+
+        Returns:
+            dict: The transformed geometry (the input itself when there is nothing to do).
+    """
+    if not geometry or (tolerance is None and precision is None):
+        return geometry
+    kind = geometry["type"]
+    if kind == "GeometryCollection":
+        return {"type": kind, "geometries": [transform_geometry(g, tolerance, precision)
+                                             for g in geometry["geometries"]]}
+
+    def line(coords, ring=False):
+        if tolerance is not None:
+            coords = simplify_ring(coords, tolerance) if ring and len(coords) > 4 else simplify_line(
+                coords, tolerance)
+        if precision is not None:
+            quantized = quantize_positions(coords, precision)
+            # A ring collapsed by the rounding is kept unquantized rather than made invalid.
+            coords = quantized if not ring or len(quantized) >= 4 else [list(p) for p in coords]
+        return coords
+
+    coords = geometry["coordinates"]
+    if kind == "Point":
+        coords = quantize_positions([coords], precision)[0] if precision is not None else coords
+    elif kind == "MultiPoint":
+        coords = quantize_positions(coords, precision) if precision is not None else coords
+    elif kind == "LineString":
+        coords = line(coords)
+    elif kind == "MultiLineString":
+        coords = [line(part) for part in coords]
+    elif kind == "Polygon":
+        coords = [line(ring, True) for ring in coords]
+    elif kind == "MultiPolygon":
+        coords = [[line(ring, True) for ring in polygon] for polygon in coords]
+    else:
+        raise ValueError("Unsupported geometry type: {}".format(kind))
+    return {"type": kind, "coordinates": coords}
+
+
+##############################################################################
+#                              Streaming readers                             #
+##############################################################################
+
+
+def _feature(feature, tolerance, precision, properties):
+    if properties is not None:
+        feature["properties"] = {name: (feature.get("properties") or {}).get(name) for name in properties}
+    feature["geometry"] = transform_geometry(feature.get("geometry"), tolerance, precision)
+    return feature
+
+
+def iter_shapefile(file_path, tolerance=None, precision=None, properties=None):
+    """ Yield the records of a shapefile one at a time as GeoJSON features.
+
+        Args:
+            file_path (str): The shapefile path.
+            tolerance (float|optional): The simplification tolerance in coordinate units. Default to None.
+            precision (int|optional): The number of decimals kept. Default to None.
+            properties (list|optional): The attributes kept. Default to None (all).
+
+        Yields:
+            dict: A GeoJSON feature.
+    """
+    import shapefile
+    if not os.path.exists(file_path):
+        raise FileNotFoundError("The file doesn't exist.")
+    with shapefile.Reader(file_path) as reader:
+        for record in reader.iterShapeRecords():
+            feature = record.__geo_interface__
+            yield _feature({"type": "Feature", "geometry": feature["geometry"],
+                            "properties": feature["properties"]}, tolerance, precision, properties)
+
+
+def _skip_whitespace(buffer, position):
+    while position < len(buffer) and buffer[position] in " \t\r\n":
+        position += 1
+    return position
+
+
+def iter_geojson(file_path, tolerance=None, precision=None, properties=None, chunk_size=CHUNK_SIZE):
+    """ Yield the features of a GeoJSON FeatureCollection (or a GeoJSON text sequence, one feature
+        per line) without loading the whole file.
+
+        The file is read in chunks and each feature is decoded as soon as it is complete, so the
+        memory used is bounded by the largest feature. The features array is found by its
+        "features" key, which must not appear in the members before it.
+
+        Args:
+            file_path (str): The GeoJSON path.
+            tolerance (float|optional): The simplification tolerance in coordinate units. Default to None.
+            precision (int|optional): The number of decimals kept. Default to None.
+            properties (list|optional): The properties kept. Default to None (all).
+            chunk_size (int|optional): The number of characters read at once. Default to 64 KiB.
+
+        Yields:
+            dict: A GeoJSON feature.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError("The file path doesn't exist.")
+    if file_path.endswith(GEOJSON_SEQUENCES):
+        with open(file_path) as file:
+            for line in file:
+                line = line.strip().lstrip("\x1e")
+                if line:
+                    yield _feature(json.loads(line), tolerance, precision, properties)
+        return
+    decoder = json.JSONDecoder()
+    with open(file_path) as file:
+        buffer = ""
+        # Find the opening bracket of the features array.
+        while True:
+            index = buffer.find('"features"')
+            start = buffer.find("[", index) if index >= 0 else -1
+            if start >= 0:
+                buffer, position = buffer[start + 1:], 0
+                break
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise ValueError("The file does not contain a GeoJSON FeatureCollection.")
+            buffer += chunk
+        read_size = chunk_size
+        while True:
+            position = _skip_whitespace(buffer, position)
+            if buffer.startswith(",", position):
+                position = _skip_whitespace(buffer, position + 1)
+            if buffer.startswith("]", position):
+                return
+            feature = None
+            if position < len(buffer):
+                try:
+                    feature, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    pass
+            if feature is None:
+                # An incomplete feature: read more, doubling the read size for very large features.
+                chunk = file.read(read_size)
+                if not chunk:
+                    raise ValueError("Invalid or truncated GeoJSON file.")
+                buffer, position = buffer[position:] + chunk, 0
+                read_size *= 2
+                continue
+            read_size = chunk_size
+            yield _feature(feature, tolerance, precision, properties)
+            position = end
+            if position > chunk_size:
+                buffer, position = buffer[position:], 0
+
+
+def read_features(file_path, tolerance=None, precision=None, properties=None):
+    """ Yield the features of a shapefile (.shp) or a GeoJSON file one at a time.
+
+        See iter_shapefile and iter_geojson.
+    """
+    if not isinstance(file_path, str):
+        raise TypeError("Unsupported data type! Please provide a file path.")
+    if file_path.endswith(".shp"):
+        return iter_shapefile(file_path, tolerance, precision, properties)
+    return iter_geojson(file_path, tolerance, precision, properties)
+
+
+##############################################################################
+#                            Size-bounded batches                            #
+##############################################################################
+
+
+def feature_size(feature):
+    """ Return the number of bytes of a feature in a compact JSON request."""
+    return len(json.dumps(feature, separators=(",", ":")))
+
+
+def batch_features(features, max_bytes=DEFAULT_MAX_BYTES, max_features=None):
+    """ Group features into lists whose compact JSON size stays below max_bytes.
+
+        Args:
+            features (iterable): GeoJSON features, e.g. from read_features.
+            max_bytes (int|optional): The maximum size of a batch. Default to 4 MiB.
+            max_features (int|optional): The maximum number of features of a batch. Default to None.
+
+        Yields:
+            list: The features of a batch.
+    """
+    batch, size = [], 0
+    for feature in features:
+        feature_bytes = feature_size(feature) + 1
+        if feature_bytes > max_bytes:
+            raise ValueError("A feature of {} bytes exceeds max_bytes, simplify it with a tolerance."
+                             .format(feature_bytes))
+        if batch and (size + feature_bytes > max_bytes or len(batch) == max_features):
+            yield batch
+            batch, size = [], 0
+        batch.append(feature)
+        size += feature_bytes
+    if batch:
+        yield batch
+
+
+def feature_collections(features, max_bytes=DEFAULT_MAX_BYTES, max_features=None):
+    """ Yield ee.FeatureCollection payloads of size-bounded batches of features.
+
+        Args:
+            features (iterable): GeoJSON features, e.g. from read_features.
+            max_bytes (int|optional): The maximum size of a batch. Default to 4 MiB.
+            max_features (int|optional): The maximum number of features of a batch. Default to None.
+
+        Yields:
+            ee.FeatureCollection: A client-side collection of one batch.
+    """
+    import ee
+    for batch in batch_features(features, max_bytes, max_features):
+        yield ee.FeatureCollection({"type": "FeatureCollection", "features": batch})
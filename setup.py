@@ -24,6 +24,16 @@ setup_requirements = ['pytest-runner', ]
 
 test_requirements = ['pytest>=3', ]
 
+# Optional dependencies: interactive maps, shapefiles, the local NumPy/xarray backend and the
+# tile downloader (rasterio only for GeoTIFF tiles and COG outputs).
+extras_requirements = {
+    'map': ['ipyleaflet'],
+    'shapefile': ['pyshp'],
+    'local': ['numpy', 'pandas', 'xarray'],
+    'download': ['numpy', 'requests', 'rasterio'],
+}
+extras_requirements['all'] = sorted({pkg for pkgs in extras_requirements.values() for pkg in pkgs})
+
 setup(
     author="Tuyen Ha",
     author_email='tuyenmassey@gmail.com',
@@ -41,6 +51,7 @@ setup(
     ],
     description="A Simple Python package to pre-processing satellite data using Google Earth Engine.",
     install_requires=install_requires,
+    extras_require=extras_requirements,
     dependency_links=dependency_links,
     license="MIT license",
     long_description=readme,
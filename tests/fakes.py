@@ -0,0 +1,659 @@
+"""Fake Earth Engine backends shared by the tests."""
+
+
+class FakeTransport:
+    """ A getInfo transport that answers from a function and counts round trips."""
+
+    def __init__(self, answer=None):
+        self.answer = answer or (lambda expression: {"expression": expression})
+        self.calls = []
+
+    def __call__(self, expression):
+        self.calls.append(expression)
+        return self.answer(expression)
+
+    @property
+    def round_trips(self):
+        return len(self.calls)
+
+
+class FlakyPages:
+    """ A reduceRegions stand-in serving pages of fake features.
+
+        Every page listed in failures raises that many times before succeeding.
+    """
+
+    def __init__(self, failures=None, delay=0.0):
+        import threading
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, offset, size):
+        import time
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            with self._lock:
+                if self.failures.get(offset, 0) > 0:
+                    self.failures[offset] -= 1
+                    raise RuntimeError("Computation timed out.")
+            return {"features": [{"properties": {"id": i, "NDVI": i / 10}}
+                                 for i in range(offset, offset + size)]}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class FakeTaskBackend:
+    """ A simulated ee.batch backend.
+
+        Each task runs for `duration` polls and then completes, unless its key is in
+        failures, in which case that many attempts fail first.
+    """
+
+    def __init__(self, duration=2, failures=None):
+        self.duration = duration
+        self.failures = dict(failures or {})
+        self.started = []
+        self.max_active = 0
+
+    def active(self):
+        return sum(task.state in ("READY", "RUNNING") for task in self.started)
+
+    def factory(self, key):
+        return lambda: FakeTask(self, key)
+
+
+class FakeTask:
+    def __init__(self, backend, key):
+        self.backend = backend
+        self.key = key
+        self.id = None
+        self.name = None
+        self.state = "UNSUBMITTED"
+        self.polls = 0
+
+    def start(self):
+        self.backend.started.append(self)
+        self.id = "task_{}".format(len(self.backend.started))
+        self.name = "projects/earthengine-legacy/operations/" + self.id
+        self.state = "READY"
+        self.backend.max_active = max(self.backend.max_active, self.backend.active())
+
+    def status(self):
+        self.polls += 1
+        if self.state in ("READY", "RUNNING"):
+            self.state = "RUNNING"
+            if self.polls >= self.backend.duration:
+                if self.backend.failures.get(self.key, 0) > 0:
+                    self.backend.failures[self.key] -= 1
+                    self.state = "FAILED"
+                else:
+                    self.state = "COMPLETED"
+        status = {"state": self.state, "id": self.id}
+        if self.state == "FAILED":
+            status["error_message"] = "Image.clip: Too many pixels."
+        return status
+
+
+class StubTileServer:
+    """ A local XYZ tile server answering /{z}/{x}/{y} with fake tiles and counting requests."""
+
+    def __init__(self):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(self.path)
+                content = "tile{}".format(self.path).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url_format(self):
+        return "http://127.0.0.1:{}/{{z}}/{{x}}/{{y}}".format(self._server.server_address[1])
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def synthetic_tile(bands, transform, cols, rows):
+    """ The NPY bytes of a tile: band i is i * 10000 + 100 * floor(x) + floor(y) at the pixel centres."""
+    import io
+    import numpy as np
+    res_x, _, x0, _, res_y, y0 = transform
+    xs = np.floor(x0 + (np.arange(cols) + 0.5) * res_x)
+    ys = np.floor(y0 + (np.arange(rows) + 0.5) * res_y)
+    data = np.zeros((rows, cols), dtype=[(band, "<f4") for band in bands])
+    for i, band in enumerate(bands):
+        data[band] = i * 10000 + 100 * xs[np.newaxis, :] + ys[:, np.newaxis]
+    buffer = io.BytesIO()
+    np.save(buffer, data)
+    return buffer.getvalue()
+
+
+class StubPixelServer:
+    """ A local stand-in of the getDownloadURL download host serving synthetic NPY tiles.
+
+        statuses is a list of HTTP error codes answered to the first requests, and the tiles whose
+        top left corner is in blocked answer 404 until they are removed from it.
+    """
+
+    def __init__(self, statuses=None, blocked=()):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
+        self.requests = []
+        self.statuses = list(statuses or [])
+        self.blocked = set(blocked)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                params = json.loads(parse_qs(urlparse(self.path).query)["params"][0])
+                transform = params["crs_transform"]
+                with stub._lock:
+                    stub.requests.append((transform[2], transform[5]))
+                    status = stub.statuses.pop(0) if stub.statuses else 200
+                if (transform[2], transform[5]) in stub.blocked:
+                    status = 404
+                if status == 200:
+                    cols, rows = (int(n) for n in params["dimensions"].split("x"))
+                    content = synthetic_tile(params["bands"], transform, cols, rows)
+                else:
+                    content = b"error"
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/download".format(self._server.server_address[1])
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeNumber:
+    """ A client-side stand-in of ee.Number supporting the arithmetic used by pymapee."""
+
+    def __init__(self, value):
+        self.value = value.value if isinstance(value, FakeNumber) else value
+
+    def _op(self, other, func):
+        return FakeNumber(func(self.value, FakeNumber(other).value))
+
+    def add(self, other):
+        return self._op(other, lambda a, b: a + b)
+
+    def subtract(self, other):
+        return self._op(other, lambda a, b: a - b)
+
+    def multiply(self, other):
+        return self._op(other, lambda a, b: a * b)
+
+    def divide(self, other):
+        return self._op(other, lambda a, b: a / b)
+
+    def mod(self, other):
+        return self._op(other, lambda a, b: a % b)
+
+    def min(self, other):
+        return self._op(other, min)
+
+    def max(self, other):
+        return self._op(other, max)
+
+    def floor(self):
+        import math
+        return FakeNumber(math.floor(self.value))
+
+    def ceil(self):
+        import math
+        return FakeNumber(math.ceil(self.value))
+
+    def int(self):
+        return FakeNumber(int(self.value))
+
+
+class FakeDate:
+    """ A client-side stand-in of ee.Date (UTC, Monday-first weeks like Joda)."""
+
+    def __init__(self, value):
+        import datetime
+        if isinstance(value, FakeDate):
+            value = value.value
+        elif isinstance(value, (int, float)):
+            value = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=value)
+        self.value = value
+
+    @staticmethod
+    def fromYMD(year, month, day):
+        import datetime
+        return FakeDate(datetime.datetime(int(FakeNumber(year).value), int(FakeNumber(month).value),
+                                          int(FakeNumber(day).value)))
+
+    def get(self, unit):
+        if unit == "week":
+            # Joda weekOfWeekyear, i.e. the ISO week.
+            return FakeNumber(self.value.isocalendar()[1])
+        return FakeNumber(getattr(self.value, unit))
+
+    def getRelative(self, unit, in_unit):
+        if (unit, in_unit) == ("day", "week"):
+            return FakeNumber(self.value.weekday())
+        if (unit, in_unit) == ("day", "year"):
+            return FakeNumber(self.value.timetuple().tm_yday - 1)
+        if (unit, in_unit) == ("month", "year"):
+            return FakeNumber(self.value.month - 1)
+        raise NotImplementedError((unit, in_unit))
+
+    def advance(self, delta, unit):
+        import calendar
+        import datetime
+        delta = FakeNumber(delta).value
+        if unit in ("day", "week"):
+            return FakeDate(self.value + datetime.timedelta(days=delta * (7 if unit == "week" else 1)))
+        months = int(delta) * (12 if unit == "year" else 1)
+        month = self.value.month - 1 + months
+        year, month = self.value.year + month // 12, month % 12 + 1
+        # Like Joda, clamp the day to the end of the target month.
+        day = min(self.value.day, calendar.monthrange(year, month)[1])
+        return FakeDate(self.value.replace(year=year, month=month, day=day))
+
+    def millis(self):
+        import datetime
+        return FakeNumber(int((self.value - datetime.datetime(1970, 1, 1)).total_seconds() * 1000))
+
+    def difference(self, start, unit):
+        import calendar
+        start = FakeDate(start).value
+        if unit in ("day", "week"):
+            return FakeNumber((self.value - start).total_seconds() / 86400 / (7 if unit == "week" else 1))
+        # Whole months plus the fraction of the last one, in months or years.
+        months = (self.value.year - start.year) * 12 + self.value.month - start.month
+        months += (self.value.day - start.day) / calendar.monthrange(self.value.year, self.value.month)[1]
+        return FakeNumber(months / 12 if unit == "year" else months)
+
+
+def _value(obj):
+    return obj.value if isinstance(obj, FakeNumber) else obj
+
+
+class FakeList(list):
+    """ A client-side stand-in of ee.List."""
+
+    @staticmethod
+    def sequence(start, end, step=1):
+        start, end, step = (_value(v) for v in (start, end, step))
+        return FakeList(FakeNumber(start + i * step) for i in range(int((end - start) // step) + 1))
+
+    def get(self, index):
+        return self[int(_value(index))]
+
+    def map(self, func):
+        return FakeList(func(item) for item in self)
+
+    def flatten(self):
+        return FakeList(value for item in self
+                        for value in (item.flatten() if isinstance(item, FakeList) else [item]))
+
+    def slice(self, start, end=None):
+        return FakeList(self[int(_value(start)):None if end is None else int(_value(end))])
+
+    def filter(self, predicate):
+        return FakeList(item for item in self if predicate(item))
+
+
+class FakeFilter:
+    """ A client-side stand-in of the ee.Filter comparisons of list items."""
+
+    @staticmethod
+    def gte(name, value):
+        return lambda item: _value(item) >= _value(value)
+
+    @staticmethod
+    def lt(name, value):
+        return lambda item: _value(item) < _value(value)
+
+    @staticmethod
+    def And(*filters):
+        return lambda item: all(predicate(item) for predicate in filters)
+
+
+class FakeFeature(dict):
+    """ A client-side stand-in of ee.Feature holding its properties."""
+
+    def set(self, name, value):
+        return FakeFeature(self, **{name: value})
+
+
+class FakeFeatureCollection:
+    """ A client-side stand-in of ee.FeatureCollection holding property dicts."""
+
+    def __init__(self, features):
+        if isinstance(features, FakeFeatureCollection):
+            features = features.features
+        self.features = [FakeFeature(feat) for feat in features]
+
+    def size(self):
+        return len(self.features)
+
+    def toList(self, count, offset=0):
+        return self.features[offset:offset + count]
+
+    def map(self, func):
+        return FakeFeatureCollection([func(feat) for feat in self.features])
+
+    def select(self, properties, retainGeometry=True):
+        return FakeFeatureCollection([{name: feat[name] for name in properties} for feat in self.features])
+
+    def getInfo(self):
+        return {"type": "FeatureCollection",
+                "features": [{"type": "Feature", "properties": dict(feat)} for feat in self.features]}
+
+
+class FakeReducer:
+    """ A client-side stand-in of ee.Reducer; every output of a band is the band value."""
+
+    def __init__(self, outputs=("mean",), names=None):
+        self.outputs = list(outputs)
+        self.names = names
+
+    def getOutputs(self):
+        return self.outputs
+
+    def forEach(self, names):
+        return FakeReducer(self.outputs, list(names))
+
+
+class FakeImage:
+    """ A client-side stand-in of ee.Image whose bands are functions of a feature."""
+
+    def __new__(cls, bands=None, properties=None):
+        # Like ee.Image(img), casting an image returns it.
+        if isinstance(bands, FakeImage):
+            return bands
+        return super().__new__(cls)
+
+    def __init__(self, bands, properties=None):
+        if bands is self:
+            return
+        self.bands = bands
+        self.properties = properties or {}
+
+    def bandNames(self):
+        return list(self.bands)
+
+    def get(self, name):
+        return self.properties[name]
+
+    def set(self, name, value):
+        return FakeImage(self.bands, dict(self.properties, **{name: value}))
+
+    def clip(self, geometry):
+        return self
+
+    def multiply(self, factor):
+        return FakeImage({name: (lambda feat, band=band: band(feat) * factor)
+                          for name, band in self.bands.items()}, self.properties)
+
+    def propertyNames(self):
+        return list(self.properties)
+
+    def copyProperties(self, source, properties=None):
+        copied = {name: source.properties[name] for name in (properties or source.properties)}
+        return FakeImage(self.bands, dict(self.properties, **copied))
+
+    def reduceRegions(self, collection, reducer, scale):
+        # Property naming follows Earth Engine: single-band images get the reducer output names,
+        # multi-band images the band names, and forEach reducers the given names.
+        reducer = reducer if isinstance(reducer, FakeReducer) else FakeReducer()
+        values = []
+        for feat in collection.features:
+            props = dict(feat)
+            for name, band in zip(reducer.names or self.bands, self.bands.values()):
+                for output in reducer.outputs:
+                    if reducer.names is None and len(self.bands) == 1:
+                        key = output
+                    elif len(reducer.outputs) == 1:
+                        key = name
+                    else:
+                        key = "{}_{}".format(name, output)
+                    props[key] = band(feat)
+            values.append(props)
+        return FakeFeatureCollection(values)
+
+
+class FakePixelImage(FakeImage):
+    """ A FakeImage whose getDownloadURL points to a StubPixelServer."""
+
+    def __init__(self, bands, server=None):
+        super().__init__({band: None for band in bands})
+        self.server = server
+        self.url_requests = 0
+
+    def getDownloadURL(self, params):
+        import json
+        from urllib.parse import urlencode
+        self.url_requests += 1
+        return "{}?{}".format(self.server.url, urlencode({"params": json.dumps(params)}))
+
+
+class FakeImageCollection:
+    """ A client-side stand-in of ee.ImageCollection (also holding mapped feature collections)."""
+
+    def __init__(self, items, calls=()):
+        self.items = list(items.items if isinstance(items, FakeImageCollection) else items)
+        # The collection methods called so far, e.g. ["filterDate", "map"].
+        self.calls = list(calls)
+
+    def size(self):
+        return len(self.items)
+
+    def first(self):
+        return self.items[0]
+
+    def toList(self, count, offset=0):
+        return self.items[offset:offset + count]
+
+    def map(self, func):
+        return FakeImageCollection([func(item) for item in self.items], self.calls + ["map"])
+
+    def filterDate(self, start, end=None):
+        items = [img for img in self.items
+                 if start <= img.get("system:time_start") and (end is None or img.get("system:time_start") < end)]
+        return FakeImageCollection(items, self.calls + ["filterDate"])
+
+    def filterBounds(self, geometry):
+        items = [img for img in self.items if img.get("region") == geometry]
+        return FakeImageCollection(items, self.calls + ["filterBounds"])
+
+    def flatten(self):
+        return FakeFeatureCollection([feat for item in self.items for feat in item.features])
+
+
+class FakeEE:
+    """ The subset of the ee module needed to evaluate pymapee expressions on the client."""
+    Date = FakeDate
+    Number = FakeNumber
+    Image = FakeImage
+    ImageCollection = FakeImageCollection
+    FeatureCollection = FakeFeatureCollection
+    List = FakeList
+    Filter = FakeFilter
+
+
+class FakeServer:
+    """ Evaluates fake Earth Engine objects, counting requests and failing on demand.
+
+        errors is a list of exceptions raised by the first requests (None lets a request pass),
+        and every request takes `latency` seconds. With hold, a request waits (up to 5 seconds)
+        until hold requests are running at once before answering.
+    """
+
+    def __init__(self, errors=None, latency=0.0, hold=None):
+        import threading
+        self.errors = list(errors or [])
+        self.latency = latency
+        self.hold = hold
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self.started = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def __call__(self, ee_object):
+        import time
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.started.append(time.monotonic())
+            error = self.errors.pop(0) if self.errors else None
+            self._changed.notify_all()
+            if self.hold:
+                self._changed.wait_for(lambda: self.max_active >= self.hold, timeout=5)
+        try:
+            time.sleep(self.latency)
+            if error is not None:
+                raise error
+            return ee_object.getInfo() if hasattr(ee_object, "getInfo") else ee_object
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class FakeEEException(Exception):
+    pass
+
+
+class FakeAssetStore:
+    """ An Earth Engine asset store stand-in: ee.Image(assetId), ee.data.getInfo,
+        ee.data.deleteAsset and exports.
+
+        Use it as the ee module: store.Image, store.EEException, store.data.getInfo and store.data.deleteAsset.
+    """
+    EEException = FakeEEException
+
+    def __init__(self, failing=()):
+        self.assets = {}
+        self.deleted = []
+        self.exports = []
+        self.failing = set(failing)
+        self.data = self
+
+    def Image(self, asset_id):
+        return FakeAsset(self, asset_id)
+
+    def getInfo(self, asset_id):
+        return {"id": asset_id, "type": "IMAGE"} if asset_id in self.assets else None
+
+    def deleteAsset(self, asset_id):
+        if asset_id not in self.assets:
+            raise FakeEEException("Asset not found.")
+        del self.assets[asset_id]
+        self.deleted.append(asset_id)
+
+    def export(self, img, region, asset_id, *args):
+        store = self
+
+        class Task:
+            id = name = None
+
+            def start(self):
+                if asset_id in store.assets:
+                    raise FakeEEException("Cannot overwrite asset '{}'.".format(asset_id))
+                store.exports.append(asset_id)
+                self.id = self.name = "export_{}".format(len(store.exports))
+                if asset_id not in store.failing:
+                    store.assets[asset_id] = dict(img.properties)
+
+            def status(self):
+                if asset_id in store.failing:
+                    return {"state": "FAILED", "error_message": "Export too large."}
+                return {"state": "COMPLETED"}
+        return Task()
+
+
+class FakeAsset:
+    def __init__(self, store, asset_id):
+        self.store = store
+        self.asset_id = asset_id
+
+    def get(self, name):
+        asset = self
+
+        class Value:
+            def getInfo(self):
+                if asset.asset_id not in asset.store.assets:
+                    raise FakeEEException("Image asset '{}' not found.".format(asset.asset_id))
+                return asset.store.assets[asset.asset_id].get(name)
+        return Value()
+
+
+class QuotaBackend:
+    """ A server stand-in allowing max_concurrent requests at once and rejecting the others
+        with an Earth Engine quota error (or always failing with `error` when given).
+    """
+
+    def __init__(self, max_concurrent=4, latency=0.01, error=None):
+        import threading
+        self.max_concurrent = max_concurrent
+        self.latency = latency
+        self.error = error
+        self.requests = 0
+        self.rejected = 0
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, value):
+        import time
+        with self._lock:
+            self.requests += 1
+            if self.error is not None:
+                raise self.error
+            if self.active >= self.max_concurrent:
+                self.rejected += 1
+                raise RuntimeError("Too many concurrent aggregations.")
+            self.active += 1
+        try:
+            time.sleep(self.latency)
+            return value
+        finally:
+            with self._lock:
+                self.active -= 1
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.aio` module."""
+
+import asyncio
+
+import pytest
+
+from pymapee import aio, cache, executor, pymapee
+from tests.fakes import FakeEE, FakeFeatureCollection, FakeImage, FakeReducer, FakeServer
+
+IMAGE = FakeImage({"NDVI": lambda feat: feat["id"] / 10})
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer(latency=0.05)
+    monkeypatch.setattr(pymapee, "ee", FakeEE)
+    monkeypatch.setattr(pymapee, "get_info", lambda ee_object: ee_object.getInfo()
+                        if hasattr(ee_object, "getInfo") else ee_object)
+    monkeypatch.setattr(cache, "server_info", server)
+    monkeypatch.setattr(pymapee, "get_reducer", lambda reducer: FakeReducer())
+    previous = executor.set_executor(executor.RequestExecutor(rate=None))
+    yield server
+    executor.set_executor(previous)
+    aio.configure(max_workers=aio.DEFAULT_WORKERS, rate=None)
+
+
+def regions(n):
+    return [FakeFeatureCollection([{"id": i * 10 + j} for j in range(10)]) for i in range(n)]
+
+
+def test_concurrent_extractions_on_bounded_pool(server):
+    aio.configure(max_workers=4)
+    # The first requests wait until 4 run at once, which only a pool of 4 threads allows.
+    server.hold = 4
+
+    async def main():
+        return await asyncio.gather(*[aio.value_from_image(IMAGE, fc) for fc in regions(12)])
+    frames = asyncio.run(main())
+    assert [df["NDVI"].iloc[0] for df in frames] == pytest.approx([i for i in range(12)])
+    assert server.requests == 12
+    assert server.max_active == 4
+
+
+def test_global_rate_limiter(server, monkeypatch):
+    aio.configure(max_workers=8)
+    # A frozen clock: every token is paid for by the waits, not by the time the test takes.
+    limiter = aio.RateLimiter(20, clock=lambda: 0.0)
+    delays = []
+    reserve = limiter.reserve
+
+    def recording():
+        delays.append(reserve())
+        return delays[-1]
+    monkeypatch.setattr(limiter, "reserve", recording)
+    monkeypatch.setattr(aio, "_limiter", limiter)
+
+    async def main():
+        await asyncio.gather(*[aio.value_from_image(IMAGE, fc) for fc in regions(6)])
+    asyncio.run(main())
+    assert server.requests == 6
+    # One call per 1/20 s: the n-th call waits n / 20 seconds.
+    assert sorted(delays) == pytest.approx([i / 20 for i in range(6)])
+
+
+def test_timeout_and_cancellation(server):
+    aio.configure(max_workers=1)
+    server.latency = 0.2
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await aio.value_from_image(IMAGE, regions(1)[0], timeout=0.05)
+        tasks = [asyncio.ensure_future(aio.value_from_image(IMAGE, fc)) for fc in regions(5)]
+        await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.4)
+    asyncio.run(main())
+    # Only the calls already running when cancelled reached the server.
+    assert server.requests <= 3
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.batch` module."""
+
+import pytest
+
+from pymapee import batch
+from tests.fakes import FlakyPages
+
+
+def test_page_offsets():
+    assert batch.page_offsets(5, 2) == [(0, 2), (2, 2), (4, 1)]
+    assert batch.page_offsets(0, 2) == []
+    with pytest.raises(ValueError):
+        batch.page_offsets(5, 0)
+
+
+def test_run_pages_in_order_with_bounded_concurrency():
+    pages = FlakyPages(delay=0.01)
+    reports = []
+    results = list(batch.run_pages(pages, 95, 10, max_workers=3,
+                                   progress=lambda *args: reports.append(args)))
+    assert [index for index, _, _ in results] == list(range(10))
+    ids = [f["properties"]["id"] for _, page, _ in results for f in page["features"]]
+    assert ids == list(range(95))
+    assert pages.max_active <= 3
+    assert len(reports) == 10 and reports[-1][:2] == (10, 10)
+
+
+def test_run_pages_retries_failed_pages():
+    pages = FlakyPages(failures={10: 2})
+    results = list(batch.run_pages(pages, 30, 10, retries=2, backoff=0))
+    assert len(results) == 3
+    assert pages.calls == 5
+
+
+def test_run_pages_gives_up_after_retries():
+    pages = FlakyPages(failures={0: 5})
+    with pytest.raises(RuntimeError):
+        list(batch.run_pages(pages, 10, 10, retries=1, backoff=0))
+
+
+def test_pages_format_to_dataframe():
+    from pymapee.utils import data_format
+    frames = [data_format(page) for _, page, _ in batch.run_pages(FlakyPages(), 25, 10)]
+    assert [len(df) for df in frames] == [10, 10, 5]
+    assert list(frames[0].columns) == ["id", "NDVI"]
+
+
+def test_is_transient():
+    assert batch.is_transient(TimeoutError())
+    assert batch.is_transient(RuntimeError("Too many concurrent aggregations."))
+    assert not batch.is_transient(RuntimeError("Image.select: Pattern 'B1' did not match any bands."))
+    assert batch.is_transient(RuntimeError("503 Server Error: Service Unavailable for url"))
+    assert batch.is_transient(RuntimeError("Request failed with HTTP 502."))
+
+
+def test_deterministic_errors_with_numbers_are_not_transient():
+    from pymapee import executor
+    too_many = RuntimeError("Collection query aborted after accumulating over 5000 elements.")
+    band = RuntimeError("Image.select: Pattern 'B5004' did not match any bands.")
+    for error in (too_many, band):
+        assert not batch.is_transient(error)
+        assert not executor.is_quota_error(error)
+
+    class HttpError(Exception):
+        def __init__(self, status, message):
+            super().__init__(message)
+            self.resp = type("Response", (), {"status": status})()
+    # The status code wins over the message.
+    assert batch.is_transient(HttpError(503, "backend"))
+    assert not batch.is_transient(HttpError(400, "Too many 503 in the band name"))
+    assert executor.is_quota_error(HttpError(429, "Rate exceeded"))
@@ -0,0 +1,69 @@
+"""Offline graph-shape regression checks of the benchmark suite."""
+import json
+import os
+import sys
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS)
+
+import bench_suite  # noqa: E402
+
+
+def test_graphs_match_the_baseline():
+    results = bench_suite.run()
+    with open(bench_suite.BASELINE) as file:
+        baseline = json.load(file)
+    assert {(entry["name"], entry["size"]) for entry in baseline} == {
+        (entry["name"], entry["size"]) for entry in results}
+    assert bench_suite.compare(results, baseline) == []
+
+    by_name = {(entry["name"], entry["size"]): entry for entry in results}
+    for n in bench_suite.SIZES:
+        assert by_name["qa_mask (landsat)", n]["nodes"] < by_name["cloud_mask x4", n]["nodes"]
+        assert by_name["pipeline (optimized)", n]["bytes"] < by_name["pipeline (recorded)", n]["bytes"]
+        assert by_name["calculate_vci", n]["round_trips"] == 0
+        # The band names of toBands are renamed on the server: bounds and start only.
+        assert by_name["export_to_asset", n]["round_trips"] == 2
+        assert (by_name["calculate_indices (vci, ndvi_anomaly, zscore)", n]["nodes"]
+                < by_name["vci + ndvi_anomaly + zscore (separate)", n]["nodes"])
+
+
+def test_compare_reports_regressions():
+    baseline = [{"name": "case", "size": 12, "bytes": 100, "nodes": 10, "round_trips": 1}]
+    results = [{"name": "case", "size": 12, "bytes": 104, "nodes": 10, "round_trips": 2}]
+    assert bench_suite.compare(results, baseline) == [
+        "case (n=12): bytes 100 -> 104", "case (n=12): round_trips 1 -> 2"]
+    assert bench_suite.compare(results, baseline, tolerance=0.05) == ["case (n=12): round_trips 1 -> 2"]
+
+
+def test_sliced_export_starts_one_task_per_period():
+    import graph_ee
+    from pymapee import pymapee
+    backend = graph_ee.Backend(n_bands=192)
+    with graph_ee.installed(backend) as ee:
+        col = bench_suite.synthetic_collection(ee, 192)
+        tasks = pymapee.export_to_asset(col, bench_suite.synthetic_region(ee), "users/bench/ndvi",
+                                        slice_period="year")
+    assert list(tasks) == ["20010101", "20020101", "20030101", "20040101", "20050101"]
+    assert tasks["20020101"].config["assetId"] == "users/bench/ndvi_20020101"
+    # The period starts, the bounds and one start per file.
+    assert backend.round_trips == 2 + len(tasks)
+
+
+def test_fused_indices_share_composites_and_climatology():
+    import collections
+    import graph_ee
+    counts = {}
+    for name in ("vci + ndvi_anomaly + zscore (separate)", "calculate_indices (vci, ndvi_anomaly, zscore)"):
+        with graph_ee.installed(graph_ee.Backend(n_bands=48)) as ee:
+            out = bench_suite.CASES[name](ee, bench_suite.synthetic_collection(ee, 48), 48)
+            encoded = ee.serializer.encode(ee.List(out) if isinstance(out, list) else out,
+                                           for_cloud_api=True)
+        counts[name] = collections.Counter(
+            value["functionInvocationValue"]["functionName"] for value in encoded["values"].values()
+            if "functionInvocationValue" in value)
+    separate, fused = counts.values()
+    # One composite join, one climatology reduction and one climatology join for all the indices.
+    assert (fused["Join.apply"], fused["ImageCollection.reduce"]) == (3, 1)
+    assert (separate["Join.apply"], separate["ImageCollection.reduce"]) == (7, 4)
+    assert fused["Image.expression"] == 1
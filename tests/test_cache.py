@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.cache` module."""
+
+import time
+
+import pytest
+
+from pymapee import cache
+from tests.fakes import FakeTransport
+
+
+def test_repeated_calls_hit_the_cache():
+    transport = FakeTransport()
+    info_cache = cache.GetInfoCache(transport=transport)
+    first = info_cache.get({"bandNames": "NDVI"})
+    first["mutated"] = True
+    second = info_cache.get({"bandNames": "NDVI"})
+    info_cache.get({"bandNames": "EVI"})
+    assert transport.round_trips == 2
+    assert "mutated" not in second
+    assert info_cache.stats()["hits"] == 1
+    assert info_cache.stats()["misses"] == 2
+
+
+def test_lru_eviction():
+    transport = FakeTransport()
+    info_cache = cache.GetInfoCache(maxsize=2, transport=transport)
+    for expression in ["a", "b", "a", "c", "a", "b"]:
+        info_cache.get(expression)
+    # "b" was the least recently used entry when "c" arrived.
+    assert transport.calls == ["a", "b", "c", "b"]
+
+
+def test_ttl_expiry():
+    transport = FakeTransport()
+    info_cache = cache.GetInfoCache(ttl=0.01, transport=transport)
+    info_cache.get("a")
+    time.sleep(0.02)
+    info_cache.get("a")
+    assert transport.round_trips == 2
+
+
+def test_sqlite_store_survives_new_cache(tmp_path):
+    path = str(tmp_path / "getinfo.sqlite")
+    transport = FakeTransport()
+    cache.GetInfoCache(path=path, transport=transport).get("a")
+    reopened = cache.GetInfoCache(path=path, transport=transport)
+    assert reopened.get("a") == {"expression": "a"}
+    assert transport.round_trips == 1
+
+
+def test_set_cache_routes_get_info():
+    transport = FakeTransport()
+    previous = cache.set_cache(cache.GetInfoCache(transport=transport))
+    try:
+        cache.get_info("a")
+        cache.get_info("a")
+        assert transport.round_trips == 1
+    finally:
+        cache.set_cache(previous)
+    with pytest.raises(TypeError):
+        cache.set_cache("cache")
+
+
+def test_default_cache_expires_and_fetch_info_bypasses_it(monkeypatch):
+    assert cache.get_cache().ttl == cache.DEFAULT_TTL
+    transport = FakeTransport()
+    monkeypatch.setattr(cache, "server_info", transport)
+    previous = cache.set_cache(cache.GetInfoCache(transport=transport))
+    try:
+        cache.fetch_info("a")
+        cache.fetch_info("a")
+        assert transport.round_trips == 2
+        assert cache.get_cache().stats()["size"] == 0
+    finally:
+        cache.set_cache(previous)
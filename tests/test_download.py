@@ -0,0 +1,125 @@
+"""Tests for the tile downloader."""
+import types
+
+import numpy as np
+import pytest
+
+from pymapee import cache, download, executor
+from tests.fakes import FakeImage, FakePixelImage, FakeServer, StubPixelServer, synthetic_tile
+
+# A 24 x 18 pixel grid from (0, 18) with res 1, split into 5 x 5 tiles of one float32 band.
+BOUNDS = [0.2, 0.5, 23.5, 17.4]
+TILE_BYTES = 100
+
+
+def expected_array(bands, width=24, height=18):
+    content = synthetic_tile(bands, [1.0, 0, 0.0, 0, -1.0, 18.0], width, height)
+    return download.decode_npy(content, bands)
+
+
+@pytest.fixture
+def fake_ee(monkeypatch):
+    requests = []
+
+    def compute_pixels(request):
+        requests.append(request)
+        grid = request["grid"]
+        transform = [grid["affineTransform"][key] for key in
+                     ("scaleX", "shearX", "translateX", "shearY", "scaleY", "translateY")]
+        return synthetic_tile(request["bandIds"], transform, grid["dimensions"]["width"],
+                              grid["dimensions"]["height"])
+    module = types.SimpleNamespace(Image=FakeImage, FeatureCollection=list,
+                                   data=types.SimpleNamespace(computePixels=compute_pixels))
+    monkeypatch.setattr(download, "ee", module)
+    monkeypatch.setattr(cache, "server_info", FakeServer())
+    previous = executor.set_executor(executor.RequestExecutor(rate=None, backoff=0))
+    previous_cache = cache.set_cache(cache.GetInfoCache())
+    yield requests
+    executor.set_executor(previous)
+    cache.set_cache(previous_cache)
+
+
+@pytest.fixture
+def pixel_server():
+    server = StubPixelServer()
+    yield server
+    server.stop()
+
+
+def test_pixel_grid_and_tiles():
+    assert download.pixel_grid(BOUNDS, 1.0) == (0.0, 18.0, 24, 18)
+    assert download.pixel_grid([0.0, 0.0, 1.0, 1.0], 0.1) == (0.0, 1.0, 10, 10)
+    assert download.tile_side(1, 4, TILE_BYTES) == 5
+    tiles = download.pixel_tiles(24, 18, 5)
+    assert len(tiles) == 20
+    assert tiles[-1] == ("3_4", 15, 20, 3, 4)
+    assert sum(rows * cols for _, _, _, rows, cols in tiles) == 24 * 18
+    with pytest.raises(ValueError):
+        download.tile_side(2, 8, 15)
+
+
+def test_download_stitches_tiles(tmp_path, fake_ee, pixel_server):
+    img = FakePixelImage(["NDVI", "EVI"], pixel_server)
+    path = str(tmp_path / "ndvi.npy")
+    assert download.download_image(img, BOUNDS, path, 1.0, max_bytes=2 * TILE_BYTES,
+                                   max_workers=4) == path
+    np.testing.assert_array_equal(np.load(path, mmap_mode="r"), expected_array(["NDVI", "EVI"]))
+    assert len(pixel_server.requests) == img.url_requests == 20
+
+
+def test_download_retries_and_resumes(tmp_path, fake_ee):
+    # The first request gets a 503 (retried), the tiles of the last row a 404 (not retried).
+    server = StubPixelServer(statuses=[503], blocked={(x, 3.0) for x in (0.0, 5.0, 10.0, 15.0, 20.0)})
+    try:
+        img = FakePixelImage(["NDVI"], server)
+        path = str(tmp_path / "ndvi.npy")
+        with pytest.raises(Exception, match="404"):
+            download.download_image(img, BOUNDS, path, 1.0, max_bytes=TILE_BYTES, backoff=0)
+        done = download.load_manifest(path + ".tiles.json")["done"]
+        assert 0 < len(done) <= 15 and "3_0" not in done
+        server.blocked.clear()
+        server.requests.clear()
+        download.download_image(img, BOUNDS, path, 1.0, max_bytes=TILE_BYTES, backoff=0)
+        # Only the missing tiles are fetched again.
+        assert len(server.requests) == 20 - len(done)
+        np.testing.assert_array_equal(np.load(path), expected_array(["NDVI"]))
+        server.requests.clear()
+        download.download_image(img, BOUNDS, path, 1.0, max_bytes=TILE_BYTES)
+        assert server.requests == []
+        with pytest.raises(ValueError):
+            download.download_image(img, BOUNDS, path, 0.5, max_bytes=TILE_BYTES)
+    finally:
+        server.stop()
+
+
+def test_tiles_are_retried_in_one_layer(tmp_path, fake_ee, monkeypatch):
+    calls = []
+
+    def compute_pixels(request):
+        calls.append(request)
+        raise RuntimeError("503 Service Unavailable")
+    monkeypatch.setattr(download.ee.data, "computePixels", compute_pixels)
+    with pytest.raises(RuntimeError):
+        download.download_image(FakePixelImage(["NDVI"]), BOUNDS, str(tmp_path / "ndvi.npy"), 1.0,
+                                method="compute_pixels", retries=2, backoff=0)
+    # One tile, tried once and retried twice by run_pages only.
+    assert len(calls) == 3
+    assert executor.get_executor().metrics()["data"]["retries"] == 0
+
+
+def test_download_compute_pixels(tmp_path, fake_ee):
+    img = FakePixelImage(["NDVI"])
+    path = str(tmp_path / "ndvi.npy")
+    download.download_image(img, BOUNDS, path, 1.0, method="compute_pixels", max_bytes=TILE_BYTES)
+    assert len(fake_ee) == 20 and img.url_requests == 0
+    np.testing.assert_array_equal(np.load(path), expected_array(["NDVI"]))
+
+
+def test_download_invalid_arguments(tmp_path, fake_ee):
+    img = FakePixelImage(["NDVI"])
+    with pytest.raises(TypeError):
+        download.download_image("image", BOUNDS, str(tmp_path / "a.npy"), 1.0)
+    with pytest.raises(ValueError):
+        download.download_image(img, BOUNDS, str(tmp_path / "a.csv"), 1.0)
+    with pytest.raises(ValueError):
+        download.download_image(img, BOUNDS, str(tmp_path / "a.npy"), 1.0, method="thumbnail")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.executor` module."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pymapee import executor
+from tests.fakes import QuotaBackend
+
+
+def test_quota_errors_degrade_throughput_instead_of_failing():
+    backend = QuotaBackend(max_concurrent=3)
+    requests = executor.RequestExecutor(rate=500, burst=20, concurrency={"data": 12}, retries=8,
+                                        backoff=0.01)
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        results = list(pool.map(lambda i: requests.call("data", backend, i), range(60)))
+    assert results == list(range(60))
+    metrics = requests.metrics()
+    assert backend.rejected > 0
+    assert metrics["data"]["throttled"] == backend.rejected
+    assert metrics["data"]["retries"] == backend.rejected
+    assert metrics["data"]["successes"] == 60 and metrics["data"]["failures"] == 0
+    assert metrics["data"]["wait_seconds"] > 0
+    # Without retries the same load loses requests.
+    unprotected = executor.RequestExecutor(rate=None, concurrency={}, retries=0)
+    backend = QuotaBackend(max_concurrent=3)
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        futures = [pool.submit(unprotected.call, "data", backend, i) for i in range(60)]
+    assert sum(future.exception() is not None for future in futures) > 0
+
+
+def test_concurrency_limit_per_kind():
+    backend = QuotaBackend(max_concurrent=2)
+    requests = executor.RequestExecutor(rate=None, concurrency={"data": 2}, retries=0)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert list(pool.map(lambda i: requests.call("data", backend, i), range(20))) == list(range(20))
+    assert backend.rejected == 0
+
+
+def test_deterministic_errors_are_not_retried():
+    backend = QuotaBackend(error=ValueError("Image.select: Pattern 'B1' did not match any bands."))
+    requests = executor.RequestExecutor(rate=None, backoff=0)
+    with pytest.raises(ValueError):
+        requests.call("getInfo", backend, 1)
+    assert backend.requests == 1
+    assert requests.breaker.state == "closed"
+
+
+def test_circuit_breaker_opens_and_recovers():
+    now = [0.0]
+    backend = QuotaBackend(error=RuntimeError("503 Service Unavailable"))
+    requests = executor.RequestExecutor(rate=None, retries=0, failure_threshold=3, reset_timeout=10)
+    requests.breaker.clock = lambda: now[0]
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            requests.call("getInfo", backend, 1)
+    with pytest.raises(executor.CircuitOpenError):
+        requests.call("getInfo", backend, 1)
+    assert backend.requests == 3
+    assert requests.metrics()["getInfo"]["rejected"] == 1
+    now[0] = 11
+    backend.error = None
+    assert requests.call("getInfo", backend, 1) == 1
+    assert requests.breaker.state == "closed"
+
+
+def test_rate_is_halved_on_quota_errors_and_restored():
+    requests = executor.RequestExecutor(rate=100, burst=100, retries=1, backoff=0)
+    backend = QuotaBackend(error=RuntimeError("429 Too Many Requests"))
+    with pytest.raises(RuntimeError):
+        requests.call("getInfo", backend, 1)
+    # Two quota errors in a row halve the rate once.
+    assert requests.bucket.rate == 50
+    assert requests.metrics()["getInfo"]["throttled"] == 2
+    requests._throttled_at -= executor.THROTTLE_WINDOW
+    with pytest.raises(RuntimeError):
+        requests.call("getInfo", backend, 1, retries=0)
+    assert requests.bucket.rate == 25
+    backend.error = None
+    for _ in range(10):
+        requests.call("getInfo", backend, 1)
+    assert requests.bucket.rate == 45
+    assert requests.metrics()["executor"]["rate"] == 45
@@ -0,0 +1,65 @@
+"""Tests for the lazy loading of the pymapee submodules."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code):
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+
+
+def test_import_loads_no_dependency():
+    result = run("import sys, pymapee; print(sorted(m for m in sys.modules if m.split('.')[0] in "
+                 "('ee', 'ipyleaflet', 'shapefile', 'numpy', 'pandas') or m.startswith('pymapee.')))")
+    assert result.stdout.split() == ["[]"], result.stderr
+
+
+def test_headless_use_without_ipyleaflet():
+    # A None entry in sys.modules makes the import fail like a missing package.
+    result = run("import sys; sys.modules['ipyleaflet'] = None; sys.modules['shapefile'] = None\n"
+                 "import pymapee\n"
+                 "assert pymapee.monthly_composite is pymapee.pymapee.monthly_composite\n"
+                 "assert pymapee.QA_PRESETS is pymapee.utils.QA_PRESETS\n"
+                 "assert pymapee.Pipeline.__module__ == 'pymapee.pipeline'\n"
+                 "import pymapee.aio, pymapee.tiles\n"
+                 "try:\n"
+                 "    pymapee.Map\n"
+                 "except ImportError:\n"
+                 "    print('no widgets')\n")
+    assert result.stdout.strip() == "no widgets", result.stderr
+
+
+def test_unknown_names():
+    import pymapee
+    with pytest.raises(AttributeError):
+        pymapee.not_a_function
+    with pytest.raises(AttributeError):
+        pymapee._private
+    assert "monthly_composite" in dir(pymapee) and "Map" in dir(pymapee)
+
+
+def test_star_import_exports_the_lazy_names():
+    result = run("import sys; sys.modules['ipyleaflet'] = None; sys.modules['shapefile'] = None\n"
+                 "from pymapee import *\n"
+                 "import pymapee\n"
+                 "assert monthly_composite is pymapee.pymapee.monthly_composite\n"
+                 "assert QA_PRESETS is pymapee.utils.QA_PRESETS and Pipeline is pymapee.Pipeline\n"
+                 "print('Map' in dir())\n")
+    assert result.stdout.strip() == "False", result.stderr
+
+
+def test_all_lists_the_public_definitions():
+    import inspect
+    import pymapee
+    for module in (pymapee.pymapee, pymapee.utils):
+        for name, value in vars(module).items():
+            if name.startswith("_") or inspect.ismodule(value):
+                continue
+            if (inspect.isfunction(value) or inspect.isclass(value)) and value.__module__ != module.__name__:
+                continue
+            assert name in pymapee.__all__, name
+    assert len(set(pymapee.__all__)) == len(pymapee.__all__)
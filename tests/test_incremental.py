@@ -0,0 +1,190 @@
+"""Tests for the incremental composites."""
+import datetime
+import functools
+import os
+
+import numpy as np
+import pytest
+
+from pymapee import cache, executor, incremental, tasks
+from tests.fakes import (FakeAssetStore, FakeEE, FakeImage, FakeImageCollection, FakePixelImage,
+                         StubPixelServer)
+
+JAN, FEB, MAR = (int(datetime.datetime(2021, month, 1, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+                 for month in (1, 2, 3))
+
+
+class MemoryStore:
+    """ A local stand-in of an output store recording the periods written."""
+
+    def __init__(self, manifest_path, failing=()):
+        self.manifest_path = manifest_path
+        self.failing = set(failing)
+        self.outputs = {}
+        self.writes = []
+        self.replaced = []
+
+    def write(self, outputs, replace=()):
+        self.replaced.extend(sorted(replace))
+        for key, img in outputs.items():
+            if key in self.failing:
+                continue
+            self.outputs[key] = img
+            self.writes.append(key)
+            yield key
+
+
+@pytest.fixture
+def archive(monkeypatch):
+    """ The input images of every period, as (period start, system:index) rows."""
+    rows = {JAN: ["a1", "a2"], FEB: ["b1"]}
+    built = []
+
+    def period_image(col, millis, period, reducer, index, climatology):
+        built.append(millis)
+        return (index, millis, climatology)
+    monkeypatch.setattr(incremental, "ee", FakeEE)
+    monkeypatch.setattr(incremental, "period_inventory", lambda col, period, properties:
+                        incremental.period_fingerprints([(millis, name) for millis, names in rows.items()
+                                                         for name in names]))
+    monkeypatch.setattr(incremental, "period_image", period_image)
+    return rows, built
+
+
+def test_period_fingerprints_and_keys():
+    rows = [(JAN, "a1", 1), (JAN, "a2", 1), (FEB, "b1", 1)]
+    fingerprints = incremental.period_fingerprints(rows)
+    assert set(fingerprints) == {JAN, FEB}
+    assert incremental.period_fingerprints(rows[::-1]) == fingerprints
+    assert incremental.period_fingerprints([(JAN, "a1", 2), (JAN, "a2", 1)])[JAN] != fingerprints[JAN]
+    assert incremental.period_key(MAR) == "20210301"
+
+
+def test_only_new_and_changed_periods_are_recomputed(tmp_path, archive):
+    rows, built = archive
+    store = MemoryStore(str(tmp_path / "manifest.json"))
+    col = FakeImageCollection([])
+
+    first = incremental.update_composites(col, store)
+    assert first == {"computed": ["20210101", "20210201"], "unchanged": [], "failed": [], "errors": {}}
+    assert incremental.update_composites(col, store)["computed"] == []
+    assert len(built) == 2
+
+    # A new month is appended, a reprocessed image only recomputes its month.
+    rows[MAR] = ["c1"]
+    rows[FEB] = ["b1", "b2"]
+    second = incremental.update_composites(col, store)
+    assert second["computed"] == ["20210201", "20210301"]
+    assert second["unchanged"] == ["20210101"]
+    assert store.replaced == ["20210201"]
+    assert len(built) == 4
+    # Another reducer is another composite.
+    assert len(incremental.update_composites(col, store, reducer="median")["computed"]) == 3
+
+
+def test_baseline_change_invalidates_the_index(tmp_path, archive):
+    rows, built = archive
+    store = MemoryStore(str(tmp_path / "manifest.json"))
+    col = FakeImageCollection([])
+    incremental.update_composites(col, store, index="vci", climatology="clim 2001-2020")
+    assert incremental.update_composites(col, store, index="vci",
+                                         climatology="clim 2001-2020")["computed"] == []
+    # Kept when invalidation is off, except for the new period.
+    rows[MAR] = ["c1"]
+    kept = incremental.update_composites(col, store, index="vci", climatology="clim 2001-2023",
+                                         invalidate_on_baseline=False)
+    assert kept["computed"] == ["20210301"]
+    assert store.outputs["20210301"] == ("vci", MAR, "clim 2001-2023")
+    recomputed = incremental.update_composites(col, store, index="vci", climatology="clim 2001-2023")
+    assert recomputed["computed"] == ["20210101", "20210201"]
+    assert len(built) == 5
+
+
+def test_failed_periods_are_retried(tmp_path, archive):
+    rows, built = archive
+    store = MemoryStore(str(tmp_path / "manifest.json"), failing={"20210201"})
+    col = FakeImageCollection([])
+    assert incremental.update_composites(col, store)["failed"] == ["20210201"]
+    store.failing.clear()
+    assert incremental.update_composites(col, store)["computed"] == ["20210201"]
+
+
+@pytest.fixture
+def asset_store(tmp_path, archive, monkeypatch):
+    assets = FakeAssetStore()
+    monkeypatch.setattr(FakeEE, "data", assets, raising=False)
+    monkeypatch.setattr(incremental, "get_info", lambda bounds: {"coordinates": bounds})
+    monkeypatch.setattr(incremental, "period_image", lambda col, millis, *args: FakeImage({}))
+    monkeypatch.setattr(incremental.pymapee, "_asset_task", assets.export)
+    monkeypatch.setattr(incremental, "iter_tasks", functools.partial(tasks.iter_tasks, sleep=lambda delay: None))
+    previous = executor.set_executor(executor.RequestExecutor(rate=None, backoff=0))
+    store = incremental.AssetStore("vci", FakeImage({}), str(tmp_path / "manifest.json"), max_concurrent=1)
+    store.aoi.geometry = lambda: type("G", (), {"bounds": lambda self: [0, 0]})()
+    yield store, assets
+    executor.set_executor(previous)
+
+
+def test_asset_store_records_each_export_once_completed(asset_store, monkeypatch):
+    store, assets = asset_store
+    # An interrupted run exported a period without recording it.
+    assets.assets["vci_20210101"] = {}
+    recorded = []
+
+    def export(img, region, asset_id, *args):
+        recorded.append((asset_id, sorted(incremental.load_manifest(store.manifest_path).get("periods", {}))))
+        return assets.export(img, region, asset_id, *args)
+    monkeypatch.setattr(incremental.pymapee, "_asset_task", export)
+    result = incremental.update_composites(FakeImageCollection([]), store)
+    assert result["computed"] == ["20210101", "20210201"]
+    assert assets.deleted == ["vci_20210101"]
+    # The first period is recorded before the second export starts.
+    assert recorded == [("vci_20210101", []), ("vci_20210201", ["20210101"])]
+    assert not os.path.exists(store.manifest_path + ".tasks")
+
+
+def test_asset_store_reports_failed_exports(asset_store):
+    store, assets = asset_store
+    assets.failing.add("vci_20210201")
+    result = incremental.update_composites(FakeImageCollection([]), store)
+    assert result["computed"] == ["20210101"] and result["failed"] == ["20210201"]
+    assert result["errors"] == {"20210201": "Export too large."}
+
+
+def test_invalid_arguments(tmp_path, archive):
+    store = MemoryStore(str(tmp_path / "manifest.json"))
+    col = FakeImageCollection([])
+    with pytest.raises(TypeError):
+        incremental.update_composites("col", store)
+    with pytest.raises(ValueError):
+        incremental.update_composites(col, store, index="ndvi")
+    with pytest.raises(ValueError):
+        incremental.update_composites(col, store, index="vci")
+    with pytest.raises(ValueError):
+        incremental.update_composites(col, store, period="dekad", index="vci", climatology="clim")
+
+
+def test_local_store_replaces_arrays(tmp_path, archive, monkeypatch):
+    rows, _ = archive
+    server = StubPixelServer()
+    previous = executor.set_executor(executor.RequestExecutor(rate=None, backoff=0))
+    previous_cache = cache.set_cache(cache.GetInfoCache())
+    monkeypatch.setattr(incremental, "period_image",
+                        lambda col, millis, *args: FakePixelImage(["NDVI"], server))
+    monkeypatch.setattr("pymapee.download.ee", FakeEE)
+    try:
+        store = incremental.LocalStore(str(tmp_path / "vci"), [0.2, 0.5, 9.5, 9.4], 1.0,
+                                       bands=["NDVI"])
+        incremental.update_composites(FakeImageCollection([]), store)
+        assert sorted(os.listdir(str(tmp_path / "vci"))) == [
+            "20210101.npy", "20210101.npy.tiles.json", "20210201.npy", "20210201.npy.tiles.json",
+            "manifest.json"]
+        assert np.load(str(tmp_path / "vci" / "20210101.npy")).shape == (1, 10, 10)
+        server.requests.clear()
+        rows[FEB] = ["b2"]
+        assert incremental.update_composites(FakeImageCollection([]), store)["computed"] == ["20210201"]
+        # The finished download of the old inputs is not reused.
+        assert len(server.requests) == 1
+    finally:
+        server.stop()
+        executor.set_executor(previous)
+        cache.set_cache(previous_cache)
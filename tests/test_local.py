@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.local` module."""
+
+import datetime
+
+import numpy as np
+import pytest
+
+from pymapee import local
+
+
+@pytest.mark.parametrize("date, period, expected", [
+    (datetime.datetime(2021, 3, 17, 13), "day", datetime.datetime(2021, 3, 17)),
+    (datetime.datetime(2021, 3, 17, 13), "week", datetime.datetime(2021, 3, 15)),
+    (datetime.datetime(2021, 3, 31), "dekad", datetime.datetime(2021, 3, 21)),
+    (datetime.datetime(2021, 3, 11), "dekad", datetime.datetime(2021, 3, 11)),
+    (datetime.datetime(2021, 3, 17), "month", datetime.datetime(2021, 3, 1)),
+    (datetime.datetime(2021, 2, 17), "season", datetime.datetime(2020, 12, 1)),
+    (datetime.datetime(2021, 12, 5), "season", datetime.datetime(2021, 12, 1)),
+    (datetime.datetime(2021, 8, 5), "season", datetime.datetime(2021, 6, 1)),
+    (datetime.datetime(2021, 8, 5), "year", datetime.datetime(2021, 1, 1)),
+    (datetime.datetime(2021, 3, 31), "pentad", datetime.datetime(2021, 3, 26)),
+    (datetime.datetime(2021, 3, 10), "pentad", datetime.datetime(2021, 3, 6)),
+    (datetime.datetime(2021, 9, 30), "water_year", datetime.datetime(2020, 10, 1)),
+    (datetime.datetime(2021, 10, 1), "water_year", datetime.datetime(2021, 10, 1)),
+    (datetime.datetime(2021, 3, 5), (11, 5), datetime.datetime(2020, 11, 1)),
+    (datetime.datetime(2021, 7, 5), (11, 5), datetime.datetime(2021, 5, 1)),
+])
+def test_period_start(date, period, expected):
+    assert local.period_start(date, period) == expected
+    assert local.period_start(local.to_millis(date), period) == expected
+
+
+def test_period_start_invalid():
+    with pytest.raises(ValueError):
+        local.period_start(datetime.datetime(2021, 1, 1), "fortnight")
+    with pytest.raises(ValueError):
+        local.period_start(datetime.datetime(2021, 1, 1), (0, 6))
+    with pytest.raises(TypeError):
+        local.period_start(datetime.datetime(2021, 1, 1), 10)
+
+
+@pytest.mark.parametrize("period, freq", [
+    ("day", "D"), ("week", "W-MON"), ("month", "MS"), ("season", "QS-DEC"),
+    ("water_year", "YS-OCT"), ("year", "YS"), ((1, 4, 7, 10), "QS-JAN"), ((6,), "YS-JUN"),
+])
+def test_period_sequence_matches_pandas(period, freq):
+    pd = pytest.importorskip("pandas")
+    start, end = datetime.datetime(2019, 11, 20), datetime.datetime(2023, 2, 14)
+    first = local.period_start(start, period)
+    expected = pd.date_range(first, end, freq=freq, inclusive="left").to_pydatetime()
+    assert local.period_sequence(start, end, period) == list(expected)
+
+
+def test_sub_monthly_periods_match_pandas():
+    pd = pytest.importorskip("pandas")
+    days = pd.date_range("2019-12-01", "2021-03-01", freq="D", inclusive="left")
+    for period, firsts in (("pentad", (1, 6, 11, 16, 21, 26)), ("dekad", (1, 11, 21))):
+        expected = days[days.day.isin(firsts)].to_pydatetime()
+        assert local.period_sequence(days[0], days[-1] + pd.Timedelta(days=1), period) == list(expected)
+        # Every day belongs to the last boundary before it.
+        starts = [local.period_start(day, period) for day in days.to_pydatetime()]
+        assert starts == list(expected[np.searchsorted(expected, days.to_pydatetime(), "right") - 1])
+    assert local.period_sequence(days[0], days[0], "month") == []
+
+
+def test_period_slots_match_pandas():
+    pd = pytest.importorskip("pandas")
+    days = pd.date_range("2020-01-01", "2021-12-31", freq="D")
+    dates = days.to_pydatetime()
+    assert [local.period_slot(d, "week") for d in dates] == list(days.isocalendar().week)
+    assert [local.period_slot(d, "day") for d in dates] == list(days.dayofyear)
+    assert [local.period_slot(d, "month") for d in dates] == list(days.month)
+    assert [local.period_slot(d, "season") for d in dates] == list((days.month // 3 - 1) % 4 + 1)
+    for period, count in (("pentad", 72), ("dekad", 36)):
+        # The slot is the rank of the period start within its year.
+        starts = pd.Series([local.period_start(d, period) for d in dates], index=days)
+        ranks = starts.groupby(days.year).rank(method="dense").astype(int)
+        slots = [local.period_slot(d, period) for d in dates]
+        assert slots == list(ranks) and max(slots) == count
+    assert {local.period_slot(d, (11, 5)) for d in dates} == {1, 2}
+
+
+def test_group_composite_reducers():
+    times = [datetime.datetime(2021, 1, d) for d in (1, 15, 20)] + [datetime.datetime(2021, 3, 2)]
+    data = np.array([[1.0, np.nan], [3.0, 2.0], [5.0, np.nan], [7.0, np.nan]])
+    starts, out = local.group_composite(times, data, "month", "max")
+    assert starts == [datetime.datetime(2021, 1, 1), datetime.datetime(2021, 3, 1)]
+    np.testing.assert_array_equal(out, [[5.0, 2.0], [7.0, np.nan]])
+    _, count = local.group_composite(times, data, "month", "count")
+    np.testing.assert_array_equal(count, [[3, 1], [1, 0]])
+    _, p50 = local.group_composite(times, data, "month", "p50")
+    np.testing.assert_array_equal(p50, [[3.0, 2.0], [7.0, np.nan]])
+    _, last = local.group_composite(times, data, "month", "last")
+    np.testing.assert_array_equal(last[0], [5.0, 2.0])
+
+
+def synthetic_cube(seed=0, steps=40, missing=0.3):
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(2020, 11, 3)
+    times = [start + datetime.timedelta(days=int(d)) for d in np.sort(rng.choice(200, steps, replace=False))]
+    data = rng.uniform(0, 1, (steps, 3, 4, 2))
+    data[rng.uniform(size=data.shape) < missing] = np.nan
+    return times, data
+
+
+def reference_interpolation(times, data, days):
+    """The saveAll joins + mosaic of gee_linear_interpolate_nan, written pixel by pixel."""
+    millis = [local.to_millis(t) for t in times]
+    window = days * 86400000
+    out = data.copy()
+    for k, t in enumerate(millis):
+        before = [i for i in range(len(millis)) if t - window <= millis[i] <= t]
+        after = [i for i in range(len(millis)) if t <= millis[i] <= t + window]
+        for idx in np.ndindex(data.shape[1:-1]):
+            def mosaic(images, band):
+                # The last image of the list is on top; lists are ordered towards t.
+                ordered = sorted(images, key=lambda i: abs(millis[i] - t), reverse=True)
+                values = [data[(i,) + idx + (band,)] for i in ordered]
+                valid = [v for v in values if not np.isnan(v)]
+                return valid[-1] if valid else np.nan
+
+            def mosaic_time(images):
+                ordered = sorted(images, key=lambda i: abs(millis[i] - t), reverse=True)
+                valid = [millis[i] for i in ordered if not np.isnan(data[(i,) + idx + (0,)])]
+                return valid[-1] if valid else np.nan
+            t1, t2 = np.float64(mosaic_time(before)), np.float64(mosaic_time(after))
+            for band in range(data.shape[-1]):
+                if np.isnan(data[(k,) + idx + (band,)]):
+                    b, a = mosaic(before, band), mosaic(after, band)
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        value = b + (a - b) * ((t - t1) / (t2 - t1))
+                    out[(k,) + idx + (band,)] = value if np.isfinite(value) else np.nan
+    return out
+
+
+def test_linear_interpolate_matches_join_semantics():
+    times, data = synthetic_cube()
+    expected = reference_interpolation(times, data, 20)
+    np.testing.assert_allclose(local.linear_interpolate_nan(times, data, 20), expected)
+    # Unsorted input gives the same values in the input order.
+    order = np.random.default_rng(1).permutation(len(times))
+    shuffled = local.linear_interpolate_nan([times[i] for i in order], data[order], 20)
+    np.testing.assert_allclose(shuffled, expected[order])
+
+
+def test_cloud_mask_bits():
+    qa = np.array([0b0000, 0b0100, 0b1000, 0b1100], dtype="float64")
+    data = np.stack([np.arange(4.0), qa], axis=-1)
+    out = local.cloud_mask(data, 2, 3, 1, threshold=1)
+    np.testing.assert_array_equal(np.isnan(out[:, 0]), [False, False, True, True])
+    assert np.isnan(out[2]).all()
+
+
+def test_calculate_vci():
+    times = [datetime.datetime(y, 1, 5) for y in (2019, 2020, 2021)] + [datetime.datetime(2021, 1, 20)]
+    data = np.array([2.0, 4.0, 3.0, 6.0])
+    starts, vci = local.calculate_vci(times, data)
+    assert starts == [datetime.datetime(y, 1, 1) for y in (2019, 2020, 2021)]
+    np.testing.assert_allclose(vci, [0.0, 50.0, 100.0])
+
+
+def test_calculate_vci_by_dekad():
+    pd = pytest.importorskip("pandas")
+    rng = np.random.default_rng(5)
+    times = pd.date_range("2015-01-01", "2020-12-31", freq="2D")
+    data = rng.uniform(size=len(times))
+    starts, vci = local.calculate_vci(list(times.to_pydatetime()), data, "dekad")
+    frame = pd.Series(data, index=times)
+    key = frame.index.map(lambda t: local.period_start(t, "dekad"))
+    composite = frame.groupby(key).max()
+    slots = frame.index.map(lambda t: local.period_slot(t, "dekad"))
+    low, high = frame.groupby(slots).min(), frame.groupby(slots).max()
+    composite_slots = [local.period_slot(start, "dekad") for start in composite.index]
+    expected = (composite.values - low[composite_slots].values) / (
+        high[composite_slots].values - low[composite_slots].values) * 100
+    assert starts == list(composite.index)
+    np.testing.assert_allclose(vci, expected)
+
+
+def test_calculate_indices_match_the_single_indices():
+    pd = pytest.importorskip("pandas")
+    rng = np.random.default_rng(7)
+    times = pd.date_range("2012-01-01", "2019-12-31", freq="4D")
+    shape = (len(times), 3)
+    ndvi, lst, rain = rng.uniform(size=shape), rng.uniform(280, 320, shape), rng.gamma(2.0, size=shape)
+    dates = list(times.to_pydatetime())
+    starts, out = local.calculate_indices(dates, ndvi, lst, rain, list(local.INDEX_SUITE), scale=2)
+    assert list(out) == list(local.INDEX_SUITE)
+    np.testing.assert_allclose(out["vci"], local.calculate_vci(dates, ndvi)[1])
+    np.testing.assert_allclose(out["zscore"], local.calculate_zscore(dates, ndvi, scale=2)[1])
+
+    # TCI and the SPI-like index with pandas.
+    temperature = pd.DataFrame(lst * 2, index=times)
+    monthly = temperature.resample("MS").max()
+    low, high = temperature.groupby(times.month).min(), temperature.groupby(times.month).max()
+    months = monthly.index.month
+    assert starts == list(monthly.index)
+    expected = (high.loc[months].values - monthly.values) / (high.loc[months].values - low.loc[months].values)
+    np.testing.assert_allclose(out["tci"], expected * 100)
+    np.testing.assert_allclose(out["vhi"], (out["vci"] + out["tci"]) / 2)
+    totals = pd.DataFrame(rain * 2, index=times).resample("MS").sum()
+    grouped = totals.groupby(totals.index.month)
+    spi = (totals - grouped.transform("mean")) / grouped.transform(lambda x: x.std(ddof=0))
+    np.testing.assert_allclose(out["spi"], spi.values)
+
+    _, dekads = local.calculate_indices(dates, ndvi, indices="vci", period="dekad")
+    np.testing.assert_allclose(dekads["vci"], local.calculate_vci(dates, ndvi, "dekad")[1])
+    with pytest.raises(ValueError):
+        local.calculate_indices(dates, ndvi, indices=["vhi"])
+    with pytest.raises(ValueError):
+        local.calculate_indices(dates, ndvi, indices=["ndwi"])
+
+
+def test_public_functions_accept_dataarrays():
+    xr = pytest.importorskip("xarray")
+    from pymapee import pymapee, utils
+    times, data = synthetic_cube()
+    da = xr.DataArray(data, dims=("time", "y", "x", "band"),
+                      coords={"time": np.array(times, dtype="datetime64[ns]"), "band": ["NDVI", "QA"]})
+
+    composite = pymapee.monthly_composite(da, "mean")
+    starts, expected = local.group_composite(times, data, "month", "mean")
+    np.testing.assert_allclose(composite.values, expected)
+    assert list(composite["time"].values) == list(np.array(starts, dtype="datetime64[ns]"))
+
+    filled = pymapee.gee_linear_interpolate_nan(da.transpose("band", "time", "y", "x"), days=20)
+    assert filled.dims == ("band", "time", "y", "x")
+    np.testing.assert_allclose(filled.transpose("time", "y", "x", "band").values,
+                               local.linear_interpolate_nan(times, data, 20))
+
+    vci = pymapee.calculate_vci(da.sel(band=["NDVI"]))
+    assert list(vci["band"].values) == ["VCI"]
+    with pytest.raises(ValueError):
+        pymapee.calculate_vci(da.sel(band=["NDVI"]), climatology=vci)
+    indices = pymapee.calculate_indices(da, ["zscore", "vci"], "NDVI")
+    assert list(indices["band"].values) == ["ZSCORE", "VCI"]
+    np.testing.assert_allclose(indices.sel(band="VCI").values, vci.sel(band="VCI").values)
+
+    qa = da.fillna(0).astype("int64")
+    masked = utils.cloud_mask(qa, 0, 0, "QA", threshold=0)
+    np.testing.assert_array_equal(masked.values, local.cloud_mask(qa.values, 0, 0, 1, 0))
+    fused = utils.qa_mask(qa, [(0, 0, 0), (2, 3, 1)], "QA")
+    np.testing.assert_array_equal(fused.values, local.qa_mask(qa.values, [(0, 0, 0), (2, 3, 1)], 1))
+
+
+def test_gap_fill_linear_matches_interpolation():
+    times, data = synthetic_cube(missing=0.4)
+    single = data[..., :1]
+    np.testing.assert_allclose(local.gap_fill(times, single, "linear", window=20),
+                               local.linear_interpolate_nan(times, single, 20))
+
+
+def test_gap_fill_methods_and_max_gap():
+    times = [datetime.datetime(2021, 1, 1) + datetime.timedelta(days=d) for d in range(8)]
+    series = np.array([0.0, np.nan, 4.0, np.nan, np.nan, np.nan, 12.0, np.nan])
+    np.testing.assert_allclose(local.gap_fill(times, series, "linear"),
+                               [0, 2, 4, 6, 8, 10, 12, np.nan])
+    np.testing.assert_allclose(local.gap_fill(times, series, "nearest"),
+                               [0, 0, 4, 4, 4, 12, 12, np.nan])
+    np.testing.assert_allclose(local.gap_fill(times, series, "linear", max_gap=3),
+                               [0, 2, 4, np.nan, np.nan, np.nan, 12, np.nan])
+    quadratic = np.arange(8.0) ** 2
+    gaps = quadratic.copy()
+    gaps[[3, 4]] = np.nan
+    np.testing.assert_allclose(local.gap_fill(times, gaps, "spline"), quadratic)
+    with pytest.raises(ValueError):
+        local.gap_fill(times, series, "cubic")
+
+
+def test_gap_fill_dask_blocks():
+    da = pytest.importorskip("dask.array")
+    times, data = synthetic_cube(missing=0.5)
+    lazy = da.from_array(data, chunks=(7, 2, 2, 1))
+    result = local.gap_fill(times, lazy, "spline", max_gap=30)
+    assert hasattr(result, "compute")
+    np.testing.assert_allclose(result.compute(), local.gap_fill(times, data, "spline", max_gap=30))
+
+
+def array_mode_interpolation(times, data, days):
+    """The toArray/arrayMask/arraySlice steps of array_interpolation, written pixel by pixel."""
+    millis = np.array([local.to_millis(t) for t in times], dtype="float64")
+    order = np.argsort(millis)
+    window = days * 86400000.0
+    out = data.copy()
+    for idx in np.ndindex(data.shape[1:-1]):
+        pixel = data[(slice(None),) + idx]
+        # toArray keeps the observations valid in all bands, in collection (time) order.
+        rows = [np.append(pixel[i], millis[i]) for i in order if not np.isnan(pixel[i]).any()]
+        sentinel_past = np.full(data.shape[-1] + 1, -1e18)
+        sentinel_future = np.full(data.shape[-1] + 1, 1e18)
+        for k, t in enumerate(millis):
+            before = [sentinel_past] + [r for r in rows if t - window <= r[-1] <= t]
+            after = [r for r in rows if t <= r[-1] <= t + window] + [sentinel_future]
+            b, a = before[-1], after[0]
+            if b[-1] < t - window or a[-1] > t + window:
+                continue
+            with np.errstate(invalid="ignore", divide="ignore"):
+                value = b[:-1] + (a[:-1] - b[:-1]) * ((t - b[-1]) / (a[-1] - b[-1]))
+            missing = np.isnan(out[(k,) + idx])
+            out[(k,) + idx][missing] = np.where(np.isfinite(value), value, np.nan)[missing]
+    return out
+
+
+def test_array_mode_matches_join_mode():
+    times, data = synthetic_cube(missing=0.35)
+    # Share the mask across bands: the array mode needs all bands valid.
+    data[np.isnan(data).any(axis=-1)] = np.nan
+    np.testing.assert_allclose(array_mode_interpolation(times, data, 25),
+                               reference_interpolation(times, data, 25))
+
+
+def test_climatology_and_zscore_match_pandas():
+    pd = pytest.importorskip("pandas")
+    rng = np.random.default_rng(3)
+    times = pd.date_range("2010-01-01", periods=900, freq="3D")
+    data = rng.normal(size=(900, 2))
+    frame = pd.DataFrame(data, index=times)
+    clim = local.monthly_climatology(list(times.to_pydatetime()), data, ("mean", "std"))
+    grouped = frame.groupby(times.month)
+    for month in range(1, 13):
+        np.testing.assert_allclose(clim[month]["mean"], grouped.mean().loc[month])
+        np.testing.assert_allclose(clim[month]["std"], grouped.std(ddof=0).loc[month])
+    starts, zscore = local.calculate_zscore(list(times.to_pydatetime()), data, scale=2)
+    monthly = (frame * 2).resample("MS").max()
+    mean, std = (frame * 2).groupby(times.month).mean(), (frame * 2).groupby(times.month).std(ddof=0)
+    expected = [(monthly.loc[start] - mean.loc[start.month]) / std.loc[start.month] for start in monthly.index]
+    assert [s.date() for s in starts] == [s.date() for s in monthly.index]
+    np.testing.assert_allclose(zscore, np.array(expected))
+
+
+def test_qa_mask_matches_one_cloud_mask_per_rule():
+    rules = [(0, 1, 1), (3, 3, 0), (4, 5, 2), (8, 9, 3), (10, 10, 0)]
+    qa = np.arange(2 ** 11, dtype="float64")
+    qa[5] = np.nan
+    data = np.stack([qa * 2, qa], axis=-1)
+    expected = data
+    for from_bit, to_bit, threshold in rules:
+        expected = local.cloud_mask(expected, from_bit, to_bit, 1, threshold)
+    np.testing.assert_array_equal(local.qa_mask(data, rules, 1), expected)
+    # The always-true rule (8, 9, 3) is dropped and the zero-threshold rules share one mask.
+    assert local.compile_qa_rules(rules) == (0b10000001000, [(0, 0b11, 1), (4, 0b11, 2)])
+    with pytest.raises(ValueError):
+        local.compile_qa_rules([(3, 2, 0)])
@@ -0,0 +1,139 @@
+"""Tests for the lazy pipeline builder."""
+import pytest
+
+from pymapee import pipeline
+from tests.fakes import FakeEE, FakeImage, FakeImageCollection
+
+
+@pytest.fixture
+def col(monkeypatch):
+    monkeypatch.setattr(pipeline, "ee", FakeEE)
+    images = [FakeImage({"NDVI": lambda feat, i=i: float(i)},
+                        {"system:time_start": i, "region": "a" if i % 2 else "b"})
+              for i in range(10)]
+    return FakeImageCollection(images)
+
+
+@pytest.fixture
+def copies(monkeypatch):
+    counter = {"count": 0}
+    copy_properties = FakeImage.copyProperties
+
+    def counting(self, source, properties=None):
+        counter["count"] += 1
+        return copy_properties(self, source, properties)
+    monkeypatch.setattr(FakeImage, "copyProperties", counting)
+    return counter
+
+
+def strip(img):
+    # An opaque step: it drops the properties it doesn't know about.
+    return FakeImage(img.bands, {"system:time_start": img.get("system:time_start")})
+
+
+def values(col):
+    return [(img.bands["NDVI"](None), img.properties) for img in col.items]
+
+
+def test_optimized_plan_fuses_maps_and_pushes_filters(col, copies):
+    pipe = (pipeline.Pipeline(col).scale(2).scale(3).kelvin_celsius()
+            .filter_date(2, 8).filter_bounds("a"))
+    pipe.steps[2].func = lambda img: img.multiply(1)  # no subtract on the fake image
+    optimized = pipe.build()
+    assert optimized.calls == ["filterDate", "filterBounds", "map"]
+    assert copies["count"] == 3
+    copies["count"] = 0
+    recorded = pipe.build(optimized=False)
+    assert recorded.calls == ["map", "map", "map", "filterDate", "filterBounds"]
+    assert copies["count"] == 30
+    assert values(optimized) == values(recorded)
+    assert [value for value, _ in values(optimized)] == [18.0, 30.0, 42.0]
+
+
+def test_filters_do_not_cross_opaque_or_collection_steps(col):
+    steps = (pipeline.Pipeline(col).scale(2).map(strip).scale(3).filter_date(0, 5)
+             .composite("month").filter_bounds("a").steps)
+    plan = pipeline.optimize(steps)
+    assert [repr(step) for step in plan] == [
+        "map[scale(2) + strip()]", "filter_date(0, 5)", "map[scale(3)]",
+        "composite('month', 'max')", "filter_bounds('a')"]
+
+
+def test_fused_map_copies_properties_around_opaque_steps(col, copies):
+    pipe = pipeline.Pipeline(col).scale(2).map(strip).scale(3).map(lambda img: img.set("x", 1))
+    optimized, recorded = pipe.build(), pipe.build(optimized=False)
+    assert optimized.calls == ["map"]
+    assert values(optimized) == values(recorded)
+    assert pipeline.plan_stats(pipe.plan()) == {"maps": 1, "filters": 0, "copy_properties": 2}
+
+
+def test_explain(col):
+    pipe = (pipeline.Pipeline(col).cloud_mask(0, 1, "DetailedQA").scale(0.0001)
+            .filter_date("2010-01-01", "2020-01-01").composite().index("vci")
+            .export_to_asset(None, "users/me/vci"))
+    text = pipe.explain(graph_size=False)
+    assert text.splitlines() == [
+        "Optimized plan:",
+        "  1. filter_date('2010-01-01', '2020-01-01')",
+        "  2. map[cloud_mask(0, 1, 'DetailedQA', 1) + scale(0.0001)]",
+        "  3. composite('month', 'max')",
+        "  4. index('vci')",
+        "  5. export_to_asset('users/me/vci')",
+        "Collection maps: 2 -> 1",
+        "copyProperties per image: 1 -> 1"]
+
+
+def test_invalid_steps(col):
+    pipe = pipeline.Pipeline(col).export_to_asset(None, "users/me/vci")
+    with pytest.raises(ValueError):
+        pipe.scale(2)
+    with pytest.raises(ValueError):
+        pipeline.Pipeline(col).index("ndwi")
+    with pytest.raises(TypeError):
+        pipeline.Pipeline([1, 2])
+
+
+def _signature(returns, *args):
+    return {"type": "Algorithm", "returns": returns, "description": "",
+            "args": [{"name": name, "type": kind, "optional": optional} for name, kind, optional in args]}
+
+
+# The server signatures used by the chain below, so that the real client builds it offline.
+ALGORITHMS = {
+    "ImageCollection.load": _signature("ImageCollection", ("id", "String", False),
+                                       ("version", "Long", True)),
+    "Collection.map": _signature("FeatureCollection", ("collection", "FeatureCollection", False),
+                                 ("baseAlgorithm", "Algorithm", False), ("dropNulls", "Boolean", True)),
+    "Image.multiply": _signature("Image", ("image1", "Image", False), ("image2", "Image", False)),
+    "Image.subtract": _signature("Image", ("image1", "Image", False), ("image2", "Image", False)),
+    "Image.gt": _signature("Image", ("image1", "Image", False), ("image2", "Image", False)),
+    "Image.updateMask": _signature("Image", ("image", "Image", False), ("mask", "Image", False)),
+    "Image.constant": _signature("Image", ("value", "Object", False)),
+    "Image.copyProperties": _signature("Element", ("destination", "Element", False),
+                                       ("source", "Element", True), ("properties", "List", True),
+                                       ("exclude", "List", True)),
+    "Element.propertyNames": _signature("List", ("element", "Element", False)),
+}
+
+
+@pytest.fixture
+def real_ee(monkeypatch):
+    ee = pytest.importorskip("ee")
+    monkeypatch.setattr(ee.data, "getAlgorithms", lambda: ALGORITHMS)
+    # The steps of ee.Initialize that don't need a connection.
+    ee.ApiFunction.initialize()
+    for dynamic_class in ee._DYNAMIC_CLASSES:
+        dynamic_class.initialize()
+    ee._InitializeGeneratedClasses()
+    ee._InitializeUnboundMethods()
+    yield ee
+    ee.Reset()
+
+
+def test_copy_steps_keep_images_with_the_real_client(real_ee):
+    col = real_ee.ImageCollection("MODIS/061/MOD13A2")
+    for optimized in (True, False):
+        out = (pipeline.Pipeline(col).scale(1e-4).map(lambda img: img.updateMask(img.gt(0)))
+               .kelvin_celsius().build(optimized))
+        encoded = real_ee.serializer.encode(out, for_cloud_api=True)
+        assert "Image.updateMask" in str(encoded)
@@ -5,7 +5,9 @@
 import pytest
 
 
-from pymapee import pymapee
+from pymapee import cache, executor, pymapee
+from tests.fakes import (FakeEE, FakeFeatureCollection, FakeImage, FakeImageCollection,
+                         FakeReducer, FakeServer)
 
 
 @pytest.fixture
@@ -22,3 +24,90 @@ def test_content(response):
     """Sample pytest test function with the pytest fixture as an argument."""
     # from bs4 import BeautifulSoup
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(pymapee, "ee", FakeEE)
+    monkeypatch.setattr(pymapee, "get_info", server)
+    monkeypatch.setattr(cache, "server_info", server)
+    monkeypatch.setattr(pymapee, "get_reducer", lambda reducer: FakeReducer())
+    previous = executor.set_executor(executor.RequestExecutor(rate=None, backoff=0))
+    yield server
+    executor.set_executor(previous)
+
+
+IMAGE = FakeImage({"NDVI": lambda feat: feat["id"] / 10})
+FEATURES = FakeFeatureCollection([{"id": i} for i in range(25)])
+
+
+def test_iter_values_from_image_streams_pages(server):
+    pages = list(pymapee.iter_values_from_image(IMAGE, FEATURES, batch_size=10, max_workers=2))
+    assert [len(df) for df in pages] == [10, 10, 5]
+    assert pages[2]["NDVI"].tolist() == pytest.approx([2.0, 2.1, 2.2, 2.3, 2.4])
+    # Two metadata requests and one request per page.
+    assert server.requests == 5
+
+
+def test_value_from_image_batch_mode_matches_single_request(server):
+    batched = pymapee.value_from_image(IMAGE, FEATURES, batch_size=7)
+    single = pymapee.value_from_image(IMAGE, FEATURES)
+    assert batched["NDVI"].tolist() == single["NDVI"].tolist()
+    assert len(batched) == 25
+
+
+def test_only_transient_errors_are_retried(server):
+    server.errors = [None, None, RuntimeError("Computation timed out.")]
+    assert len(pymapee.value_from_image(IMAGE, FEATURES, batch_size=25)) == 25
+    assert server.requests == 4
+    server.requests = 0
+    server.errors = [None, None, ValueError("Image.select: Pattern 'NDWI' did not match any bands.")]
+    with pytest.raises(ValueError):
+        pymapee.value_from_image(IMAGE, FEATURES, batch_size=25)
+    assert server.requests == 3
+
+
+def test_extract_timeseries_names_columns_after_bands(server, monkeypatch):
+    images = [FakeImage({"NDVI": lambda feat, day=day: feat["id"] + day}, {"system:time_start": day * 86400000})
+              for day in range(3)]
+    col = FakeImageCollection(images)
+    features = FakeFeatureCollection([{"system:index": str(i), "id": i} for i in range(12)])
+    df = pymapee.extract_timeseries(col, features, images_per_request=2)
+    assert len(df) == 36
+    assert df["band"].unique().tolist() == ["NDVI"]
+    # feature ids are ordered as numbers.
+    assert df["feature_id"].unique().tolist()[:3] == ["0", "1", "2"]
+    assert df["value"].tolist()[:3] == [0.0, 1.0, 2.0]
+
+    monkeypatch.setattr(pymapee, "get_reducer", lambda reducer: FakeReducer(["p10", "p90"]))
+    df = pymapee.extract_timeseries(col, features)
+    assert sorted(df["band"].unique()) == ["NDVI_p10", "NDVI_p90"]
+
+
+def test_persistent_climatology_reuses_and_replaces_assets(monkeypatch):
+    from tests.fakes import FakeAssetStore
+    store = FakeAssetStore()
+    computed = []
+    monkeypatch.setattr(pymapee, "ee", store)
+    monkeypatch.setattr(pymapee, "fetch_info", FakeServer())
+    monkeypatch.setattr(pymapee, "get_info", lambda bounds: {"coordinates": bounds})
+    monkeypatch.setattr(pymapee, "monthly_climatology", lambda col, stats: computed.append(col) or col)
+    monkeypatch.setattr(pymapee, "stack_climatology", lambda clim: FakeImage({}))
+    monkeypatch.setattr(pymapee, "unstack_climatology", lambda img: ("stored", img.asset_id))
+    monkeypatch.setattr(pymapee, "_asset_task", store.export)
+    aoi = type("AOI", (), {"geometry": lambda self: type("G", (), {"bounds": lambda self: [0, 0]})()})()
+
+    clim, task = pymapee.persistent_climatology("ndvi_v1", assetId="clim", aoi=aoi)
+    assert clim == "ndvi_v1" and task.status() == {"state": "COMPLETED"}
+    assert pymapee.persistent_climatology("ndvi_v1", assetId="clim", aoi=aoi) == (("stored", "clim"), None)
+    assert computed == ["ndvi_v1"]
+    # A changed input is recomputed and replaces the stale asset.
+    assert pymapee.persistent_climatology("ndvi_v2", assetId="clim", aoi=aoi)[0] == "ndvi_v2"
+    assert store.deleted == ["clim"] and store.exports == ["clim", "clim"]
+    assert pymapee.persistent_climatology("ndvi_v2", assetId="clim", aoi=aoi) == (("stored", "clim"), None)
+    assert computed == ["ndvi_v1", "ndvi_v2"]
+    # An asset without a fingerprint is replaced as well.
+    store.assets["clim"] = {}
+    assert pymapee.persistent_climatology("ndvi_v2", assetId="clim", aoi=aoi)[0] == "ndvi_v2"
+    assert store.deleted == ["clim", "clim"] and store.exports == ["clim", "clim", "clim"]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.tasks` module."""
+
+import json
+
+import pytest
+
+from pymapee import executor, tasks
+from tests.fakes import FakeTaskBackend
+
+
+@pytest.fixture(autouse=True)
+def requests():
+    previous = executor.set_executor(executor.RequestExecutor(rate=None, backoff=0))
+    yield executor.get_executor()
+    executor.set_executor(previous)
+
+
+def run(backend, keys, **kwargs):
+    sleeps = []
+    handles = tasks.run_tasks({key: backend.factory(key) for key in keys},
+                              sleep=sleeps.append, **kwargs)
+    return handles, sleeps
+
+
+def test_concurrency_cap_and_completion():
+    backend = FakeTaskBackend(duration=2)
+    handles, _ = run(backend, ["0", "1", "2", "3", "4"], max_concurrent=2)
+    assert backend.max_active == 2
+    assert len(backend.started) == 5
+    assert all(task.state == "COMPLETED" for task in handles.values())
+
+
+def test_failed_tasks_are_resubmitted(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    backend = FakeTaskBackend(duration=1, failures={"1": 1, "2": 5})
+    with pytest.raises(tasks.TaskError) as error:
+        run(backend, ["0", "1", "2"], max_retries=1, manifest_path=manifest_path)
+    # The tasks failing after their retries are reported once all the others completed.
+    assert error.value.failed == {"2": "Image.clip: Too many pixels."}
+    assert error.value.handles["0"].state == "COMPLETED"
+    manifest = json.load(open(manifest_path))
+    assert manifest["1"]["state"] == "COMPLETED" and manifest["1"]["attempts"] == 2
+    assert manifest["2"]["state"] == "FAILED" and manifest["2"]["attempts"] == 2
+    assert manifest["2"]["error"] == "Image.clip: Too many pixels."
+
+
+def test_resume_skips_completed_tasks(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    with pytest.raises(tasks.TaskError):
+        run(FakeTaskBackend(duration=1, failures={"1": 1}), ["0", "1"], max_retries=0,
+            manifest_path=manifest_path)
+    backend = FakeTaskBackend(duration=1)
+    handles, _ = run(backend, ["0", "1"], manifest_path=manifest_path)
+    assert [task.key for task in backend.started] == ["1"]
+    assert handles["0"] is None
+
+
+def test_poll_backoff():
+    backend = FakeTaskBackend(duration=6)
+    _, sleeps = run(backend, ["0"], poll_interval=1, max_poll_interval=4)
+    # The first poll moves the task to RUNNING, then the delay doubles up to the cap.
+    assert sleeps == [1, 1, 2, 4, 4, 4]
+
+
+def test_polls_go_through_the_executor(requests):
+    backend = FakeTaskBackend(duration=2)
+
+    def factory():
+        task = backend.factory("0")()
+        status = task.status
+        errors = [ConnectionError("connection reset")]
+
+        def flaky_status():
+            if errors:
+                raise errors.pop()
+            return status()
+        task.status = flaky_status
+        return task
+
+    sleeps = []
+    handles = tasks.run_tasks({"0": factory}, sleep=sleeps.append)
+    assert handles["0"].state == "COMPLETED"
+    metrics = requests.metrics()["data"]
+    assert metrics["calls"] == 3 and metrics["retries"] == 1
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.tiles` module."""
+
+import time
+import urllib.request
+
+import pytest
+
+from pymapee import tiles
+from tests.fakes import FakeTransport, StubTileServer
+
+
+@pytest.fixture
+def upstream():
+    server = StubTileServer()
+    yield server
+    server.stop()
+
+
+def test_map_id_cache_keys_on_vis_params():
+    transport = FakeTransport(lambda expression: {"mapid": len(transport.calls)})
+    map_ids = tiles.MapIdCache(transport=lambda ee_object, vis: transport((ee_object, vis)))
+    first = map_ids.get("ndvi", {"min": 0, "max": 1})
+    assert map_ids.get("ndvi", {"max": 1, "min": 0}) is first
+    map_ids.get("ndvi", {"min": 0, "max": 0.5})
+    assert transport.round_trips == 2
+    assert map_ids.stats()["hit_ratio"] == pytest.approx(1 / 3)
+
+
+def test_map_id_cache_expires():
+    transport = FakeTransport()
+    map_ids = tiles.MapIdCache(ttl=0.01, transport=lambda ee_object, vis: transport(ee_object))
+    map_ids.get("ndvi")
+    time.sleep(0.02)
+    map_ids.get("ndvi")
+    assert transport.round_trips == 2
+
+
+def test_neighbour_tiles_wrap_and_clip():
+    around = tiles.neighbour_tiles(1, 0, 0, radius=1, zoom=False)
+    # y = -1 is outside the world and x = -1 wraps around onto x = 1.
+    assert sorted(around) == [(1, 0, 1), (1, 1, 0), (1, 1, 1)]
+    assert tiles.neighbour_tiles(0, 0, 0, radius=1, zoom=False) == []
+    assert (0, 0, 0) in tiles.neighbour_tiles(1, 0, 0, radius=0)
+    assert (2, 1, 1) in tiles.neighbour_tiles(1, 0, 0, radius=0)
+    assert tiles.neighbour_tiles(5, 3, 3, radius=0, max_zoom=5) == [(4, 1, 1)]
+
+
+def test_proxy_serves_from_disk_and_prefetches(upstream, tmp_path):
+    proxy = tiles.TileProxy(str(tmp_path), prefetch_radius=1, prefetch_zoom=False).start()
+    try:
+        url = proxy.add_layer(upstream.url_format)
+        with urllib.request.urlopen(url.format(z=3, x=4, y=4)) as response:
+            assert response.read() == b"tile/3/4/4"
+        proxy.wait_prefetch()
+        assert len(upstream.requests) == 9
+        assert proxy.stats()["prefetched"] == 8
+        # Panning to a neighbour is served from the cache without an upstream request.
+        with urllib.request.urlopen(url.format(z=3, x=5, y=4)) as response:
+            assert response.read() == b"tile/3/5/4"
+        assert proxy.stats()["hits"] == 1
+    finally:
+        proxy.stop()
+    # A new proxy on the same folder reuses the tiles on disk.
+    proxy = tiles.TileProxy(str(tmp_path), prefetch_radius=0, prefetch_zoom=False)
+    layer = next(iter(proxy.add_layer(upstream.url_format).split("/")[3:4]))
+    assert proxy.get_tile(layer, 3, 4, 4) == b"tile/3/4/4"
+    assert proxy.stats()["hit_ratio"] == 1.0
+    proxy.stop()
+
+
+def test_tile_cache_lru_eviction(tmp_path):
+    tile_cache = tiles.TileCache(str(tmp_path), max_bytes=10)
+    tile_cache.put("a", b"1234")
+    tile_cache.put("b", b"1234")
+    tile_cache.get("a")
+    tile_cache.put("c", b"1234")
+    assert "a" in tile_cache and "c" in tile_cache
+    assert "b" not in tile_cache
+    assert tile_cache.size == 8
@@ -0,0 +1,71 @@
+"""Tests for the tracing of server calls."""
+import logging
+
+import pytest
+
+from pymapee import cache, executor, pymapee, tracing
+from tests.fakes import FakeEE, FakeFeatureCollection, FakeImage, FakeReducer, FakeServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(pymapee, "ee", FakeEE)
+    monkeypatch.setattr(cache, "server_info", server)
+    monkeypatch.setattr(pymapee, "get_reducer", lambda reducer: FakeReducer())
+    previous = executor.set_executor(executor.RequestExecutor(rate=None, backoff=0))
+    previous_cache = cache.set_cache(cache.GetInfoCache())
+    yield server
+    executor.set_executor(previous)
+    cache.set_cache(previous_cache)
+
+
+class MapSource:
+    def getMapId(self, vis_params):
+        return {"tile_fetcher": "https://tiles/{z}/{x}/{y}"}
+
+
+class Exporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+def test_records_every_round_trip_of_a_call(server):
+    image = FakeImage({"NDVI": lambda feat: feat["id"] / 10})
+    features = FakeFeatureCollection([{"id": i} for i in range(25)])
+    with tracing.trace(tracing.MemorySink()) as sink:
+        pymapee.value_from_image(image, features, batch_size=10)
+    assert [record["kind"] for record in sink.records] == ["getInfo", "getInfo", "data", "data", "data"]
+    assert {record["function"] for record in sink.records} == {"pymapee.pymapee.value_from_image"}
+    assert all(record["response_bytes"] > 0 and record["error"] is None for record in sink.records)
+    summary = sink.summary()["pymapee.pymapee.value_from_image"]
+    assert summary["calls"] == 5 and summary["errors"] == 0
+    assert not tracing.enabled()
+    pymapee.value_from_image(image, features)
+    assert len(sink.records) == 5
+
+
+def test_nested_traces_sinks_and_errors(server, caplog):
+    outer, exporter = tracing.MemorySink(), Exporter()
+    run = executor.get_executor().call
+
+    def broken_sink(record):
+        raise RuntimeError("sink failure")
+    with tracing.trace(outer):
+        with tracing.trace(tracing.LoggingSink(), tracing.SpanSink(exporter), broken_sink):
+            with caplog.at_level(logging.INFO, logger="pymapee.tracing"):
+                assert run("getMapId", MapSource().getMapId, {"min": 0})["tile_fetcher"]
+            with pytest.raises(ValueError):
+                run("export", lambda: (_ for _ in ()).throw(ValueError("Invalid region.")))
+        run("getInfo", server, {"size": 3})
+    assert [record["kind"] for record in outer.records] == ["getMapId", "export", "getInfo"]
+    assert outer.records[0]["function"] == "tests.test_tracing.test_nested_traces_sinks_and_errors"
+    assert outer.records[1]["error"] == "ValueError: Invalid region."
+    assert [span["status"] for span in exporter.spans] == ["OK", "ERROR"]
+    assert exporter.spans[0]["name"] == "pymapee.getMapId"
+    assert exporter.spans[0]["end_time"] >= exporter.spans[0]["start_time"]
+    assert "getMapId tests.test_tracing" in caplog.text
+    assert "sink failure" in caplog.text
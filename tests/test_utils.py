@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.utils` module."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pymapee import local, utils
+
+
+def test_long_format():
+    wide = utils.data_format({"features": [
+        {"properties": {"feature_id": "1", "date": 86400000, "NDVI": 0.5, "EVI": 0.3}},
+        {"properties": {"feature_id": "0", "date": 0, "NDVI": 0.1, "EVI": None}},
+    ]})
+    df = utils.long_format(wide)
+    assert list(df.columns) == ["feature_id", "date", "band", "value"]
+    assert len(df) == 4
+    assert df["date"].iloc[0] == pd.Timestamp("1970-01-01")
+    assert df["feature_id"].iloc[0] == "0"
+    assert str(df["band"].dtype) == "category"
+    assert df["value"].dtype == "float64"
+    assert df["value"].isna().sum() == 1
+
+
+FEATURES = {"features": [
+    {"properties": {"id": 1, "name": "a", "NDVI": 0.5},
+     "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]]}},
+    {"properties": {"id": 2, "name": "b", "NDVI": None},
+     "geometry": {"type": "Point", "coordinates": [3.0, 4.0]}},
+]}
+
+
+def test_data_format_typed_columns():
+    df = utils.data_format(FEATURES)
+    assert list(df.columns) == ["id", "name", "NDVI"]
+    assert df["id"].dtype == "int64"
+    assert df["NDVI"].dtype == "float64"
+    assert df["NDVI"].isna().tolist() == [False, True]
+    assert df["name"].tolist() == ["a", "b"]
+    assert utils.data_format({"features": []}).empty
+
+
+def test_data_format_geometry():
+    df = utils.data_format(FEATURES, geometry="centroid")
+    assert df[["x", "y"]].values.tolist() == [[1.0, 1.0], [3.0, 4.0]]
+    wkb = utils.data_format(FEATURES, geometry="wkb")["geometry"]
+    assert wkb[1] == bytes.fromhex("0101000000" + "0000000000000840" + "0000000000001040")
+    assert len(wkb[0]) == 1 + 4 + 4 + 4 + 5 * 16
+
+
+def test_polygon_centroid_with_hole():
+    polygon = {"type": "Polygon", "coordinates": [
+        [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]],
+        [[0, 0], [0, 2], [2, 2], [2, 0], [0, 0]]]}
+    x, y = utils.geometry_centroid(polygon)
+    assert abs(x - 7 / 3) < 1e-9 and abs(y - 7 / 3) < 1e-9
+
+
+def test_data_format_numpy_output():
+    columns = utils.data_format(FEATURES, output="numpy")
+    assert columns["id"].tolist() == [1, 2]
+
+
+def test_data_format_mixed_properties():
+    df = utils.data_format({"features": [
+        {"properties": {"id": 1}}, {"properties": {"id": 2, "NDVI": 0.2}}, {"properties": None}]})
+    assert list(df.columns) == ["id", "NDVI"]
+    assert df["NDVI"].isna().tolist() == [True, False, True]
+
+
+def test_grid_cells_exact_indexing():
+    x0, y0, dx, dy, ncols, nrows = utils.grid_layout(0.2, 0.4, 0.6, 0.8, ncols=3, nrows=7)
+    assert (x0, y0, ncols, nrows) == (0, 0, 3, 7)
+    cells = utils.grid_cells(x0, y0, dx, dy, ncols, nrows)
+    # Accumulating 1/7 steps gives an eighth row; integer indexing doesn't.
+    assert len(utils.arange(0, 1, dy)) == 8
+    assert len(cells) == 21
+    assert [c[0] for c in cells] == list(range(1, 22))
+    assert abs(max(c[3] for c in cells) - 1) < 1e-12
+    assert abs(max(c[4] for c in cells) - 1) < 1e-12
+
+
+def test_grid_layout_covers_box_and_matches_server(monkeypatch):
+    from tests.fakes import FakeEE, FakeNumber
+    monkeypatch.setattr(utils, "ee", FakeEE)
+    boxes = [(0.5, 2.5, -1.5, 3.5), (102.6, 109.5, 8.4, 23.4), (-0.5, -0.5, 1.5, 1.5)]
+    for box in boxes:
+        for kwargs in [{"ncols": 3, "nrows": 4}, {"cell_size": 0.25}]:
+            layout = utils.grid_layout(*box, **kwargs)
+            x0, y0, dx, dy, ncols, nrows = layout
+            assert x0 <= box[0] and x0 + ncols * dx >= box[1]
+            assert y0 <= box[2] and y0 + nrows * dy >= box[3]
+            server = utils.server_layout(*[FakeNumber(v) for v in box], **kwargs)
+            assert tuple(FakeNumber(v).value for v in server) == layout
+
+
+def test_grid_layout_cell_size():
+    assert utils.grid_layout(0.5, 2.1, -1.2, 0.3, cell_size=0.5) == (0.5, -1.5, 0.5, 0.5, 4, 4)
+
+
+def test_server_periods_match_local(monkeypatch):
+    import datetime
+    from pymapee import local
+    from tests.fakes import FakeEE
+    monkeypatch.setattr(utils, "ee", FakeEE)
+    day = datetime.datetime(2019, 11, 20)
+    for offset in range(0, 500, 3):
+        date = day + datetime.timedelta(days=offset)
+        for period in list(utils.PERIODS) + [(11, 5), (4, 1, 7)]:
+            assert utils.period_start(date, period).value == local.period_start(date, period), (date, period)
+            assert utils.period_slot(date, period).value == local.period_slot(date, period), (date, period)
+
+
+def test_server_period_sequence_matches_local(monkeypatch):
+    import datetime
+    from pymapee import local
+    from tests.fakes import FakeEE
+    monkeypatch.setattr(utils, "ee", FakeEE)
+    start = datetime.datetime(2019, 11, 20)
+    for end in (datetime.datetime(2019, 11, 21), datetime.datetime(2020, 3, 1),
+                datetime.datetime(2022, 10, 14)):
+        for period in list(utils.PERIODS) + [(11, 5)]:
+            expected = [local.to_millis(date) for date in local.period_sequence(start, end, period)]
+            starts = utils.period_sequence(start, end, period)
+            assert [millis.value for millis in starts] == expected, (end, period)
+
+
+def test_long_format_orders_numeric_ids():
+    wide = pd.DataFrame({"feature_id": ["10", "2", "1"], "date": [0, 0, 0], "NDVI": [1.0, 2.0, 3.0]})
+    assert utils.long_format(wide)["feature_id"].tolist() == ["1", "2", "10"]
+
+
+class ArrayImage:
+    """ A NumPy-backed image evaluating the bitwise expressions of qa_mask_image."""
+
+    def __init__(self, bands, names):
+        self.bands, self.names = bands, names
+        self.calls = []
+
+    def select(self, name):
+        return ArrayImage(self.bands[..., [self.names.index(name)]], [name])
+
+    def _op(self, func):
+        return ArrayImage(func(self.bands), self.names)
+
+    def bitwiseAnd(self, value):
+        return self._op(lambda a: a & value)
+
+    def rightShift(self, value):
+        return self._op(lambda a: a >> value)
+
+    def eq(self, value):
+        return self._op(lambda a: a == value)
+
+    def lte(self, value):
+        return self._op(lambda a: a <= value)
+
+    def And(self, other):
+        return self._op(lambda a: a & other.bands)
+
+    def updateMask(self, mask):
+        self.calls.append("updateMask")
+        return np.where(mask.bands, self.bands, -1)
+
+
+def test_qa_mask_image_matches_local_presets():
+    for preset in ("modis", "landsat", "sentinel2"):
+        band, rules = utils.qa_rules(preset)
+        qa = np.arange(2 ** 16, dtype="int64")
+        img = ArrayImage(np.stack([qa * 3, qa], axis=-1), ["NDVI", band])
+        out = utils.qa_mask_image(img, preset)
+        assert img.calls == ["updateMask"]
+        expected = local.qa_mask(img.bands, rules, 1)
+        np.testing.assert_array_equal(out == -1, np.isnan(expected))
+    with pytest.raises(ValueError):
+        utils.qa_rules("aqua")
+    with pytest.raises(ValueError):
+        utils.qa_rules([(0, 1, 0)])
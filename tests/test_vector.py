@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""Tests for `pymapee.vector` module."""
+
+import json
+import math
+import tracemalloc
+
+import pytest
+
+from pymapee import vector
+
+
+def circle(n, radius=1.0):
+    ring = [[radius * math.cos(2 * math.pi * i / n), radius * math.sin(2 * math.pi * i / n)]
+            for i in range(n)]
+    return ring + [ring[0]]
+
+
+def write_geojson(path, n_features, n_vertices):
+    # Written feature by feature so that the test itself stays small in memory.
+    with open(path, "w") as file:
+        file.write('{"type": "FeatureCollection", "name": "big", "features": [\n')
+        for i in range(n_features):
+            feature = {"type": "Feature", "properties": {"id": i, "name": "parcel {}".format(i)},
+                       "geometry": {"type": "Polygon", "coordinates": [circle(n_vertices, 1 + i % 10)]}}
+            file.write((",\n" if i else "") + json.dumps(feature))
+        file.write("\n]}\n")
+
+
+def test_simplify_line():
+    line = [[0, 0], [1, 0.01], [2, -0.01], [3, 5], [4, 6], [5, 7]]
+    assert vector.simplify_line(line, 0.1) == [[0, 0], [2, -0.01], [3, 5], [5, 7]]
+    assert vector.simplify_line(line, 0) == line
+    # Long lines don't hit the recursion limit.
+    zigzag = [[i, i % 2] for i in range(1000)]
+    assert vector.simplify_line(zigzag, 0.5) == zigzag
+
+
+def test_simplify_ring_stays_valid():
+    ring = vector.simplify_ring(circle(64), 10)
+    assert len(ring) == 4 and ring[0] == ring[-1]
+    assert len(vector.simplify_ring(circle(64), 0.01)) < 65
+
+
+def test_transform_geometry():
+    polygon = {"type": "Polygon", "coordinates": [circle(1000)]}
+    out = vector.transform_geometry(polygon, tolerance=0.01, precision=3)
+    assert len(out["coordinates"][0]) < 100
+    assert all(round(v, 3) == v for point in out["coordinates"][0] for v in point)
+    assert out["coordinates"][0][0] == out["coordinates"][0][-1]
+    assert vector.transform_geometry(polygon) is polygon
+    point = vector.transform_geometry({"type": "Point", "coordinates": [1.23456, 2.34567]}, precision=2)
+    assert point["coordinates"] == [1.23, 2.35]
+    # Rounding a tiny ring to nothing keeps it unquantized.
+    tiny = vector.transform_geometry({"type": "Polygon", "coordinates": [circle(8, 1e-6)]}, precision=2)
+    assert len(tiny["coordinates"][0]) == 9
+    with pytest.raises(ValueError):
+        vector.transform_geometry({"type": "Circle", "coordinates": []}, precision=2)
+
+
+def test_iter_geojson_matches_json_load(tmp_path):
+    path = str(tmp_path / "small.geojson")
+    write_geojson(path, 20, 50)
+    with open(path) as file:
+        expected = json.load(file)["features"]
+    # A tiny chunk size splits every feature over several reads.
+    assert list(vector.iter_geojson(path, chunk_size=64)) == expected
+    assert list(vector.read_features(path)) == expected
+    selected = next(vector.read_features(path, properties=["id"]))
+    assert selected["properties"] == {"id": 0}
+
+
+def test_iter_geojson_sequence_and_errors(tmp_path):
+    path = tmp_path / "points.geojsonl"
+    features = [{"type": "Feature", "properties": {"id": i},
+                 "geometry": {"type": "Point", "coordinates": [i, i]}} for i in range(3)]
+    path.write_text("\n".join(json.dumps(f) for f in features) + "\n\n")
+    assert list(vector.iter_geojson(str(path))) == features
+
+    truncated = tmp_path / "truncated.geojson"
+    truncated.write_text('{"type": "FeatureCollection", "features": [{"type": "Feature", "geo')
+    with pytest.raises(ValueError):
+        list(vector.iter_geojson(str(truncated)))
+    not_collection = tmp_path / "feature.geojson"
+    not_collection.write_text(json.dumps(features[0]))
+    with pytest.raises(ValueError):
+        list(vector.iter_geojson(str(not_collection)))
+    with pytest.raises(FileNotFoundError):
+        list(vector.read_features(str(tmp_path / "missing.geojson")))
+    with pytest.raises(TypeError):
+        vector.read_features(42)
+
+
+def test_iter_shapefile(tmp_path):
+    shapefile = pytest.importorskip("shapefile")
+    path = str(tmp_path / "parcels.shp")
+    with shapefile.Writer(path, shapeType=shapefile.POLYGON) as writer:
+        writer.field("id", "N")
+        for i in range(3):
+            writer.poly([circle(200, 1 + i)])
+            writer.record(i)
+    features = list(vector.read_features(path, tolerance=0.01, precision=4))
+    assert [f["properties"]["id"] for f in features] == [0, 1, 2]
+    assert all(4 <= len(f["geometry"]["coordinates"][0]) < 100 for f in features)
+
+
+def test_batch_features_bounds():
+    features = [{"type": "Feature", "properties": {"id": i},
+                 "geometry": {"type": "Point", "coordinates": [i, i]}} for i in range(100)]
+    batches = list(vector.batch_features(features, max_bytes=1000))
+    assert [f for batch in batches for f in batch] == features
+    assert len(batches) > 1
+    assert all(len(json.dumps(batch, separators=(",", ":"))) <= 1000 for batch in batches)
+    assert [len(b) for b in vector.batch_features(features, max_features=30)] == [30, 30, 30, 10]
+    with pytest.raises(ValueError):
+        list(vector.batch_features(features, max_bytes=10))
+
+
+def peak_memory(path):
+    tracemalloc.start()
+    try:
+        count = vertices = 0
+        for batch in vector.batch_features(
+                vector.read_features(path, tolerance=0.05, precision=4), max_bytes=2 ** 13):
+            count += len(batch)
+            vertices += sum(len(f["geometry"]["coordinates"][0]) for f in batch)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return count, vertices, peak
+
+
+def test_streaming_memory_is_constant(tmp_path):
+    small, large = str(tmp_path / "small.geojson"), str(tmp_path / "large.geojson")
+    write_geojson(small, 20, 1000)
+    write_geojson(large, 80, 1000)
+    size = (tmp_path / "large.geojson").stat().st_size
+    assert size > 3 * 2 ** 20
+
+    count, vertices, small_peak = peak_memory(small)
+    assert count == 20
+    count, vertices, large_peak = peak_memory(large)
+    assert count == 80
+    assert vertices < 80 * 1000
+    # Bounded by one feature and one batch, not by the file: 4 times more features, same peak.
+    assert large_peak < 1.5 * small_peak
+    assert large_peak < size / 4